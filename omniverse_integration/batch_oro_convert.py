@@ -0,0 +1,167 @@
+import argparse
+import concurrent.futures
+import glob
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+# oro_convert.py over many scene directories, each in its own headless blender, by a pool of workers
+# a scene is converted again only when it changed: the sha1 of its scene.json and scene_topdown.blend, of its output
+# directory, which oro_convert writes into oro_scene.yaml, and of the oro_convert arguments, is recorded with the
+# stamps of scene.usd and oro_scene.yaml in <scene>/oro_convert.json after a conversion succeeds, and a scene whose
+# hash and outputs still match is skipped, so that a run picks up where a failed one stopped; blender output goes to
+# <scene>/oro_convert.log and the run to a manifest
+#
+# python batch_oro_convert.py 'evaluation_v1/*/3' --output-root /data/ORO_output --workers 8 --blender $BLENDER_PATH \
+#     --oro-args '--placement rooms --selection coverage'
+
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+ORO_CONVERT = os.path.join(CURRENT_DIR, 'oro_convert.py')
+SCENE_INPUTS = ('scene.json', 'scene_topdown.blend')
+SCENE_OUTPUTS = ('scene.usd', 'oro_scene.yaml')
+SCENE_RECORD = 'oro_convert.json'
+SCENE_LOG = 'oro_convert.log'
+HASH_CHUNK = 2**20
+
+def get_scene_dirs(patterns):
+    # directories with a scene.json, in the order given, globs expanded and sorted
+    scene_dirs = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) if glob.has_magic(pattern) else [pattern]:
+            path = os.path.abspath(path)
+            if os.path.isfile(os.path.join(path, 'scene.json')) and path not in scene_dirs:
+                scene_dirs.append(path)
+    return scene_dirs
+
+def get_input_hash(scene_dir, output_dir, oro_args):
+    sha1 = hashlib.sha1(json.dumps([output_dir, oro_args]).encode())
+    for name in SCENE_INPUTS:
+        path = os.path.join(scene_dir, name)
+        if not os.path.isfile(path):
+            continue
+        sha1.update(name.encode())
+        with open(path, 'rb') as infile:
+            for chunk in iter(lambda: infile.read(HASH_CHUNK), b''):
+                sha1.update(chunk)
+    return sha1.hexdigest()
+
+def get_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def get_output_stamps(scene_dir):
+    return {name: get_stamp(os.path.join(scene_dir, name)) for name in SCENE_OUTPUTS}
+
+def read_record(scene_dir):
+    try:
+        with open(os.path.join(scene_dir, SCENE_RECORD)) as infile:
+            return json.load(infile)
+    except (OSError, ValueError):
+        return None
+
+def write_json(data, path):
+    temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+    with open(temp_path, 'w') as outfile:
+        json.dump(data, outfile, indent=2)
+    os.replace(temp_path, path)
+
+def is_converted(scene_dir, input_hash):
+    record = read_record(scene_dir)
+    if record is None or record.get('input_hash') != input_hash:
+        return False
+    stamps = get_output_stamps(scene_dir)
+    return None not in stamps.values() and stamps == record.get('outputs')
+
+def get_blender_command(blender, scene_dir, output_dir, oro_args):
+    command = [blender, '-b']
+    blend_path = os.path.join(scene_dir, 'scene_topdown.blend')
+    if os.path.isfile(blend_path):
+        command.append(blend_path)
+    return command + ['--python', ORO_CONVERT, '--', scene_dir, output_dir] + oro_args
+
+def convert_scene(scene_dir, output_dir, blender, oro_args, force=False, timeout=None):
+    # manifest entry of a scene, converted unless its record matches
+    entry = {'scene': scene_dir, 'output': output_dir, 'input_hash': get_input_hash(scene_dir, output_dir, oro_args)}
+    if not force and is_converted(scene_dir, entry['input_hash']):
+        entry['status'] = 'skipped'
+        return entry
+    os.makedirs(output_dir, exist_ok=True)
+    record_path = os.path.join(scene_dir, SCENE_RECORD)
+    if os.path.exists(record_path):
+        os.remove(record_path) # outputs may be half written until the conversion succeeds
+    log_path = os.path.join(scene_dir, SCENE_LOG)
+    command = get_blender_command(blender, scene_dir, output_dir, oro_args)
+    start = time.perf_counter()
+    with open(log_path, 'w') as log:
+        try:
+            returncode = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT, timeout=timeout).returncode
+        except subprocess.TimeoutExpired:
+            returncode = None
+        except OSError as e:
+            log.write(f'{e}\n')
+            returncode = None
+    entry.update({'seconds': round(time.perf_counter() - start, 3), 'returncode': returncode, 'log': log_path})
+    stamps = get_output_stamps(scene_dir)
+    if returncode != 0 or None in stamps.values():
+        entry['status'] = 'failed'
+        return entry
+    write_json({'input_hash': entry['input_hash'], 'outputs': stamps, 'oro_args': oro_args}, record_path)
+    entry['status'] = 'converted'
+    return entry
+
+def convert_scenes(scene_dirs, output_root, blender='blender', oro_args=(), workers=1, manifest_path=None, force=False, timeout=None):
+    # manifest of the run, written after every scene when manifest_path is given
+    oro_args = list(oro_args)
+    common = os.path.commonpath(scene_dirs) if len(scene_dirs) > 1 else os.path.dirname(scene_dirs[0]) if scene_dirs else ''
+    manifest = {
+        'started': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'blender': blender,
+        'oro_args': oro_args,
+        'workers': workers,
+        'scenes': [],
+    }
+    lock = threading.Lock()
+    def finish(entry):
+        with lock:
+            manifest['scenes'].append(entry)
+            print(f'[{len(manifest["scenes"])}/{len(scene_dirs)}] {entry["status"]} {entry["scene"]}', flush=True)
+            if manifest_path is not None:
+                write_json(manifest, manifest_path)
+    # blender does the work, threads only wait for it
+    with concurrent.futures.ThreadPoolExecutor(max(1, workers)) as executor:
+        futures = [executor.submit(convert_scene, scene_dir, os.path.join(output_root, os.path.relpath(scene_dir, common)), blender, oro_args, force, timeout)
+            for scene_dir in scene_dirs]
+        for future in concurrent.futures.as_completed(futures):
+            finish(future.result())
+    order = {scene_dir: i for i, scene_dir in enumerate(scene_dirs)}
+    with lock:
+        manifest['scenes'].sort(key=lambda entry: order[entry['scene']])
+        manifest['finished'] = time.strftime('%Y-%m-%d %H:%M:%S')
+        manifest['counts'] = {status: sum(entry['status'] == status for entry in manifest['scenes']) for status in ('converted', 'skipped', 'failed')}
+        if manifest_path is not None:
+            write_json(manifest, manifest_path)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='run oro_convert.py over scene directories in headless blenders')
+    parser.add_argument('scenes', nargs='+', help='scene directories or globs of them')
+    parser.add_argument('--output-root', required=True, help='output directory of a scene is its path relative to the common root of the scenes in here')
+    parser.add_argument('--blender', default=os.environ.get('BLENDER_PATH', 'blender'))
+    parser.add_argument('--oro-args', default='', help='arguments of oro_convert.py, e.g. "--placement rooms"')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--manifest', default='oro_convert_manifest.json')
+    parser.add_argument('--force', action='store_true', help='convert scenes whose outputs are up to date too')
+    parser.add_argument('--timeout', type=float, default=None, help='seconds, per scene')
+    args = parser.parse_args()
+    scene_dirs = get_scene_dirs(args.scenes)
+    manifest = convert_scenes(scene_dirs, os.path.abspath(args.output_root), args.blender, shlex.split(args.oro_args), args.workers, args.manifest, args.force, args.timeout)
+    print(', '.join(f'{count} {status}' for status, count in manifest['counts'].items()))
+    sys.exit(1 if manifest['counts']['failed'] else 0)
@@ -1,6 +1,10 @@
-import mathutils
+try:
+    import mathutils
+except ImportError:
+    mathutils = None # only the NumPy sampler below is available outside Blender
 import random
 import math
+import numpy as np
 
 
 def is_valid_pose(camera_location, target_location, walls):
@@ -63,10 +67,11 @@ def xyz_from_mat3(_r):
             psi = -phi + math.atan2(-r[0][1], -r[0][2])
     return mathutils.Vector((math.degrees(psi), math.degrees(theta), math.degrees(phi)))
 
-mat_z_to_y = mathutils.Matrix()
-mat_z_to_y[0][0:3] = 0, 0, 1
-mat_z_to_y[1][0:3] = 1, 0, 0
-mat_z_to_y[2][0:3] = 0, 1, 0
+if mathutils is not None:
+    mat_z_to_y = mathutils.Matrix()
+    mat_z_to_y[0][0:3] = 0, 0, 1
+    mat_z_to_y[1][0:3] = 1, 0, 0
+    mat_z_to_y[2][0:3] = 0, 1, 0
     
 def get_valid_camera_poses(N, radius, target_location, walls):
     valid_poses = []
@@ -86,4 +91,128 @@ def get_valid_camera_poses(N, radius, target_location, walls):
             euler = xyz_from_mat3(mat.to_3x3())
             valid_poses.append((camera_location @ mat_z_to_y.to_3x3(), euler))
     
-    return valid_poses
\ No newline at end of file
+    return valid_poses
+
+
+# NumPy version of get_valid_camera_poses, which runs outside Blender and tests a batch of candidates against all
+# obstacle polygons at once, same candidates for the same random state, same rules as is_valid_pose/is_point_in_polygon
+
+SEGMENT_POLYGON_PAIRS = 2**22 # candidate x polygon pairs tested at once
+
+def normalize_rows(vectors):
+    lengths = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return np.divide(vectors, lengths, out=np.zeros_like(vectors), where=lengths > 0)
+
+class ObstaclePolygons:
+    # convex polygons padded to the same number of vertices
+    def __init__(self, polygons):
+        polygons = [np.asarray([tuple(point) for point in polygon], dtype=np.float64).reshape(-1, 3) for polygon in polygons]
+        self.count = len(polygons)
+        self.sizes = np.array([len(polygon) for polygon in polygons], dtype=np.int64)
+        size = max(3, self.sizes.max(initial=0))
+        self.vertices = np.zeros((self.count, size, 3))
+        for i, polygon in enumerate(polygons):
+            self.vertices[i, :len(polygon)] = polygon
+        corners = np.arange(size)
+        self.edge_mask = corners[None] < self.sizes[:, None]
+        following = (corners[None] + 1) % np.maximum(self.sizes[:, None], 1)
+        following_vertices = np.take_along_axis(self.vertices, following[..., None], axis=1)
+        self.edges = np.where(self.edge_mask[..., None], following_vertices - self.vertices, 0)
+        # plane through the first three vertices like is_valid_pose, zero for degenerate ones, which never block
+        v0, v1, v2 = self.vertices[:, 0], self.vertices[:, 1], self.vertices[:, 2]
+        self.plane_normals = normalize_rows(np.cross(v0 - v1, v1 - v2))
+        self.plane_offsets = (v0 * self.plane_normals).sum(axis=-1)
+        # mathutils.geometry.normal of the whole polygon (Newell), for the inside test
+        self.inside_normals = normalize_rows(np.where(self.edge_mask[..., None], np.cross(self.vertices, following_vertices), 0).sum(axis=1))
+
+    def blocks(self, origins, targets):
+        # whether each segment from origins to targets crosses a polygon before its target
+        blocked = np.zeros(len(origins), dtype=bool)
+        if self.count == 0:
+            return blocked
+        chunk_size = max(1, SEGMENT_POLYGON_PAIRS // self.count)
+        for start in range(0, len(origins), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            blocked[chunk] = self.blocks_chunk(origins[chunk], targets[chunk])
+        return blocked
+
+    def blocks_chunk(self, origins, targets):
+        offsets = targets - origins
+        lengths = np.linalg.norm(offsets, axis=-1)
+        directions = offsets / lengths[:, None]
+        denominators = directions @ self.plane_normals.T
+        crossing = np.abs(denominators) > 1e-6 # not parallel
+        t = np.divide(self.plane_offsets[None] - origins @ self.plane_normals.T, denominators, out=np.full(denominators.shape, -1.0), where=crossing)
+        segments, polygons = np.nonzero(crossing & (t >= 0) & (t < lengths[:, None]))
+        points = origins[segments] + directions[segments] * t[segments, polygons][:, None]
+        blocked = np.zeros(len(origins), dtype=bool)
+        blocked[segments[self.contains(points, polygons)]] = True
+        return blocked
+
+    def crosses(self, origins, directions, lengths, polygons):
+        # whether each segment crosses its polygon before its length, for pairs of segments and polygons
+        normals = self.plane_normals[polygons]
+        denominators = (directions * normals).sum(axis=-1)
+        crossing = np.abs(denominators) > 1e-6 # not parallel
+        t = np.divide(self.plane_offsets[polygons] - (origins * normals).sum(axis=-1), denominators, out=np.full(denominators.shape, -1.0), where=crossing)
+        hits = np.flatnonzero(crossing & (t >= 0) & (t < lengths))
+        crosses = np.zeros(len(polygons), dtype=bool)
+        crosses[hits] = self.contains(origins[hits] + directions[hits] * t[hits, None], polygons[hits])
+        return crosses
+
+    def contains(self, points, polygons):
+        # is_point_in_polygon of points on the planes of their polygons
+        sides = (np.cross(self.edges[polygons], points[:, None] - self.vertices[polygons]) * self.inside_normals[polygons][:, None]).sum(axis=-1)
+        return ((sides >= 0) | ~self.edge_mask[polygons]).all(axis=1)
+
+def sample_camera_locations(count, radius, target_location, rng=random):
+    # count candidates of sample_camera_pose, drawn in the same order
+    draws = np.array([rng.random() for _ in range(2 * count)]).reshape(count, 2)
+    theta = 2 * math.pi * draws[:, 0]
+    phi = math.pi / 2 * draws[:, 1]
+    return radius * np.stack([np.sin(phi) * np.cos(theta), np.sin(phi) * np.sin(theta), np.cos(phi)], axis=1) + target_location
+
+def xyz_from_rotations(rows):
+    # xyz_from_mat3 of a batch of rotation matrices given by rows, Euler angles in degrees
+    r = np.swapaxes(rows, 1, 2)
+    degenerate = np.abs(r[:, 2, 0]) == 1
+    theta = -np.arcsin(np.clip(r[:, 2, 0], -1, 1))
+    psi = np.arctan2(r[:, 2, 1], r[:, 2, 2])
+    phi = np.arctan2(r[:, 1, 0], r[:, 0, 0])
+    phi = np.where(degenerate, 0, phi)
+    theta = np.where(degenerate, -np.sign(r[:, 2, 0]) * math.pi / 2, theta)
+    psi = np.where(degenerate & (r[:, 2, 0] == -1), np.arctan2(r[:, 0, 1], r[:, 0, 2]), psi)
+    psi = np.where(degenerate & (r[:, 2, 0] == 1), np.arctan2(-r[:, 0, 1], -r[:, 0, 2]), psi)
+    return np.degrees(np.stack([psi, theta, phi], axis=1))
+
+def sample_valid_camera_poses(N, radius, target_location, walls, batch_size=256, rng=random, max_candidates=None):
+    # (locations, rotations) as (N, 3) arrays, the y-up locations and rotateXYZ angles get_valid_camera_poses gives
+    # walls: polygons of points or ObstaclePolygons, e.g. an ObstacleBVH, to be reused across calls
+    # max_candidates: raises instead of sampling forever when the target can not be seen from the hemisphere
+    locations = sample_valid_camera_locations(N, radius, target_location, walls, batch_size, rng, max_candidates)
+    return look_at_poses(locations, np.broadcast_to(np.asarray(tuple(target_location), dtype=np.float64), (N, 3)))
+
+def sample_valid_camera_locations(N, radius, target_location, walls, batch_size=256, rng=random, max_candidates=None):
+    # z-up locations of sample_valid_camera_poses, before they look at the target
+    obstacles = walls if isinstance(walls, ObstaclePolygons) else ObstaclePolygons(walls)
+    target = np.asarray(tuple(target_location), dtype=np.float64)
+    locations = []
+    found = 0
+    sampled = 0
+    while found < N:
+        if max_candidates is not None and sampled >= max_candidates:
+            raise RuntimeError(f'only {found} of {N} camera poses see the target among {sampled} candidates')
+        sampled += batch_size
+        candidates = sample_camera_locations(batch_size, radius, target, rng)
+        valid = candidates[~obstacles.blocks(candidates, np.broadcast_to(target, candidates.shape))][:N - found]
+        locations.append(valid)
+        found += len(valid)
+    return np.concatenate(locations)
+
+def look_at_poses(locations, targets):
+    # y-up locations and rotateXYZ angles of cameras at locations looking at targets, both z-up (N, 3) arrays
+    locations = locations[:, [1, 2, 0]] # @ mat_z_to_y
+    back = normalize_rows(locations - targets[:, [1, 2, 0]]) # Z
+    right = normalize_rows(np.cross(np.array([0.0, 1.0, 0.0]), back)) # X
+    rows = np.stack([right, np.cross(back, right), back], axis=1)
+    return locations, xyz_from_rotations(rows)
@@ -0,0 +1,187 @@
+import argparse
+import math
+import time
+import numpy as np
+
+import os
+import sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+from camera_utils import ObstaclePolygons
+
+# bounding volume hierarchy over the obstacle polygons of a scene, built once, for occlusion queries of many segments
+# at once; same answers as ObstaclePolygons.blocks, whose plane and inside tests run on the polygons of the leaves a
+# segment reaches, so it can be given to sample_valid_camera_poses or any visibility code in place of ObstaclePolygons
+# nodes are flat arrays, children of a node split its polygons at the median of their AABB centers along the widest
+# axis; segments walk the tree together, level by level, and leave it once something blocks them
+#
+# python obstacle_bvh.py --polygons 10000 40000 --segments 8192
+
+BVH_LEAF_SIZE = 8 # polygons per leaf
+BVH_SEGMENTS = 2**14 # segments walking the tree at once
+
+class ObstacleBVH(ObstaclePolygons):
+    def __init__(self, polygons, leaf_size=BVH_LEAF_SIZE):
+        super().__init__(polygons)
+        self.leaf_size = leaf_size
+        self.build()
+
+    def build(self):
+        # degenerate polygons never block and are left out
+        items = np.flatnonzero(np.abs(self.plane_normals).sum(axis=1) > 0)
+        mask = self.edge_mask[..., None]
+        lows = np.where(mask, self.vertices, np.inf).min(axis=1)
+        highs = np.where(mask, self.vertices, -np.inf).max(axis=1)
+        centers = (lows + highs) / 2
+        # boxes padded so that rounding never misses a polygon lying on a box face
+        padding = 1e-9 * max(1.0, float(np.abs(self.vertices).max(initial=0)))
+        node_lows, node_highs, node_left, node_right, node_start, node_count = [], [], [], [], [], []
+        order = []
+        def add():
+            for nodes in (node_lows, node_highs):
+                nodes.append(None)
+            for nodes in (node_left, node_right, node_start, node_count):
+                nodes.append(-1)
+            return len(node_left) - 1
+        stack = [(add(), items)] if len(items) else []
+        while stack:
+            node, items = stack.pop()
+            node_lows[node] = lows[items].min(axis=0) - padding
+            node_highs[node] = highs[items].max(axis=0) + padding
+            if len(items) <= self.leaf_size:
+                node_start[node] = len(order)
+                node_count[node] = len(items)
+                order.extend(items)
+                continue
+            axis = np.argmax(centers[items].max(axis=0) - centers[items].min(axis=0))
+            half = len(items) // 2
+            partition = np.argpartition(centers[items, axis], half)
+            node_left[node], node_right[node] = add(), add()
+            stack.append((node_left[node], items[partition[:half]]))
+            stack.append((node_right[node], items[partition[half:]]))
+        self.node_count = len(node_left)
+        self.node_lows = np.array(node_lows, dtype=np.float64).reshape(-1, 3)
+        self.node_highs = np.array(node_highs, dtype=np.float64).reshape(-1, 3)
+        self.node_left = np.array(node_left, dtype=np.int64) # -1 for leaves
+        self.node_right = np.array(node_right, dtype=np.int64)
+        self.node_start = np.array(node_start, dtype=np.int64) # polygons of a leaf in order
+        self.node_polygons = np.array(node_count, dtype=np.int64)
+        self.order = np.array(order, dtype=np.int64)
+
+    def blocks(self, origins, targets):
+        # whether each segment from origins to targets crosses a polygon before its target
+        blocked = np.zeros(len(origins), dtype=bool)
+        if self.node_count == 0:
+            return blocked
+        for start in range(0, len(origins), BVH_SEGMENTS):
+            chunk = slice(start, start + BVH_SEGMENTS)
+            blocked[chunk] = self.blocks_chunk(origins[chunk], targets[chunk])
+        return blocked
+
+    def blocks_chunk(self, origins, targets):
+        offsets = targets - origins
+        lengths = np.linalg.norm(offsets, axis=-1)
+        directions = offsets / lengths[:, None]
+        inverses = 1 / np.where(directions == 0, 1e-300, directions) # no 0 * inf in the slab test
+        blocked = np.zeros(len(origins), dtype=bool)
+        segments = np.arange(len(origins))
+        nodes = np.zeros(len(origins), dtype=np.int64)
+        while len(segments):
+            # slab test of each segment against the box of its node
+            near = (self.node_lows[nodes] - origins[segments]) * inverses[segments]
+            far = (self.node_highs[nodes] - origins[segments]) * inverses[segments]
+            t_near = np.minimum(near, far).max(axis=1)
+            t_far = np.maximum(near, far).min(axis=1)
+            hit = (t_near <= t_far) & (t_far >= 0) & (t_near <= lengths[segments])
+            segments, nodes = segments[hit], nodes[hit]
+            leaf = self.node_left[nodes] < 0
+            if leaf.any():
+                counts = self.node_polygons[nodes[leaf]]
+                pair_segments = np.repeat(segments[leaf], counts)
+                positions = np.repeat(self.node_start[nodes[leaf]] - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+                crosses = self.crosses(origins[pair_segments], directions[pair_segments], lengths[pair_segments], self.order[positions])
+                blocked[pair_segments[crosses]] = True
+            segments, nodes = segments[~leaf], nodes[~leaf]
+            walking = ~blocked[segments]
+            segments, nodes = segments[walking], nodes[walking]
+            segments = np.concatenate([segments, segments])
+            nodes = np.concatenate([self.node_left[nodes], self.node_right[nodes]])
+        return blocked
+
+def box_polygons(low, high):
+    # the 6 faces of an axis aligned box
+    (x0, y0, z0), (x1, y1, z1) = low, high
+    return [
+        [(x0, y0, z0), (x1, y0, z0), (x1, y1, z0), (x0, y1, z0)],
+        [(x0, y0, z1), (x1, y0, z1), (x1, y1, z1), (x0, y1, z1)],
+        [(x0, y0, z0), (x1, y0, z0), (x1, y0, z1), (x0, y0, z1)],
+        [(x0, y1, z0), (x1, y1, z0), (x1, y1, z1), (x0, y1, z1)],
+        [(x0, y0, z0), (x0, y1, z0), (x0, y1, z1), (x0, y0, z1)],
+        [(x1, y0, z0), (x1, y1, z0), (x1, y1, z1), (x1, y0, z1)],
+    ]
+
+def make_synthetic_scene(polygon_count, rng, room_size=4.0, room_height=3.0, furniture=4):
+    # (polygons, rooms), a square grid of rooms like scene.json gives, floor, ceiling and 4 walls each, with pieces of
+    # furniture as boxes and walls of neighbouring rooms split around a doorway
+    per_room = 2 + 4 * 3 + 6 * furniture
+    side = max(1, math.ceil(math.sqrt(polygon_count / per_room)))
+    polygons, rooms = [], []
+    for i in range(side):
+        for j in range(side):
+            x0, y0 = i * room_size, j * room_size
+            x1, y1 = x0 + room_size, y0 + room_size
+            rooms.append(((x0, y0, 0.0), (x1, y1, room_height)))
+            polygons.append([(x0, y0, 0), (x1, y0, 0), (x1, y1, 0), (x0, y1, 0)])
+            polygons.append([(x0, y0, room_height), (x1, y0, room_height), (x1, y1, room_height), (x0, y1, room_height)])
+            for start, end in (((x0, y0), (x1, y0)), ((x1, y0), (x1, y1)), ((x1, y1), (x0, y1)), ((x0, y1), (x0, y0))):
+                # wall, doorway 1 m wide and 2 m high in the middle, as 3 convex quads
+                a, b = np.array(start), np.array(end)
+                d0, d1 = a + (b - a) * 0.375, a + (b - a) * 0.625
+                for p, q, bottom in ((a, d0, 0.0), (d1, b, 0.0), (d0, d1, 2.0)):
+                    polygons.append([(p[0], p[1], bottom), (q[0], q[1], bottom), (q[0], q[1], room_height), (p[0], p[1], room_height)])
+            for _ in range(furniture):
+                size = rng.uniform(0.3, 1.2, 3) * (1, 1, 1.5)
+                low = np.array([rng.uniform(x0 + 0.2, x1 - 0.2 - size[0]), rng.uniform(y0 + 0.2, y1 - 0.2 - size[1]), 0.0])
+                polygons.extend(box_polygons(low, low + size))
+    return polygons, rooms
+
+def sample_synthetic_segments(count, rooms, rng):
+    # half of the segments stay in a room, like a camera and its target, the other half cross the scene
+    low = np.array([room[0] for room in rooms])
+    high = np.array([room[1] for room in rooms])
+    def sample_points(room_indices):
+        return low[room_indices] + rng.uniform(0.05, 0.95, (len(room_indices), 3)) * (high[room_indices] - low[room_indices])
+    local = rng.integers(len(rooms), size=count // 2)
+    origins = np.concatenate([sample_points(local), sample_points(rng.integers(len(rooms), size=count - count // 2))])
+    targets = np.concatenate([sample_points(local), sample_points(rng.integers(len(rooms), size=count - count // 2))])
+    return origins, targets
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_obstacle_bvh(polygon_counts=(10000, 40000), segment_count=8192, seed=0):
+    # prints a row per scene, returns whether the BVH gave the answers of the linear test
+    identical = True
+    print(f'{"polygons":>9}{"segments":>10}{"blocked":>9}{"linear s":>10}{"build s":>9}{"nodes":>7}{"bvh s":>8}{"speedup":>9}{"same":>6}')
+    for polygon_count in polygon_counts:
+        rng = np.random.default_rng(seed)
+        polygons, rooms = make_synthetic_scene(polygon_count, rng)
+        origins, targets = sample_synthetic_segments(segment_count, rooms, rng)
+        reference, linear_time = timed(ObstaclePolygons(polygons).blocks, origins, targets)
+        bvh, build_time = timed(ObstacleBVH, polygons)
+        blocked, bvh_time = timed(bvh.blocks, origins, targets)
+        same = bool((reference == blocked).all())
+        identical = identical and same
+        print(f'{len(polygons):>9}{segment_count:>10}{int(blocked.sum()):>9}{linear_time:>10.3f}{build_time:>9.3f}{bvh.node_count:>7}{bvh_time:>8.3f}'
+            f'{linear_time / max(bvh_time, 1e-9):>8.1f}x{"yes" if same else "NO":>6}')
+    return identical
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='benchmark ObstacleBVH against ObstaclePolygons on synthetic scenes')
+    parser.add_argument('--polygons', type=int, nargs='+', default=[10000, 40000])
+    parser.add_argument('--segments', type=int, default=8192)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    sys.exit(0 if benchmark_obstacle_bvh(args.polygons, args.segments, args.seed) else 1)
@@ -1,6 +1,8 @@
 import omni
 #omni.kit.pipapi.install("PyYaml")
 #omni.kit.pipapi.install('usd-core')
-from .extension import *
+import importlib.util
+if importlib.util.find_spec('omni.ext') is not None: # outside of Kit only the offline description tools are importable
+    from .extension import *
 
 
@@ -0,0 +1,115 @@
+import argparse, time
+from .offline import *
+from .batch import resolve_batch, to_array
+from .asset_index import set_asset_index_folder, get_asset_paths
+from .aabb_cache import set_aabb_cache_folder, get_aabb_cache
+from .asset_metadata import AssetMetadataIndex
+from .benchmark import benchmark_bin_pack, BIN_PACK_BENCHMARK_CONFIGS
+
+# python -m omni.replicator.object.description resolve demo_bin_pack --frames 0:10000 --workers 16
+# python -m omni.replicator.object.description sample demo_bin_pack --frames 0:100000 --output samples.npz
+# python -m omni.replicator.object.description benchmark-bin-pack --synthetic-boxes 50 --scale 10
+# python -m omni.replicator.object.description index-aabbs /data/boxes --aabb-cache aabb_cache --workers 16
+# python -m omni.replicator.object.description index-assets /data/boxes --database assets.sqlite --workers 16
+# python -m omni.replicator.object.description query-assets /data/boxes --database assets.sqlite --where 'triangle_count <= 5000'
+
+def parse_frames(text):
+    # "stop" or "start:stop"
+    start, _, stop = text.rpartition(':')
+    return range(int(start) if start else 0, int(stop))
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m omni.replicator.object.description')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    resolve = subparsers.add_parser('resolve', help='resolve frame descriptions without Kit')
+    resolve.add_argument('config', help='description file, or name of a config in the configs folder')
+    resolve.add_argument('--frames', type=parse_frames, default=None, help='start:stop, all num_frames by default')
+    resolve.add_argument('--workers', type=int, default=1)
+    resolve.add_argument('--output', default=None, help='folder of frame descriptions, <output_path>/descriptions by default')
+    resolve.add_argument('--aabb-sidecar', default=None, help='yaml/json of usd path -> local AABB, for local_aabb pitches')
+    resolve.add_argument('--config-cache', default=None, help='folder of parsed configs kept across runs')
+    resolve.add_argument('--asset-index', default=None, help='folder of asset folder listings kept across runs')
+    resolve.add_argument('--aabb-cache', default=None, help='folder of local AABBs of usd files kept across runs, for local_aabb pitches')
+    sample = subparsers.add_parser('sample', help='resolve distribution attributes for many frames at once, to an npz')
+    sample.add_argument('config', help='description file, or name of a config in the configs folder')
+    sample.add_argument('--frames', type=parse_frames, default=None, help='start:stop, all num_frames by default')
+    sample.add_argument('--names', nargs='*', default=None, help='mutable elements to sample, all distribution attributes by default')
+    sample.add_argument('--output', required=True, help='npz file, one array per mutable element, object arrays (np.load with allow_pickle) for rows of different shapes')
+    sample.add_argument('--aabb-sidecar', default=None, help='yaml/json of usd path -> local AABB, for local_aabb pitches')
+    sample.add_argument('--config-cache', default=None, help='folder of parsed configs kept across runs')
+    sample.add_argument('--asset-index', default=None, help='folder of asset folder listings kept across runs')
+    sample.add_argument('--aabb-cache', default=None, help='folder of local AABBs of usd files kept across runs, for local_aabb pitches')
+    benchmark = subparsers.add_parser('benchmark-bin-pack', help='time pack_bin against py3dbp on the bin_pack harmonizers of configs')
+    benchmark.add_argument('configs', nargs='*', default=list(BIN_PACK_BENCHMARK_CONFIGS), help='description files, or names of configs in the configs folder')
+    benchmark.add_argument('--frames', type=parse_frames, default=range(3), help='start:stop, 0:3 by default')
+    benchmark.add_argument('--aabb-sidecar', default=None, help='yaml/json of usd path -> local AABB, for local_aabb pitches')
+    benchmark.add_argument('--synthetic-boxes', type=int, default=None, help='boxes of seeded sizes listed by every folder attribute, instead of the assets')
+    benchmark.add_argument('--scale', type=int, default=1, help='packs the items of each bin that many times over')
+    benchmark.add_argument('--config-cache', default=None, help='folder of parsed configs kept across runs')
+    benchmark.add_argument('--asset-index', default=None, help='folder of asset folder listings kept across runs')
+    index = subparsers.add_parser('index-aabbs', help='compute the local AABBs of the usd files of asset folders ahead of time')
+    index.add_argument('folders', nargs='+', help='asset folders, searched recursively')
+    index.add_argument('--suffix', default='usd')
+    index.add_argument('--aabb-cache', required=True, help='folder of local AABBs of usd files kept across runs')
+    index.add_argument('--workers', type=int, default=1)
+    index_assets = subparsers.add_parser('index-assets', help='write bounds, mesh, point and triangle counts and material inputs of usd files to a sqlite database')
+    index_assets.add_argument('folders', nargs='+', help='asset folders, searched recursively')
+    index_assets.add_argument('--suffix', default='usd')
+    index_assets.add_argument('--database', required=True, help='sqlite file, updated in place')
+    index_assets.add_argument('--aabb-cache', default=None, help='folder of local AABBs of usd files to fill as well')
+    index_assets.add_argument('--workers', type=int, default=1)
+    query_assets = subparsers.add_parser('query-assets', help='list the indexed usd files of a folder, in folder attribute order')
+    query_assets.add_argument('folder')
+    query_assets.add_argument('--suffix', default='usd')
+    query_assets.add_argument('--database', required=True)
+    query_assets.add_argument('--where', default=None, help='SQL condition on the columns of the assets table')
+    query_assets.add_argument('--triangles', action='store_true', help='print the total triangle count instead')
+    args = parser.parse_args()
+    set_config_cache_folder(getattr(args, 'config_cache', None))
+    set_asset_index_folder(getattr(args, 'asset_index', None))
+    set_aabb_cache_folder(getattr(args, 'aabb_cache', None))
+
+    if args.command == 'resolve':
+        start = time.time()
+        output_paths = resolve_frames_parallel(args.config, args.frames, args.workers, args.output, args.aabb_sidecar)
+        folder = os.path.dirname(output_paths[0]) if output_paths else args.output
+        print(f'{EXTENSION_NAME} resolved {len(output_paths)} frame descriptions in {time.time() - start:.2f}s to {folder}')
+    elif args.command == 'sample':
+        start = time.time()
+        description = create_offline_description(args.config, args.aabb_sidecar)
+        frames = range(description.scene.num_frames) if args.frames is None else args.frames
+        batch = resolve_batch(description, frames, args.names)
+        np.savez(args.output, frames=np.array(list(frames)), **{name: to_array(values) for name, values in batch.items()})
+        print(f'{EXTENSION_NAME} sampled {len(batch)} mutable elements over {len(frames)} frames in {time.time() - start:.2f}s to {args.output}')
+    elif args.command == 'index-aabbs':
+        start = time.time()
+        cache = get_aabb_cache()
+        paths = [path for folder in args.folders for path in get_asset_paths(folder, args.suffix, True)]
+        count = cache.index(paths, args.workers)
+        print(f'{EXTENSION_NAME} indexed {count} of {len(paths)} usd files in {time.time() - start:.2f}s to {cache.get_path()}, {cache.report()}')
+    elif args.command == 'index-assets':
+        start = time.time()
+        index = AssetMetadataIndex(args.database)
+        cache = get_aabb_cache()
+        try:
+            for folder in args.folders:
+                computed, count = index.index(folder, args.suffix, args.workers, cache)
+                print(f'{EXTENSION_NAME} indexed {computed} of {count} usd files of {folder}')
+        finally:
+            index.close()
+        print(f'{EXTENSION_NAME} indexed {len(args.folders)} folders in {time.time() - start:.2f}s to {args.database}')
+    elif args.command == 'query-assets':
+        index = AssetMetadataIndex(args.database)
+        paths = index.get_paths(args.folder, args.suffix, args.where)
+        if args.triangles:
+            print(index.get_triangle_count(paths))
+        else:
+            for path in paths:
+                print(path)
+        index.close()
+    elif args.command == 'benchmark-bin-pack':
+        if not benchmark_bin_pack(args.configs, args.frames, args.aabb_sidecar, args.synthetic_boxes, args.scale):
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+from .misc import *
+import concurrent.futures, hashlib, threading
+import numpy as np
+try:
+    from pxr import Usd
+except ImportError:
+    Usd = None
+
+# local AABBs of usd files for local_aabb pitches, so that resolving them does not switch variants on the stage
+# the AABB of a file is what get_prim_aabb_trimesh gives for a mesh referencing it, the min/max of the points of the Mesh
+# prims under its default prim, without their transforms
+# entries are keyed by absolute path, revalidated by mtime and size, then by the sha1 of the content, which also finds
+# copies of a file; an AABB is computed on first use when pxr can open the file, or ahead of time with index-aabbs,
+# and persisted to <folder>/aabb_cache.json
+
+AABB_CACHE_VERSION = 1
+AABB_CACHE_FILE = 'aabb_cache.json'
+AABB_HASH_CHUNK = 2**20
+
+aabb_caches = {} # folder -> AabbCache
+aabb_cache_folder = None # used by descriptions without aabb_cache_folder
+aabb_cache_lock = threading.Lock()
+
+def set_aabb_cache_folder(folder):
+    global aabb_cache_folder
+    aabb_cache_folder = folder
+
+def get_usd_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+def get_usd_hash(path):
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as usd_file:
+        for chunk in iter(lambda: usd_file.read(AABB_HASH_CHUNK), b''):
+            sha1.update(chunk)
+    return sha1.hexdigest()
+
+def compute_usd_aabb(path):
+    # [[min_x, min_y, min_z], [max_x, max_y, max_z]], None without pxr or meshes, or when pxr can not read the file
+    if Usd is None:
+        return None
+    try:
+        stage = Usd.Stage.Open(path)
+        if stage is None or not stage.GetDefaultPrim():
+            return None # a reference without prim path brings nothing then
+        mins, maxs = [], []
+        for prim in Usd.PrimRange(stage.GetDefaultPrim()):
+            if prim.GetTypeName() == 'Mesh':
+                points = prim.GetAttribute('points').Get()
+                if points is not None and len(points) > 0:
+                    points = np.asarray(points, dtype=np.float64)
+                    mins.append(points.min(axis=0))
+                    maxs.append(points.max(axis=0))
+    except Exception:
+        return None # e.g. pxr.Tf.ErrorException, which can not be pickled back from index workers either
+    if not mins:
+        return None
+    return [np.min(mins, axis=0).tolist(), np.max(maxs, axis=0).tolist()]
+
+def compute_usd_entry(path):
+    # runs in index workers
+    stamp = get_usd_stamp(path)
+    sha1 = get_usd_hash(path)
+    return {'stamp': stamp, 'sha1': sha1, 'aabb': compute_usd_aabb(path)}
+
+class AabbCache:
+    def __init__(self, folder):
+        self.folder = folder
+        self.entries = {} # absolute path -> {'stamp': [mtime_ns, size], 'sha1': ..., 'aabb': [min, max]}
+        self.by_hash = {} # sha1 -> aabb
+        self.changed = False
+        self.hits = 0
+        self.computed = 0
+        self.unavailable = 0 # left to the stage
+        self.lock = threading.Lock()
+        ensure_folder_recursive(folder)
+        for path, entry in self.load().items():
+            self.add(path, entry)
+        self.changed = False
+
+    def add(self, path, entry):
+        self.entries[path] = entry
+        self.by_hash[entry['sha1']] = entry['aabb']
+        self.changed = True
+
+    def is_valid(self, path):
+        entry = self.entries.get(path)
+        return entry is not None and entry['stamp'] == get_usd_stamp(path)
+
+    def get(self, usd_path):
+        # AABB of a local usd file, None when it can not be computed here
+        path = os.path.abspath(usd_path)
+        with self.lock:
+            stamp = get_usd_stamp(path)
+            if stamp is None:
+                self.unavailable += 1
+                return None
+            entry = self.entries.get(path)
+            if entry is not None and entry['stamp'] == stamp:
+                self.hits += 1
+                return entry['aabb']
+            sha1 = get_usd_hash(path)
+            aabb = self.by_hash.get(sha1)
+            if aabb is not None:
+                self.hits += 1
+            else:
+                aabb = compute_usd_aabb(path)
+                if aabb is None:
+                    self.unavailable += 1
+                    return None
+                self.computed += 1
+            self.add(path, {'stamp': stamp, 'sha1': sha1, 'aabb': aabb})
+            return aabb
+
+    def index(self, paths, workers=1):
+        # computes the AABBs of paths not in the cache yet, returns how many
+        if Usd is None:
+            error('computing AABBs of usd files needs pxr, e.g. from the usd-core package')
+        pending = [os.path.abspath(path) for path in paths]
+        pending = [path for path in pending if not self.is_valid(path)]
+        if workers > 1 and len(pending) > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                entries = list(executor.map(compute_usd_entry, pending, chunksize=16))
+        else:
+            entries = [compute_usd_entry(path) for path in pending]
+        with self.lock:
+            for path, entry in zip(pending, entries):
+                if entry['aabb'] is not None:
+                    self.add(path, entry)
+                    self.computed += 1
+                else:
+                    self.unavailable += 1
+        self.save()
+        return len(pending)
+
+    def report(self):
+        return f'AABB cache: {self.hits} hits, {self.computed} computed, {self.unavailable} left to the stage, {len(self.entries)} files'
+
+    def get_path(self):
+        return f'{self.folder}/{AABB_CACHE_FILE}'
+
+    def load(self):
+        try:
+            with open(self.get_path()) as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != AABB_CACHE_VERSION:
+            return {}
+        return data['entries']
+
+    def save(self):
+        # merged with what other processes saved meanwhile
+        with self.lock:
+            if not self.changed:
+                return
+            entries = self.load()
+            entries.update(self.entries)
+            path = self.get_path()
+            temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+            with open(temp_path, 'w') as cache_file:
+                json.dump({'version': AABB_CACHE_VERSION, 'entries': entries}, cache_file)
+            os.replace(temp_path, path) # processes may write the same file
+            self.changed = False
+
+def get_aabb_cache(folder=None):
+    # shared by the descriptions of a process, None without a folder
+    folder = folder if folder is not None else aabb_cache_folder
+    if folder is None:
+        return None
+    with aabb_cache_lock:
+        key = os.path.abspath(folder)
+        if key not in aabb_caches:
+            aabb_caches[key] = AabbCache(folder)
+        return aabb_caches[key]
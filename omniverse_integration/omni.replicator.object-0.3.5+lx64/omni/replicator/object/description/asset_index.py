@@ -0,0 +1,153 @@
+from .misc import *
+import concurrent.futures, hashlib, threading, time
+
+# listings of asset folders shared by all folder attributes and descriptions of a process, optionally persisted
+# a listing is revalidated by the mtime of its directories, a directory is only listed again when it changed
+# paths come in the order of os.walk(root, topdown=False), which seeds and indices of folder attributes depend on
+
+ASSET_INDEX_VERSION = 1
+ASSET_INDEX_THREADS = 16
+ASSET_INDEX_REVALIDATE_SECONDS = 10 # a listing validated this recently is used as is
+ASSET_INDEX_MTIME_SLACK_NS = 2 * 10**9 # a directory modified this close to its listing may change within the same mtime
+
+asset_indices = {} # (root, suffix) -> AssetIndex
+asset_index_folder = None
+asset_index_lock = threading.Lock()
+
+def set_asset_index_folder(folder):
+    global asset_index_folder
+    if folder is not None:
+        ensure_folder_recursive(folder)
+    asset_index_folder = folder
+
+def get_directory_mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+def scan_directory(path, suffix):
+    # (mtime, subdirectories os.walk goes into, files with the suffix), like one step of os.walk
+    mtime = get_directory_mtime(path)
+    walk_dirs, files = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    is_dir = False
+                if not is_dir:
+                    if entry.name.endswith(suffix):
+                        files.append(entry.name)
+                    continue
+                try:
+                    is_symlink = entry.is_symlink()
+                except OSError:
+                    is_symlink = False
+                if not is_symlink:
+                    walk_dirs.append(entry.name)
+    except OSError:
+        return (None, [], []) # os.walk skips what it can not list
+    if mtime is not None and time.time_ns() - mtime < ASSET_INDEX_MTIME_SLACK_NS:
+        mtime = None # list it again next time
+    return (mtime, walk_dirs, files)
+
+class AssetIndex:
+    def __init__(self, root, suffix, directories=None):
+        self.root = root
+        self.suffix = suffix
+        self.directories = directories if directories is not None else {} # path relative to root -> (mtime, walk_dirs, files)
+        self.validated = None
+        self.full_paths = None
+        self.relative_paths = None
+
+    def get_path(self, relative_dir):
+        return self.root if relative_dir == '' else os.path.join(self.root, relative_dir)
+
+    def refresh_directory(self, relative_dir):
+        known = self.directories.get(relative_dir)
+        if known is not None and known[0] is not None and known[0] == get_directory_mtime(self.get_path(relative_dir)):
+            return known
+        return scan_directory(self.get_path(relative_dir), self.suffix)
+
+    def update(self):
+        # level by level from the root, each level in parallel, returns whether anything changed
+        directories = {}
+        pending = ['']
+        with concurrent.futures.ThreadPoolExecutor(ASSET_INDEX_THREADS) as executor:
+            while pending:
+                next_pending = []
+                for relative_dir, listing in zip(pending, executor.map(self.refresh_directory, pending)):
+                    directories[relative_dir] = listing
+                    next_pending += [name if relative_dir == '' else os.path.join(relative_dir, name) for name in listing[1]]
+                pending = next_pending
+        changed = directories != self.directories
+        self.directories = directories
+        self.validated = time.monotonic()
+        if changed:
+            self.full_paths = None
+            self.relative_paths = None
+        return changed
+
+    def collect(self, relative_dir, paths, is_full_path):
+        # subdirectories first, then the files of the directory itself
+        mtime, walk_dirs, files = self.directories[relative_dir]
+        for name in walk_dirs:
+            self.collect(name if relative_dir == '' else os.path.join(relative_dir, name), paths, is_full_path)
+        if is_full_path:
+            directory = self.get_path(relative_dir)
+            paths += [os.path.join(directory, file) for file in files]
+        else:
+            paths += [file if relative_dir == '' else os.path.join(relative_dir, file) for file in files]
+
+    def get_paths(self, is_full_path):
+        if is_full_path:
+            if self.full_paths is None:
+                self.full_paths = []
+                self.collect('', self.full_paths, True)
+            return self.full_paths
+        if self.relative_paths is None:
+            self.relative_paths = []
+            self.collect('', self.relative_paths, False)
+        return self.relative_paths
+
+    def get_sidecar_path(self):
+        key = hashlib.sha1(f'{os.path.abspath(self.root)}\n{self.suffix}'.encode()).hexdigest()
+        return f'{asset_index_folder}/{key}.json'
+
+    def load(self):
+        try:
+            with open(self.get_sidecar_path()) as sidecar:
+                data = json.load(sidecar)
+        except (OSError, ValueError):
+            return
+        if data.get('version') == ASSET_INDEX_VERSION and data.get('root') == os.path.abspath(self.root) and data.get('suffix') == self.suffix:
+            self.directories = {relative_dir: tuple(listing) for relative_dir, listing in data['directories'].items()}
+
+    def save(self):
+        data = {
+            'version': ASSET_INDEX_VERSION,
+            'root': os.path.abspath(self.root),
+            'suffix': self.suffix,
+            'directories': self.directories,
+        }
+        sidecar_path = self.get_sidecar_path()
+        temp_path = f'{sidecar_path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp_path, 'w') as sidecar:
+            json.dump(data, sidecar)
+        os.replace(temp_path, sidecar_path) # processes may write the same sidecar
+
+def get_asset_paths(root_folder, suffix, is_full_path=False):
+    # same paths as get_relative_paths_of_suffix
+    with asset_index_lock:
+        key = (root_folder, suffix)
+        index = asset_indices.get(key)
+        if index is None:
+            index = asset_indices[key] = AssetIndex(root_folder, suffix)
+            if asset_index_folder is not None:
+                index.load()
+        if index.validated is None or time.monotonic() - index.validated > ASSET_INDEX_REVALIDATE_SECONDS:
+            if index.update() and asset_index_folder is not None:
+                index.save()
+        return list(index.get_paths(is_full_path))
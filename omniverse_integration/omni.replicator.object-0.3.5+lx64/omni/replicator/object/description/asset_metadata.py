@@ -0,0 +1,209 @@
+from .misc import *
+from .asset_index import get_asset_paths
+from .aabb_cache import Usd, get_usd_stamp, get_usd_hash
+import concurrent.futures, sqlite3
+import numpy as np
+try:
+    from pxr import UsdShade
+except ImportError:
+    UsdShade = None
+
+# statistics of the usd files of asset folders in a sqlite database, computed with pxr outside Kit, so that bounds,
+# mesh, point and triangle counts and material inputs of assets are known without loading them on the stage
+# like create_variant_mesh, what is counted is under the default prim of a file, which is what a reference brings in,
+# the AABB is the one of aabb_cache, points of the meshes without their transforms
+#
+# assets: a row per file, ordinal is its index in get_asset_paths(root, suffix, True), so that queries keep the order
+#         folder attributes see; error is set for files pxr could not read, their statistics are null
+# material_inputs: a row per input of each Shader prim, values as text
+#
+# python -m omni.replicator.object.description index-assets /data/boxes --database assets.sqlite --workers 16
+# AssetMetadataIndex('assets.sqlite').get_paths('/data/boxes', 'usd', 'triangle_count <= ?', (5000,))
+
+ASSET_METADATA_VERSION = 1
+ASSET_METADATA_CHUNK = 64 # files per worker task and per transaction
+
+ASSET_METADATA_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS assets (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    suffix TEXT NOT NULL,
+    relative_path TEXT NOT NULL,
+    ordinal INTEGER NOT NULL,
+    mtime_ns INTEGER,
+    size INTEGER,
+    sha1 TEXT,
+    min_x REAL, min_y REAL, min_z REAL,
+    max_x REAL, max_y REAL, max_z REAL,
+    mesh_count INTEGER,
+    point_count INTEGER,
+    face_count INTEGER,
+    triangle_count INTEGER,
+    material_count INTEGER,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS assets_root ON assets (root, suffix, ordinal);
+CREATE TABLE IF NOT EXISTS material_inputs (
+    path TEXT NOT NULL,
+    material TEXT,
+    shader TEXT NOT NULL,
+    shader_id TEXT,
+    input TEXT NOT NULL,
+    type TEXT,
+    value TEXT
+);
+CREATE INDEX IF NOT EXISTS material_inputs_path ON material_inputs (path);
+'''
+
+ASSET_STATISTICS = ('min_x', 'min_y', 'min_z', 'max_x', 'max_y', 'max_z', 'mesh_count', 'point_count', 'face_count', 'triangle_count', 'material_count')
+
+def get_material_path(prim):
+    # nearest Material prim above a shader
+    while prim and prim.GetTypeName() != 'Material':
+        prim = prim.GetParent()
+    return prim.GetPath().pathString if prim else None
+
+def compute_asset_metadata(path):
+    # (statistics, material inputs, error), runs in index workers
+    try:
+        stage = Usd.Stage.Open(path)
+    except Exception as e:
+        return None, [], str(e).strip()
+    if stage is None or not stage.GetDefaultPrim():
+        return None, [], 'no default prim'
+    mins, maxs = [], []
+    statistics = {'mesh_count': 0, 'point_count': 0, 'face_count': 0, 'triangle_count': 0, 'material_count': 0}
+    material_inputs = []
+    for prim in Usd.PrimRange(stage.GetDefaultPrim()):
+        type_name = prim.GetTypeName()
+        if type_name == 'Mesh':
+            statistics['mesh_count'] += 1
+            points = prim.GetAttribute('points').Get()
+            if points is not None and len(points) > 0:
+                points = np.asarray(points, dtype=np.float64)
+                mins.append(points.min(axis=0))
+                maxs.append(points.max(axis=0))
+                statistics['point_count'] += len(points)
+            counts = prim.GetAttribute('faceVertexCounts').Get()
+            if counts is not None and len(counts) > 0:
+                counts = np.asarray(counts, dtype=np.int64)
+                statistics['face_count'] += len(counts)
+                statistics['triangle_count'] += int(np.maximum(counts - 2, 0).sum()) # fan triangulation
+        elif type_name == 'Material':
+            statistics['material_count'] += 1
+        elif type_name == 'Shader' and UsdShade is not None:
+            shader = UsdShade.Shader(prim)
+            shader_id = shader.GetIdAttr().Get()
+            if shader_id is None:
+                source_asset = shader.GetSourceAsset('mdl')
+                shader_id = source_asset.path if source_asset else None
+            for shader_input in shader.GetInputs():
+                value = shader_input.Get()
+                material_inputs.append((get_material_path(prim), prim.GetPath().pathString, None if shader_id is None else str(shader_id),
+                    shader_input.GetBaseName(), str(shader_input.GetTypeName()), None if value is None else str(value)))
+    if mins:
+        aabb_min, aabb_max = np.min(mins, axis=0).tolist(), np.max(maxs, axis=0).tolist()
+        statistics.update(zip(ASSET_STATISTICS[:6], aabb_min + aabb_max))
+    return statistics, material_inputs, None
+
+def compute_asset_entries(paths):
+    # one worker task, the stamp and hash are taken before the file is read
+    entries = []
+    for path in paths:
+        stamp = get_usd_stamp(path)
+        if stamp is None:
+            continue # removed meanwhile
+        sha1 = get_usd_hash(path)
+        entries.append((path, stamp, sha1) + compute_asset_metadata(path))
+    return entries
+
+class AssetMetadataIndex:
+    def __init__(self, database):
+        self.database = database
+        folder = os.path.dirname(os.path.abspath(database))
+        ensure_folder_recursive(folder)
+        self.connection = sqlite3.connect(database)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(ASSET_METADATA_SCHEMA)
+        version = self.connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+        if version is not None and int(version['value']) != ASSET_METADATA_VERSION:
+            error(f'asset metadata database {database} has version {version["value"]}, expecting {ASSET_METADATA_VERSION}, index it again into a new file')
+        self.connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (str(ASSET_METADATA_VERSION),))
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def index(self, root_folder, suffix='usd', workers=1, aabb_cache=None):
+        # (files computed, files in the folder), unchanged files are kept, rows of removed files are deleted
+        if Usd is None:
+            error('indexing usd files needs pxr, e.g. from the usd-core package')
+        root = os.path.abspath(root_folder)
+        paths = get_asset_paths(root, suffix, True)
+        known = {row['path']: [row['mtime_ns'], row['size']] for row in self.connection.execute('SELECT path, mtime_ns, size FROM assets WHERE root = ? AND suffix = ?', (root, suffix))}
+        with self.connection:
+            self.connection.executemany('UPDATE assets SET ordinal = ? WHERE path = ?', [(i, path) for i, path in enumerate(paths) if path in known])
+            removed = [(path,) for path in known.keys() - set(paths)]
+            self.connection.executemany('DELETE FROM assets WHERE path = ?', removed)
+            self.connection.executemany('DELETE FROM material_inputs WHERE path = ?', removed)
+        ordinals = {path: i for i, path in enumerate(paths)}
+        pending = [path for path in paths if known.get(path) != get_usd_stamp(path)]
+        chunks = [pending[i:i + ASSET_METADATA_CHUNK] for i in range(0, len(pending), ASSET_METADATA_CHUNK)]
+        if workers > 1 and len(chunks) > 1:
+            with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+                for entries in executor.map(compute_asset_entries, chunks):
+                    self.write(root, suffix, ordinals, entries, aabb_cache)
+        else:
+            for chunk in chunks:
+                self.write(root, suffix, ordinals, compute_asset_entries(chunk), aabb_cache)
+        if aabb_cache is not None:
+            aabb_cache.save()
+        return len(pending), len(paths)
+
+    def write(self, root, suffix, ordinals, entries, aabb_cache=None):
+        with self.connection:
+            for path, stamp, sha1, statistics, material_inputs, message in entries:
+                values = [statistics.get(name) for name in ASSET_STATISTICS] if statistics is not None else [None] * len(ASSET_STATISTICS)
+                self.connection.execute(f'INSERT OR REPLACE INTO assets VALUES ({", ".join(["?"] * 20)})',
+                    [path, root, suffix, os.path.relpath(path, root), ordinals[path], stamp[0], stamp[1], sha1] + values + [message])
+                self.connection.execute('DELETE FROM material_inputs WHERE path = ?', (path,))
+                self.connection.executemany('INSERT INTO material_inputs VALUES (?, ?, ?, ?, ?, ?, ?)', [(path,) + item for item in material_inputs])
+                if aabb_cache is not None and statistics is not None and statistics.get('min_x') is not None:
+                    aabb_cache.add(path, {'stamp': stamp, 'sha1': sha1, 'aabb': [values[:3], values[3:6]]})
+
+    def get(self, path):
+        # row of a file as a dict, None when it is not indexed
+        row = self.connection.execute('SELECT * FROM assets WHERE path = ?', (os.path.abspath(path),)).fetchone()
+        return dict(row) if row is not None else None
+
+    def get_aabb(self, path):
+        row = self.get(path)
+        if row is None or row['min_x'] is None:
+            return None
+        return [[row['min_x'], row['min_y'], row['min_z']], [row['max_x'], row['max_y'], row['max_z']]]
+
+    def get_paths(self, root_folder, suffix='usd', condition=None, parameters=()):
+        # full paths of a folder in the order of get_asset_paths, condition is an SQL expression on the columns of assets
+        query = 'SELECT path FROM assets WHERE root = ? AND suffix = ?'
+        if condition is not None:
+            query += f' AND ({condition})'
+        rows = self.connection.execute(query + ' ORDER BY ordinal', (os.path.abspath(root_folder), suffix) + tuple(parameters))
+        return [row['path'] for row in rows]
+
+    def get_material_inputs(self, path):
+        rows = self.connection.execute('SELECT material, shader, shader_id, input, type, value FROM material_inputs WHERE path = ? ORDER BY rowid', (os.path.abspath(path),))
+        return [dict(row) for row in rows]
+
+    def get_triangle_count(self, paths):
+        # triangles of usd files, each counted as often as it is given, e.g. the usd_path of every mesh of a frame
+        counts = collections.Counter(os.path.abspath(path) for path in paths)
+        total = 0
+        for path, count in counts.items():
+            row = self.get(path)
+            if row is None:
+                error(f'"{path}" is not in the asset metadata database {self.database}')
+            if row['triangle_count'] is None:
+                error(f'"{path}" could not be indexed: {row["error"]}')
+            total += row['triangle_count'] * count
+        return total
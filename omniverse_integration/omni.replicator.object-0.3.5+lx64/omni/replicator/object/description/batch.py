@@ -0,0 +1,556 @@
+from .symbol import *
+from .safe_eval import EXPRESSION_CACHE_SIZE
+import ast, builtins, functools, operator
+
+# resolve mutable elements for many frames at once, e.g. to sample parameter sets for dataset design
+# row i of a batch holds the value a per-frame resolution of frame frames[i] gives
+# numbers of a single type are arrays with one row per frame, lists of them 2-D arrays with one column per item
+# distribution attributes are drawn as arrays over the frame axis, with rng "philox" from UniformColumns, with rng
+# "legacy" from MersenneColumns, the random.Random streams attribute_seed gives each frame
+# expressions of numbers are compiled once into NumPy operations on the columns of their macros, other expressions
+# are evaluated once per distinct combination of macro values
+
+class Column:
+    # per-frame values of an operand, numbers of a single type as an array with one row per frame
+    def __init__(self, values):
+        self.values = values
+
+    def __getitem__(self, i):
+        value = self.values[i]
+        if isinstance(value, (np.ndarray, np.generic)):
+            return value.tolist()
+        return value
+
+    def tolist(self):
+        return self.values.tolist() if isinstance(self.values, np.ndarray) else self.values
+
+    def is_array(self, ndim=None):
+        return isinstance(self.values, np.ndarray) and (ndim is None or self.values.ndim == ndim)
+
+def at(value, i):
+    return value[i] if isinstance(value, Column) else value
+
+def get_number_kind(value):
+    if type(value) in (int, float):
+        return type(value)
+    if isinstance(value, list) and len(value) > 0 and all(type(item) == type(value[0]) for item in value) and type(value[0]) in (int, float):
+        return (type(value[0]), len(value))
+    return None
+
+def get_option_kind(option):
+    # the number kind of every value an option gives, None when they are not all numbers of one kind
+    if isinstance(option, Column):
+        if not option.is_array():
+            return None
+        number_type = float if option.values.dtype == np.float64 else int
+        return (number_type, option.values.shape[1]) if option.values.ndim == 2 else number_type
+    return get_number_kind(option)
+
+def get_dtype(number_type):
+    return np.float64 if number_type == float else np.int64
+
+def make_column(values):
+    # arrays only where converting back gives the same python values
+    kinds = set(get_number_kind(value) for value in values)
+    if len(kinds) == 1 and None not in kinds:
+        kind = kinds.pop()
+        number_type = kind[0] if isinstance(kind, tuple) else kind
+        try:
+            return Column(np.array(values, dtype=get_dtype(number_type)))
+        except OverflowError:
+            pass
+    return Column(values)
+
+def select(options, indices):
+    # column of at(options[indices[i]], i), e.g. the values a set draws, filled option by option
+    chosen, inverse = np.unique(indices, return_inverse=True)
+    options = [options[k] for k in chosen.tolist()]
+    if len(options) == 1 and isinstance(options[0], Column):
+        return options[0]
+    kinds = set(get_option_kind(option) for option in options)
+    if len(kinds) == 1 and None not in kinds:
+        kind = kinds.pop()
+        number_type, width = kind if isinstance(kind, tuple) else (kind, None)
+        values = np.empty(len(inverse) if width is None else (len(inverse), width), dtype=get_dtype(number_type))
+        order = np.argsort(inverse, kind='stable')
+        bounds = np.searchsorted(inverse[order], np.arange(len(options) + 1))
+        try:
+            for k, option in enumerate(options):
+                rows = order[bounds[k]:bounds[k + 1]]
+                values[rows] = option.values[rows] if isinstance(option, Column) else option
+            return Column(values)
+        except OverflowError:
+            pass
+    if any(isinstance(option, Column) for option in options):
+        # a list column can hold numbers of one kind in the frames chosen from it
+        return make_column([at(options[k], i) for i, k in enumerate(inverse.tolist())])
+    objects = np.empty(len(options), dtype=object)
+    for k, option in enumerate(options):
+        objects[k] = option # one by one, lists stay items
+    return Column(objects[inverse].tolist())
+
+def get_distinct(keys):
+    # (first frame of each distinct key, index of the key of each frame)
+    distinct = {}
+    indices = np.array([distinct.setdefault(key, len(distinct)) for key in keys], dtype=np.int64)
+    first = np.zeros(len(distinct), dtype=np.int64)
+    first[indices[::-1]] = np.arange(len(indices) - 1, -1, -1)
+    return first.tolist(), indices
+
+def stack(items, size):
+    # 2-D column of lists whose items are numbers of one type in every frame, None otherwise
+    kinds = set(get_option_kind(item) for item in items)
+    if len(kinds) != 1 or not kinds <= {int, float}:
+        return None
+    dtype = get_dtype(kinds.pop())
+    try:
+        return Column(np.stack([item.values if isinstance(item, Column) else np.full(size, item, dtype=dtype) for item in items], axis=1))
+    except OverflowError:
+        return None
+
+# expressions over number columns
+# a template whose slots are numbers in every frame evaluates with NumPy what eval_compiled gives frame by frame, only
+# where the results agree exactly: ints stay below 2**63, int operands of "/" convert to floats exactly, divisors
+# are not zero, pow and calls run the python functions on each item
+
+INT64_LIMIT = 2**63
+EXACT_FLOAT_INT = 2**53
+
+COLUMN_OPERATORS = {ast.Add: np.add, ast.Sub: np.subtract, ast.Mult: np.multiply, ast.Div: np.true_divide, ast.FloorDiv: np.floor_divide, ast.Mod: np.remainder}
+PYTHON_OPERATORS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul, ast.Div: operator.truediv, ast.FloorDiv: operator.floordiv, ast.Mod: operator.mod, ast.Pow: operator.pow}
+
+def is_int(value):
+    return value.dtype == np.int64 if isinstance(value, np.ndarray) else type(value) == int
+
+def get_bound(value):
+    # largest magnitude of an int operand
+    if isinstance(value, np.ndarray):
+        return max(int(value.max()), -int(value.min())) if len(value) > 0 else 0
+    return abs(value)
+
+def to_float(value):
+    return value.astype(np.float64) if isinstance(value, np.ndarray) else float(value)
+
+def has_zero(value):
+    return bool((value == 0).any()) if isinstance(value, np.ndarray) else value == 0
+
+def is_finite(value):
+    return bool(np.isfinite(value).all()) if isinstance(value, np.ndarray) else math.isfinite(value)
+
+def to_number_array(values):
+    # python results of a function on each item, None unless they are numbers of one type
+    values = values.tolist()
+    types = set(type(value) for value in values)
+    if types == {float}:
+        return np.array(values, dtype=np.float64)
+    if types == {int}:
+        try:
+            return np.array(values, dtype=np.int64)
+        except OverflowError:
+            return None
+    return None
+
+def apply_function(function, args):
+    if not any(isinstance(arg, np.ndarray) for arg in args):
+        value = function(*args)
+        return value if type(value) in (int, float) else None
+    return to_number_array(np.frompyfunc(function, len(args), 1)(*args))
+
+def apply_operator(op, left, right):
+    if not isinstance(left, np.ndarray) and not isinstance(right, np.ndarray):
+        value = PYTHON_OPERATORS[op](left, right)
+        return value if type(value) in (int, float) else None
+    ints = is_int(left) and is_int(right)
+    if op in (ast.Add, ast.Sub, ast.Mult):
+        if ints:
+            left_bound, right_bound = get_bound(left), get_bound(right)
+            if (left_bound * right_bound if op == ast.Mult else left_bound + right_bound) >= INT64_LIMIT:
+                return None
+            return COLUMN_OPERATORS[op](left, right)
+        return COLUMN_OPERATORS[op](to_float(left), to_float(right))
+    if has_zero(right):
+        return None
+    if op == ast.Div:
+        if ints and max(get_bound(left), get_bound(right)) > EXACT_FLOAT_INT:
+            return None
+        return np.true_divide(to_float(left), to_float(right))
+    # floor division and modulo
+    if ints:
+        if max(get_bound(left), get_bound(right)) >= INT64_LIMIT:
+            return None
+        return COLUMN_OPERATORS[op](left, right)
+    left, right = to_float(left), to_float(right)
+    if not is_finite(left) or not is_finite(right):
+        return None
+    return COLUMN_OPERATORS[op](left, right)
+
+class ColumnExpression:
+    def __init__(self, template, slot_names):
+        self.slots = {name: slot for slot, name in enumerate(slot_names)}
+        body = ast.parse(template, mode='eval').body
+        self.body = body if self.is_supported(body) else None
+
+    def get_function(self, node):
+        # math.* and builtins, as eval_compiled finds them
+        if isinstance(node, ast.Attribute) and isinstance(node.value, ast.Name) and node.value.id == 'math':
+            function = getattr(math, node.attr, None)
+        elif isinstance(node, ast.Name) and node.id not in self.slots:
+            function = getattr(builtins, node.id, None)
+        else:
+            return None
+        return function if callable(function) else None
+
+    def is_supported(self, node):
+        if isinstance(node, ast.BinOp):
+            return (type(node.op) in COLUMN_OPERATORS or isinstance(node.op, ast.Pow)) and self.is_supported(node.left) and self.is_supported(node.right)
+        elif isinstance(node, ast.UnaryOp):
+            return isinstance(node.op, (ast.USub, ast.UAdd)) and self.is_supported(node.operand)
+        elif isinstance(node, ast.Constant):
+            return type(node.value) in (int, float)
+        elif isinstance(node, ast.Name):
+            return node.id in self.slots
+        elif isinstance(node, ast.Attribute):
+            return isinstance(node.value, ast.Name) and node.value.id == 'math' and type(getattr(math, node.attr, None)) == float
+        elif isinstance(node, ast.Call):
+            return self.get_function(node.func) is not None and not node.keywords and all(not isinstance(arg, ast.Starred) and self.is_supported(arg) for arg in node.args)
+        return False
+
+    def evaluate(self, values):
+        # values of the slots, arrays over the same frames or numbers, None when the result could differ
+        if self.body is None:
+            return None
+        try:
+            with np.errstate(all='ignore'):
+                return self.evaluate_node(self.body, values)
+        except (ArithmeticError, ValueError, TypeError):
+            return None # raised by a python operation, evaluated frame by frame to report it
+
+    def evaluate_node(self, node, values):
+        if isinstance(node, ast.Constant):
+            return node.value
+        elif isinstance(node, ast.Name):
+            return values[self.slots[node.id]]
+        elif isinstance(node, ast.Attribute):
+            return getattr(math, node.attr)
+        elif isinstance(node, ast.UnaryOp):
+            operand = self.evaluate_node(node.operand, values)
+            if operand is None or isinstance(node.op, ast.UAdd):
+                return operand
+            if is_int(operand) and get_bound(operand) >= INT64_LIMIT:
+                return None
+            return -operand
+        elif isinstance(node, ast.Call):
+            args = [self.evaluate_node(arg, values) for arg in node.args]
+            if any(arg is None for arg in args):
+                return None
+            return apply_function(self.get_function(node.func), args)
+        left, right = self.evaluate_node(node.left, values), self.evaluate_node(node.right, values)
+        if left is None or right is None:
+            return None
+        if isinstance(node.op, ast.Pow):
+            return apply_function(operator.pow, [left, right])
+        return apply_operator(type(node.op), left, right)
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def get_column_expression(template, slot_names):
+    return ColumnExpression(template, slot_names)
+
+class BatchResolver:
+    def __init__(self, description, frames):
+        # the init frame has to be resolved on the description, folder attributes list their files there
+        self.description = description
+        self.frames = np.array(list(frames), dtype=np.int64)
+        self.size = len(self.frames)
+        self.mapping = {'seed': Column(description.base_seed + self.frames), 'num_frames': description.scene.num_frames}
+        self.values = {}
+        self.resolving = set()
+
+    def combine(self, items, build):
+        if not any(isinstance(item, Column) for item in items):
+            return build(items)
+        if build is list:
+            column = stack(items, self.size)
+            if column is not None:
+                return column
+        return self.for_each_frame(lambda i: build([at(item, i) for item in items]))
+
+    def for_each_frame(self, get_value, frames=None):
+        return make_column([get_value(i) for i in (range(self.size) if frames is None else frames)])
+
+    def resolve(self, value, mapping=None):
+        mapping = self.mapping if mapping is None else mapping
+        if isinstance(value, MutableElement):
+            return self.resolve_element(value)
+        elif isinstance(value, Harmonizer):
+            error(f'harmonizer "{value.name}" can not be resolved in batch')
+        elif isinstance(value, (float, int, bool, str)):
+            return value
+        elif isinstance(value, list):
+            return self.combine([self.resolve(item, mapping) for item in value], list)
+        elif isinstance(value, dict):
+            keys = list(value)
+            items = [mapping[key] if key in mapping else self.resolve(value[key], mapping) for key in keys]
+            return self.combine(items, lambda items: dict(zip(keys, items)))
+        else:
+            error(f"unknown type {type(value)} in symbols") # should not reach here though
+
+    def resolve_element(self, element):
+        if element in self.values:
+            return self.values[element]
+        if element in self.resolving:
+            error(f'cyclic reference is detected. "{element.name}" is depending on itself!')
+        self.resolving.add(element)
+        if isinstance(element, AttributeRange):
+            value = self.resolve_range(element)
+        elif isinstance(element, AttributeSet):
+            value = self.resolve_choice(element, self.resolve(element.values))
+        elif isinstance(element, AttributeFolder):
+            if element.values is None:
+                error(f'folder "{element.name}" has not been listed, resolve the init frame first')
+            value = self.resolve_choice(element, element.values)
+        elif isinstance(element, AttributeCameraFrustum):
+            value = self.resolve_camera_frustum(element)
+        elif isinstance(element, AttributeExpression):
+            value = self.resolve_expression(element)
+        elif isinstance(element, AttributeReference):
+            value = self.resolve_reference(element.name, element.ref_key, self.mapping)
+        else:
+            error(f'{type(element).__name__} "{element.name}" can not be resolved in batch')
+        self.resolving.remove(element)
+        self.values[element] = value
+        return value
+
+    # random sources
+
+    def get_frame_random(self, element, i, seed=None):
+        # what Description.get_random gives element in frame frames[i]
+        index, user_seed = int(self.frames[i]), at(seed, i)
+        if self.description.rng == RNG_LEGACY:
+            return random.Random(element.name_hash + (self.description.base_seed + index if user_seed is None else user_seed))
+        if user_seed is None:
+            return RandomStream(element.name_hash, self.description.base_seed, index)
+        return RandomStream(element.name_hash, user_seed)
+
+    def get_column_random(self, element, seed=None):
+        # all frames at once, None when the seeds give streams only a frame by frame resolution reproduces
+        if self.description.rng == RNG_PHILOX:
+            if seed is None:
+                return UniformColumns(element.name_hash, self.description.base_seed, self.frames)
+            seeds = seed.values if isinstance(seed, Column) else np.full(self.size, int(seed) & MASK_64, dtype=np.uint64)
+            return UniformColumns(element.name_hash, seeds, np.zeros(self.size, dtype=np.int64))
+        # random.Random hashes seeds of other types than int
+        if seed is None:
+            offsets = (self.description.base_seed + self.frames).tolist()
+        elif isinstance(seed, Column) and seed.is_array(1) and seed.values.dtype == np.int64:
+            offsets = seed.values.tolist()
+        elif type(seed) == int:
+            offsets = [seed] * self.size
+        else:
+            return None
+        return MersenneColumns([element.name_hash + offset for offset in offsets])
+
+    def redraw(self, column, rng, draw):
+        # frames whose stream ran out of drawn words, e.g. rejected indices, are drawn again frame by frame
+        exhausted = getattr(rng, 'exhausted', None)
+        if exhausted is None or not exhausted.any():
+            return column
+        frames, kept = np.flatnonzero(exhausted), np.flatnonzero(~exhausted)
+        values = column.values[kept] if column.is_array() else [column.values[i] for i in kept.tolist()]
+        return self.merge(Column(values), kept, self.for_each_frame(draw, frames.tolist()), frames)
+
+    # distribution attributes
+
+    def resolve_range(self, element):
+        start, end = self.resolve(element.start), self.resolve(element.end)
+        seed = self.resolve(element.seed) if element.seed is not None else None
+        draw = lambda i: element.sample(at(start, i), at(end, i), self.get_frame_random(element, i, seed))
+        rng = self.get_column_random(element, seed)
+        if rng is None:
+            return self.for_each_frame(draw)
+        if not isinstance(start, Column) and not isinstance(end, Column):
+            value = element.sample(start, end, rng)
+            column = Column(np.stack(value, axis=1) if isinstance(value, list) else value)
+        else:
+            start_values, end_values = self.get_range_bound(start), self.get_range_bound(end)
+            if start_values is None or end_values is None:
+                return self.for_each_frame(draw)
+            column = Column(rand_range(start_values, end_values, rng))
+        return self.redraw(column, rng, draw)
+
+    def get_range_bound(self, value):
+        # numbers of a range drawn over columns, None when (b - a) could overflow or the frames draw lists
+        if isinstance(value, Column):
+            if not value.is_array(1) or (value.values.dtype == np.int64 and get_bound(value.values) >= INT64_LIMIT // 2):
+                return None
+            return value.values
+        if type(value) == float or (type(value) == int and abs(value) < INT64_LIMIT // 2):
+            return value
+        return None
+
+    def resolve_choice(self, element, values):
+        # AttributeSet and AttributeFolder
+        if element.index is not None:
+            index = self.resolve(element.index)
+            if isinstance(index, Column) and index.is_array(1) and not isinstance(values, Column) and self.is_exact_index(index.values):
+                if len(values) == 0:
+                    error(f'empty values in {element.name}')
+                # int() of a float truncates like astype
+                return select(values, index.values.astype(np.int64) % len(values))
+            return self.for_each_frame(lambda i: at(values, i)[int(at(index, i)) % len(at(values, i))])
+        seed = self.resolve(element.seed) if element.seed is not None else None
+        draw = lambda i: self.get_frame_random(element, i, seed).choice(at(values, i))
+        rng = self.get_column_random(element, seed)
+        if rng is not None and not isinstance(values, Column):
+            return self.redraw(select(values, rng.index(len(values))), rng, draw)
+        return self.for_each_frame(draw)
+
+    def is_exact_index(self, values):
+        return values.dtype == np.int64 or (np.isfinite(values) & (np.abs(values) < INT64_LIMIT)).all()
+
+    def resolve_camera_frustum(self, element):
+        if self.description.rng == RNG_LEGACY:
+            error(f'camera frustum "{element.name}" draws from the global random state with rng "{RNG_LEGACY}", use rng "{RNG_PHILOX}" to resolve it in batch')
+        operands = [self.resolve(operand) for operand in element.operands()]
+        if not any(isinstance(operand, Column) for operand in operands):
+            return Column(np.stack(element.sample(*operands, self.get_column_random(element)), axis=1))
+        return self.for_each_frame(lambda i: element.sample(*[at(operand, i) for operand in operands], self.get_frame_random(element, i)))
+
+    # expressions and references
+
+    def resolve_reference(self, calling_context, reference, mapping):
+        if reference in mapping:
+            return mapping[reference]
+        kind, target, list_index = self.description.reference_index.get_compiled(calling_context, reference)
+        if kind == REFERENCE_TARGET:
+            return self.resolve(target, mapping)
+        elif kind == REFERENCE_ELEMENT_ITEM:
+            value = self.resolve_element(target)
+            if isinstance(value, Column):
+                if value.is_array(2) and -value.values.shape[1] <= list_index < value.values.shape[1]:
+                    return Column(value.values[:, list_index])
+                return self.for_each_frame(lambda i: value[i][list_index])
+            return value[list_index]
+        elif kind == REFERENCE_MISSING:
+            error(f'not found reference: {target}')
+        error(f'reference "{reference}" from "{calling_context}" can not be resolved in batch')
+
+    def resolve_expression(self, element):
+        mapping = self.mapping | element.index_mapping
+        macro_values = []
+        for macro in element.macros:
+            if isinstance(macro, AttributeExpression):
+                reference = self.resolve_element(macro)
+                if isinstance(reference, Column):
+                    # the frames naming the same reference share its resolution
+                    references = reference.tolist()
+                    first, indices = get_distinct((type(r), str(r)) for r in references)
+                    macro_values.append(select([self.resolve_reference(element.name, references[i], mapping) for i in first], indices))
+                else:
+                    macro_values.append(self.resolve_reference(element.name, reference, mapping))
+            else:
+                macro_values.append(self.resolve_reference(element.name, macro, mapping))
+        if not any(isinstance(macro_value, Column) for macro_value in macro_values):
+            return self.evaluate_template(element.template, macro_values)
+        column = self.evaluate_columns(element.template, macro_values)
+        if column is not None:
+            return column
+        return self.evaluate_frames(element.template, macro_values, range(self.size))
+
+    def evaluate_template(self, template, values):
+        for value in values:
+            if value is None or value == AWAIT_HARMONIZATION:
+                return value
+        return template.evaluate(values)
+
+    def evaluate_columns(self, template, macro_values):
+        # the frames where every slot is a number that binds as a variable, as NumPy operations, the others frame by frame
+        # None when the template does not compile or a slot is not numbers
+        if template.code is None:
+            return None
+        expression = get_column_expression(template.template, tuple(template.slot_names))
+        if expression.body is None:
+            return None
+        binds = np.ones(self.size, dtype=bool)
+        for value, sign_sensitive in zip(macro_values, template.sign_sensitive):
+            if isinstance(value, Column):
+                if not value.is_array(1):
+                    return None
+                if value.values.dtype == np.float64:
+                    binds &= np.isfinite(value.values)
+                    if sign_sensitive:
+                        binds &= ~np.signbit(value.values)
+                elif sign_sensitive:
+                    binds &= value.values >= 0
+            elif type(value) not in (int, float) or (type(value) == float and not math.isfinite(value)):
+                return None
+            elif sign_sensitive and (value < 0 or math.copysign(1, value) < 0):
+                return None
+        frames = np.flatnonzero(binds)
+        if len(frames) == 0:
+            return None
+        values = [value.values[frames] if isinstance(value, Column) else value for value in macro_values]
+        result = expression.evaluate(values)
+        if result is None:
+            return None
+        column = Column(result if isinstance(result, np.ndarray) else np.full(len(frames), result, dtype=get_dtype(type(result))))
+        if len(frames) == self.size:
+            return column
+        other_frames = np.flatnonzero(~binds)
+        return self.merge(column, frames, self.evaluate_frames(template, macro_values, other_frames.tolist()), other_frames)
+
+    def merge(self, column, frames, other_column, other_frames):
+        # the rows of two columns over complementary frames
+        if column.is_array() and other_column.is_array() and column.values.dtype == other_column.values.dtype and column.values.shape[1:] == other_column.values.shape[1:]:
+            values = np.empty((self.size,) + column.values.shape[1:], dtype=column.values.dtype)
+            values[frames], values[other_frames] = column.values, other_column.values
+            return Column(values)
+        values = [None] * self.size
+        for rows, part in ((frames, column), (other_frames, other_column)):
+            for row, value in zip(rows.tolist(), part.tolist()):
+                values[row] = value
+        return make_column(values)
+
+    def evaluate_frames(self, template, macro_values, frames):
+        # once per distinct combination of slot values over frames, a template gives the same value for the same
+        # types and texts, whether its numbers bind as variables or are substituted
+        columns = [value.tolist() if isinstance(value, Column) else None for value in macro_values]
+        def get_values(i):
+            return [values[i] if values is not None else value for values, value in zip(columns, macro_values)]
+        keys = []
+        for i in frames:
+            values = get_values(i)
+            keys.append(tuple(type(value) for value in values) + tuple(str(value) for value in values))
+        first, indices = get_distinct(keys)
+        frames = list(frames)
+        return select([self.evaluate_template(template, get_values(frames[k])) for k in first], indices)
+
+def to_array(values):
+    # a column of a batch for np.savez, an object array when its rows differ in shape, e.g. lists of different lengths
+    if isinstance(values, np.ndarray):
+        return values
+    try:
+        return np.asarray(values)
+    except ValueError:
+        pass
+    array = np.empty(len(values), dtype=object)
+    for i, value in enumerate(values):
+        array[i] = value # one by one, lists stay items
+    return array
+
+BATCH_DISTRIBUTIONS = (AttributeRange, AttributeSet, AttributeFolder, AttributeCameraFrustum)
+
+def resolve_batch(description, frames, names=None):
+    # name -> values of that mutable element over frames, distribution attributes by default
+    resolver = BatchResolver(description, frames)
+    elements = {}
+    for m in description.mutable_elements:
+        elements.setdefault(m.name, m) # an inner macro has the name of its expression, which comes first
+    if names is None:
+        names = [name for name, m in elements.items() if isinstance(m, BATCH_DISTRIBUTIONS)]
+    batch = {}
+    for name in names:
+        if name not in elements:
+            error(f'no mutable element named "{name}"')
+        value = resolver.resolve_element(elements[name])
+        batch[name] = value.values if isinstance(value, Column) else select([value], np.zeros(resolver.size, dtype=np.int64)).values
+    return batch
@@ -0,0 +1,112 @@
+from .offline import *
+from .bin_pack import pack_bin
+import tempfile, time
+try:
+    from py3dbp import Packer, Bin, Item
+except ImportError:
+    Packer = None
+
+# bin_pack harmonizer inputs of configs packed by py3dbp and by pack_bin, frame by frame
+# python -m omni.replicator.object.description benchmark-bin-pack --synthetic-boxes 50 --scale 10
+# configs resolve with --aabb-sidecar as usual, or with --synthetic-boxes their folder attributes list that many boxes of
+# seeded sizes, --scale packs the items of each bin that many times over
+
+BIN_PACK_BENCHMARK_CONFIGS = ('demo_bin_pack', 'demo_bins_of_bins_simple', 'demo_bins_of_bins', 'demo_bins_of_bins_rack_2_layers')
+SYNTHETIC_BOX_SIZES = (10, 60) # range of the sides of synthetic boxes
+
+class SyntheticMutable:
+    # local AABB of a synthetic box, from its path
+    def update_usd(self, usd_path, get_prim_aabb=False):
+        if get_prim_aabb:
+            rng = random.Random(get_name_hash(os.path.basename(usd_path))) # same boxes in any temporary folder
+            x, y, z = [rng.randint(*SYNTHETIC_BOX_SIZES) for _ in range(3)]
+            return [[-x / 2, 0, -z / 2], [x / 2, y, z / 2]]
+
+def use_synthetic_boxes(config, folder, count):
+    # points every folder attribute of the config at count empty files with its suffix in folder
+    suffixes = set()
+    def visit(value):
+        if isinstance(value, CountInstance):
+            value = value.template
+        if isinstance(value, dict):
+            if value.get('distribution_type') == 'folder':
+                value['value'] = folder
+                suffixes.add(value.get('suffix', ''))
+            for item in value.values():
+                visit(item)
+        elif isinstance(value, list):
+            for item in value:
+                visit(item)
+    visit(config)
+    for suffix in suffixes:
+        for i in range(count):
+            open(f'{folder}/box_{i}.{suffix}', 'w').close()
+
+def collect_bin_pack_inputs(yaml_path, frames, aabb_sidecar=None, synthetic_boxes=None):
+    # [(bin_size, {name: size})] of every bin_pack harmonizer in every frame
+    config = read_yaml_recursive(yaml_path)
+    scene = OfflineScene(read_aabb_sidecar(aabb_sidecar) if aabb_sidecar is not None else None)
+    with tempfile.TemporaryDirectory() as folder:
+        if synthetic_boxes is not None:
+            use_synthetic_boxes(config, folder, synthetic_boxes)
+            mutable = SyntheticMutable()
+            scene.mutables = collections.defaultdict(lambda: mutable)
+        description = Description(config, scene)
+        description.initialize(-1)
+        resolve_scene(description, True)
+        scene.num_frames = ensured_retrieve('num_frames', description.context, int)
+        inputs = []
+        for index in frames:
+            description.initialize(index)
+            resolve_scene(description)
+            for h in description.harmonizers:
+                if isinstance(h, HarmonizerBinPack) and h.input:
+                    inputs.append((h.resolved_bin_size, {name: get_dimension(aabb[0], aabb[1]) for name, aabb in h.input.items()}))
+    return inputs
+
+def pack_py3dbp(bin_size, items):
+    packer = Packer()
+    packer.add_bin(Bin('bin', bin_size[0], bin_size[1], bin_size[2], 1))
+    for name, (x, y, z) in items.items():
+        packer.add_item(Item(name, x, y, z, 0))
+    packer.pack()
+    return serialize_packer(packer)
+
+def get_packed_volume(layout, items, bin_size):
+    volume = sum(items[name][0] * items[name][1] * items[name][2] for name, item in layout.items() if item['fitted'])
+    return volume / (bin_size[0] * bin_size[1] * bin_size[2])
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+def benchmark_bin_pack(config_names=BIN_PACK_BENCHMARK_CONFIGS, frames=range(3), aabb_sidecar=None, synthetic_boxes=None, scale=1):
+    # prints a row per config, returns whether pack_bin gave the layouts of py3dbp
+    if Packer is None:
+        error('the bin pack benchmark compares with py3dbp, which is not installed')
+    identical = True
+    print(f'{"config":<34}{"bins":>6}{"items":>7}{"py3dbp s":>10}{"pack_bin s":>12}{"speedup":>9}{"same":>6}{"volume":>8}{"extreme_point s":>17}{"volume":>8}')
+    for config_name in config_names:
+        inputs = collect_bin_pack_inputs(config_name, frames, aabb_sidecar, synthetic_boxes)
+        inputs = [(bin_size, {f'{name}#{i}': size for i in range(scale) for name, size in items.items()}) for bin_size, items in inputs]
+        totals = collections.Counter()
+        same = True
+        for bin_size, items in inputs:
+            reference, reference_time = timed(pack_py3dbp, bin_size, items)
+            layout, layout_time = timed(pack_bin, bin_size, items)
+            extreme_point, extreme_point_time = timed(pack_bin, bin_size, items, 'extreme_point')
+            same = same and reference == layout and list(reference) == list(layout)
+            totals.update({
+                'items': len(items),
+                'py3dbp': reference_time,
+                'pack_bin': layout_time,
+                'extreme_point': extreme_point_time,
+                'volume': get_packed_volume(layout, items, bin_size),
+                'extreme_point_volume': get_packed_volume(extreme_point, items, bin_size),
+            })
+        bins = max(len(inputs), 1)
+        identical = identical and same
+        print(f'{config_name:<34}{len(inputs):>6}{totals["items"] // bins:>7}{totals["py3dbp"]:>10.3f}{totals["pack_bin"]:>12.3f}{totals["py3dbp"] / max(totals["pack_bin"], 1e-9):>8.1f}x'
+            f'{"yes" if same else "NO":>6}{totals["volume"] / bins:>8.2f}{totals["extreme_point"]:>17.3f}{totals["extreme_point_volume"] / bins:>8.2f}')
+    return identical
@@ -0,0 +1,276 @@
+from .misc import *
+import time, hashlib, threading, collections
+from decimal import Decimal
+import numpy as np
+
+# 3d bin packing of bin_pack harmonizers, on integer arrays of sizes in thousandths
+# a layout maps item names to {'fitted': True, 'position': [x, y, z], 'rotation_type': r} or {'fitted': False}, as serialize_packer gives,
+# fitted items first in packing order, position is the min corner of the rotated item, y is up
+#
+# algorithm      items, placement
+# py3dbp         by increasing volume, each at the first pivot (corner of a packed item along x, then y, then z) where the first of
+#                its rotations that stays in the bin does not collide, same layouts as py3dbp.Packer().pack(), whose decimals are
+#                rounded to 0.001 like the integers here
+# extreme_point  by decreasing volume, each at the lowest, then backmost, then leftmost extreme point where one of its rotations
+#                fits, new extreme points dropped onto what is below them, denser and keeps items supported
+#
+# time_budget (seconds) leaves the items not packed in time unfitted
+#
+# a packing only depends on the algorithm, the bin size and the item sizes in the order they are packed, a BinPackCache
+# keeps packings by those, items of the same size are interchangeable and the packing maps back to any names
+# the packing order is by volume, items of the same volume keep their input order, so the key keeps it as well
+
+BIN_PACK_ALGORITHMS = ('py3dbp', 'extreme_point')
+BIN_PACK_CACHE_VERSION = 1 # packings persisted by an older version are not used
+BIN_PACK_CACHE_FILE = 'bin_pack_cache.json'
+ROTATIONS = np.array([(0, 1, 2), (1, 0, 2), (1, 2, 0), (2, 1, 0), (2, 0, 1), (0, 2, 1)]) # axes of the item along x, y, z, for each rotation_type
+PIVOT_CHUNKS = (8, 1024) # pivots checked at once, doubling from the first size, the first fit is usually among the first pivots
+MILLI = Decimal('1.000')
+
+def to_decimal(value):
+    return Decimal(value if isinstance(value, (int, float)) else float(value)).quantize(MILLI)
+
+def to_milli(values):
+    return [int(to_decimal(value) * 1000) for value in values]
+
+def find_first_fit(pivots, options, positions, dimensions, bin_size, per_pivot):
+    # first (pivot, rotation) in order that stays in the bin and overlaps no packed item, or None
+    # per_pivot: only the first rotation that stays in the bin is tried at a pivot, like py3dbp
+    ends = positions + dimensions
+    start, chunk_size = 0, PIVOT_CHUNKS[0]
+    while start < len(pivots):
+        chunk = pivots[start:start + chunk_size]
+        start, chunk_size = start + len(chunk), min(chunk_size * 2, PIVOT_CHUNKS[1])
+        inside = ((chunk[:, None, :] + options[None]) <= bin_size).all(axis=-1)
+        if per_pivot:
+            candidates = np.flatnonzero(inside.any(axis=1))
+            candidates = np.stack([candidates, inside[candidates].argmax(axis=1)], axis=1)
+        else:
+            candidates = np.argwhere(inside)
+        if len(candidates) == 0:
+            continue
+        low, high = chunk[candidates[:, 0]], chunk[candidates[:, 0]] + options[candidates[:, 1]]
+        # packed items that reach the candidates at all
+        near = ((positions < high.max(axis=0)) & (low.min(axis=0) < ends)).all(axis=1)
+        if near.any():
+            # overlapping on every axis, p < q + e and q < p + d, which is how py3dbp.auxiliary_methods.intersect compares the centers
+            overlap = ((low[:, None] < ends[near][None]) & (positions[near][None] < high[:, None])).all(axis=-1).any(axis=1)
+            fits = np.flatnonzero(~overlap)
+            if len(fits) == 0:
+                continue
+            candidates = candidates[fits]
+        return start - len(chunk) + candidates[0][0], candidates[0][1]
+    return None
+
+def get_unique_rows(rows, keys=None):
+    # first occurrences, in order
+    _, first = np.unique(rows, axis=0, return_index=True)
+    first = np.sort(first)
+    return rows[first] if keys is None else (rows[first], keys[first])
+
+def get_occupied(points, positions, dimensions):
+    # points in [min, max) of a packed item, an item without zero sizes overlaps it there
+    if len(positions) == 0 or len(points) == 0:
+        return np.zeros(len(points), dtype=bool)
+    return ((positions[None] <= points[:, None]) & (points[:, None] < positions[None] + dimensions[None])).all(axis=-1).any(axis=1)
+
+def get_all_pivots(positions, dimensions):
+    # every pivot py3dbp tries, for items with a zero size, which fit where the others do not
+    if len(positions) == 0:
+        return np.zeros((1, 3), dtype=np.int64)
+    return get_unique_rows(np.concatenate([positions + dimensions * axis for axis in np.eye(3, dtype=np.int64)]))
+
+def pack_py3dbp(bin_size, sizes, deadline):
+    n = len(sizes)
+    positions, dimensions = np.zeros((n, 3), dtype=np.int64), np.zeros((n, 3), dtype=np.int64)
+    # pivots in the order py3dbp tries them, axis * n + packing index, without those occupied by a packed item
+    pivots, pivot_keys = np.zeros((1, 3), dtype=np.int64), np.zeros(1, dtype=np.int64)
+    packed = [] # (index, position, rotation_type) in packing order
+    unfitted = []
+    failed = {} # size -> number of packed items when it did not fit, it does not fit again until another item is packed
+    for i, size in enumerate(sizes):
+        if deadline is not None and time.monotonic() > deadline:
+            return packed, unfitted + list(range(i, n))
+        k = len(packed)
+        key = tuple(size)
+        if failed.get(key) == k:
+            unfitted.append(i)
+            continue
+        options = np.asarray(size)[ROTATIONS]
+        candidate_pivots = pivots if min(size) > 0 else get_all_pivots(positions[:k], dimensions[:k])
+        fit = find_first_fit(candidate_pivots, options, positions[:k], dimensions[:k], bin_size, True)
+        if fit is None:
+            failed[key] = k
+            unfitted.append(i)
+            continue
+        positions[k], dimensions[k] = candidate_pivots[fit[0]], options[fit[1]]
+        packed.append((i, positions[k].tolist(), int(fit[1])))
+        if k == 0:
+            pivots, pivot_keys = pivots[:0], pivot_keys[:0] # the start position only serves the first item
+        new_pivots, new_keys = positions[k] + dimensions[k] * np.eye(3, dtype=np.int64), np.arange(3) * n + k
+        new = ~get_occupied(new_pivots, positions[:k + 1], dimensions[:k + 1]) & (new_pivots <= bin_size).all(axis=1)
+        keep = ~get_occupied(pivots, positions[k:k + 1], dimensions[k:k + 1])
+        pivots, pivot_keys = np.concatenate([pivots[keep], new_pivots[new]]), np.concatenate([pivot_keys[keep], new_keys[new]])
+        order = np.argsort(pivot_keys, kind='stable')
+        pivots, pivot_keys = get_unique_rows(pivots[order], pivot_keys[order])
+    return packed, unfitted
+
+def drop_points(points, positions, dimensions):
+    # y of each point lowered onto the top of the highest packed item below it, or the floor
+    if len(positions) == 0:
+        return points
+    under = ((positions[None, :, [0, 2]] <= points[:, None, [0, 2]]) & (points[:, None, [0, 2]] < positions[None, :, [0, 2]] + dimensions[None, :, [0, 2]])).all(axis=-1)
+    tops = positions[:, 1] + dimensions[:, 1]
+    under &= tops[None] <= points[:, None, 1]
+    dropped = points.copy()
+    dropped[:, 1] = np.where(under, tops[None], 0).max(axis=1)
+    return dropped
+
+def pack_extreme_point(bin_size, sizes, deadline):
+    n = len(sizes)
+    positions, dimensions = np.zeros((n, 3), dtype=np.int64), np.zeros((n, 3), dtype=np.int64)
+    packed, unfitted = [], []
+    points = np.zeros((1, 3), dtype=np.int64)
+    failed = {} # sorted size -> number of packed items when it did not fit in any rotation
+    for i in range(n):
+        if deadline is not None and time.monotonic() > deadline:
+            return packed, unfitted + list(range(i, n))
+        k = len(packed)
+        key = tuple(sorted(sizes[i]))
+        if failed.get(key) == k:
+            unfitted.append(i)
+            continue
+        options = get_unique_rows(np.asarray(sizes[i])[ROTATIONS])
+        fit = find_first_fit(points, options, positions[:k], dimensions[:k], bin_size, False)
+        if fit is None:
+            failed[key] = k
+            unfitted.append(i)
+            continue
+        position, dimension = points[fit[0]], options[fit[1]]
+        positions[k], dimensions[k] = position, dimension
+        rotation_type = next(r for r, axes in enumerate(ROTATIONS) if (np.asarray(sizes[i])[axes] == dimension).all())
+        packed.append((i, position.tolist(), rotation_type))
+        new_points = np.stack([position + dimension * axis for axis in np.eye(3, dtype=np.int64)])
+        new_points[[0, 2]] = drop_points(new_points[[0, 2]], positions[:k + 1], dimensions[:k + 1])
+        points = np.concatenate([points, new_points])
+        # points inside a packed item or out of the bin can not take an item
+        occupied = get_occupied(points, positions[k:k + 1], dimensions[k:k + 1])
+        occupied[-3:] = get_occupied(new_points, positions[:k + 1], dimensions[:k + 1])
+        points = get_unique_rows(points[~occupied & (points < bin_size).all(axis=1)])
+        points = points[np.lexsort((points[:, 0], points[:, 2], points[:, 1]))]
+    return packed, unfitted
+
+def get_packing_order(items, algorithm):
+    # names and sizes in thousandths in the order the algorithm packs them
+    names = list(items)
+    sizes = [to_milli(items[name]) for name in names]
+    if algorithm == 'py3dbp':
+        # by the volume py3dbp rounds, stable
+        volumes = [(to_decimal(x) * to_decimal(y) * to_decimal(z)).quantize(MILLI) for x, y, z in items.values()]
+        order = sorted(range(len(names)), key=lambda i: volumes[i])
+    else:
+        order = sorted(range(len(names)), key=lambda i: -sizes[i][0] * sizes[i][1] * sizes[i][2])
+    return [names[i] for i in order], [sizes[i] for i in order]
+
+def pack_sizes(bin_size, sizes, algorithm, time_budget=None):
+    # (packing, whether it was finished in time), packing is ([(index, position, rotation_type)], [index]) into sizes
+    deadline = time.monotonic() + time_budget if time_budget is not None else None
+    bin_size = np.array(to_milli(bin_size), dtype=np.int64)
+    packing = (pack_py3dbp if algorithm == 'py3dbp' else pack_extreme_point)(bin_size, sizes, deadline)
+    return packing, deadline is None or time.monotonic() < deadline
+
+def get_layout(names, packing):
+    packed, unfitted = packing
+    layout = {}
+    for i, position, rotation_type in packed:
+        layout[names[i]] = {
+            'fitted': True,
+            'position': [value / 1000 for value in position],
+            'rotation_type': rotation_type,
+        }
+    for i in unfitted:
+        layout[names[i]] = {
+            'fitted': False
+        }
+    return layout
+
+def get_cache_key(bin_size, sizes, algorithm):
+    key = [BIN_PACK_CACHE_VERSION, algorithm, to_milli(bin_size), sizes]
+    return hashlib.sha1(json.dumps(key, separators=(',', ':')).encode()).hexdigest()
+
+class BinPackCache:
+    # least recently used packings, optionally persisted to <folder>/bin_pack_cache.json
+    def __init__(self, size, folder=None):
+        if size <= 0:
+            error(f'invalid bin pack cache size: {size}')
+        self.size = size
+        self.folder = folder
+        self.packings = collections.OrderedDict() # key -> packing
+        self.hits = 0
+        self.misses = 0
+        if folder is not None:
+            ensure_folder_recursive(folder)
+            for key, packing in self.load().items():
+                self.put(key, packing)
+
+    def get(self, key):
+        packing = self.packings.get(key)
+        if packing is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.packings.move_to_end(key)
+        return packing
+
+    def put(self, key, packing):
+        self.packings[key] = packing
+        self.packings.move_to_end(key)
+        while len(self.packings) > self.size:
+            self.packings.popitem(last=False)
+
+    def get_hit_rate(self):
+        return self.hits / max(self.hits + self.misses, 1)
+
+    def report(self):
+        return f'bin pack cache: {self.hits} hits, {self.misses} misses, hit rate {self.get_hit_rate():.1%}, {len(self.packings)} packings'
+
+    def get_path(self):
+        return f'{self.folder}/{BIN_PACK_CACHE_FILE}'
+
+    def load(self):
+        try:
+            with open(self.get_path()) as cache_file:
+                data = json.load(cache_file)
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != BIN_PACK_CACHE_VERSION:
+            return {}
+        return data['packings']
+
+    def save(self):
+        # merged with what other runs saved meanwhile, this run's packings are the most recent
+        if self.folder is None:
+            return
+        packings = self.load()
+        for key in self.packings:
+            packings.pop(key, None)
+        packings.update(self.packings)
+        packings = dict(list(packings.items())[-self.size:])
+        path = self.get_path()
+        temp_path = f'{path}.{os.getpid()}.{threading.get_ident()}'
+        with open(temp_path, 'w') as cache_file:
+            json.dump({'version': BIN_PACK_CACHE_VERSION, 'packings': packings}, cache_file, separators=(',', ':'))
+        os.replace(temp_path, path) # processes may write the same file
+
+def pack_bin(bin_size, items, algorithm='py3dbp', time_budget=None, cache=None):
+    # items: name -> [x, y, z] size, returns the layout
+    if algorithm not in BIN_PACK_ALGORITHMS:
+        error(f'unrecognized bin pack algorithm "{algorithm}", expected one of {BIN_PACK_ALGORITHMS}')
+    names, sizes = get_packing_order(items, algorithm)
+    key = get_cache_key(bin_size, sizes, algorithm) if cache is not None else None
+    packing = cache.get(key) if cache is not None else None
+    if packing is None:
+        packing, finished = pack_sizes(bin_size, sizes, algorithm, time_budget)
+        if cache is not None and finished: # a packing cut by the time budget is not what the items give
+            cache.put(key, packing)
+    return get_layout(names, packing)
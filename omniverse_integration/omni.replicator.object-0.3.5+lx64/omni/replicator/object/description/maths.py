@@ -3,15 +3,15 @@ import numpy as np
 
 # randomize
 
-def rand_range(a, b):
-    return a + (b - a) * random.random()
+def rand_range(a, b, rng=random):
+    return a + (b - a) * rng.random()
 
-def rand_range_list(a, b):
+def rand_range_list(a, b, rng=random):
     assert len(a) == len(b) # keeping it here, there is another check that throws error when calling
-    return [rand_range(a[i], b[i]) for i in range(len(a))]
+    return [rand_range(a[i], b[i], rng) for i in range(len(a))]
 
-def random_reciprocal(a, b):
-    return a * b / (a + (b - a) * random.random())
+def random_reciprocal(a, b, rng=random):
+    return a * b / (a + (b - a) * rng.random())
 
 # rotation
 
@@ -33,10 +33,225 @@ def rot_z_np(deg):
 # seed
 
 import hashlib
-def attribute_seed(name, global_seed, user_seed=None):
-    seed = int(hashlib.md5(name.encode('utf-8')).hexdigest(), 16)
+RNG_LEGACY = 'legacy' # reseed the global random module per attribute, reproduces existing seeds
+RNG_PHILOX = 'philox' # counter-based stream per attribute, independent of evaluation order and other frames
+MASK_64 = (1 << 64) - 1
+
+def get_name_hash(name):
+    return int(hashlib.md5(name.encode('utf-8')).hexdigest(), 16)
+
+def attribute_seed(name, global_seed, user_seed=None, name_hash=None):
+    seed = get_name_hash(name) if name_hash is None else name_hash
     if user_seed is None:
         seed += global_seed
     else:
         seed += user_seed
-    random.seed(seed)
\ No newline at end of file
+    random.seed(seed)
+
+class RandomStream:
+    # same interface as the random module for what attributes draw
+    # key is (name hash, seed) and the counter starts at the frame index, so any frame can be drawn on its own
+    def __init__(self, name_hash, seed, frame_index=0):
+        key = np.array([(name_hash ^ (name_hash >> 64)) & MASK_64, int(seed) & MASK_64], dtype=np.uint64)
+        counter = np.array([0, frame_index & MASK_64, 0, 0], dtype=np.uint64)
+        self.generator = np.random.Generator(np.random.Philox(key=key, counter=counter))
+
+    def random(self):
+        return float(self.generator.random())
+
+    # only uniform doubles are drawn, a choice is then a function of one draw that arrays of streams can reproduce
+    def choice(self, seq):
+        if len(seq) == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        return seq[uniform_to_index(self.random(), len(seq))]
+
+    def shuffle(self, x):
+        for i in reversed(range(1, len(x))):
+            j = uniform_to_index(self.random(), i + 1)
+            x[i], x[j] = x[j], x[i]
+
+def uniform_to_index(u, n):
+    return min(int(u * n), n - 1)
+
+# Philox4x64-10 over arrays, the block function of np.random.Philox
+
+PHILOX_M = (0xD2E7470EE14C6C93, 0xCA5A826395121157)
+PHILOX_W = (0x9E3779B97F4A7C15, 0xBB67AE8584CAA73B)
+
+def mulhilo_64(a, b):
+    # 128 bit product of a constant and an uint64 array, as (hi, lo)
+    mask, shift = np.uint64(0xFFFFFFFF), np.uint64(32)
+    a_lo, a_hi = np.uint64(a & 0xFFFFFFFF), np.uint64(a >> 32)
+    b_lo, b_hi = b & mask, b >> shift
+    ll, lh, hl, hh = a_lo * b_lo, a_lo * b_hi, a_hi * b_lo, a_hi * b_hi
+    cross = (ll >> shift) + (lh & mask) + (hl & mask)
+    return hh + (lh >> shift) + (hl >> shift) + (cross >> shift), np.uint64(a) * b
+
+def philox_4x64(counter, key):
+    c0, c1, c2, c3 = counter
+    k0, k1 = key
+    for i in range(10):
+        if i > 0:
+            k0, k1 = k0 + np.uint64(PHILOX_W[0]), k1 + np.uint64(PHILOX_W[1])
+        hi0, lo0 = mulhilo_64(PHILOX_M[0], c0)
+        hi1, lo1 = mulhilo_64(PHILOX_M[1], c2)
+        c0, c1, c2, c3 = hi1 ^ c1 ^ k0, lo1, hi0 ^ c3 ^ k1, lo0
+    return c0, c1, c2, c3
+
+def to_uint64(values):
+    # same as "int(value) & MASK_64" on each value
+    values = np.asarray(values)
+    if values.dtype == np.uint64:
+        return values
+    if values.dtype == np.int64:
+        return values.view(np.uint64)
+    return np.array([int(value) & MASK_64 for value in values.ravel()], dtype=np.uint64).reshape(values.shape)
+
+PHILOX_COLUMNS = 8192 # streams hashed at once, the rounds stay in cache
+
+def stream_block(name_hash, seeds, frame_indices, block):
+    # draws 4 * block to 4 * block + 3 of RandomStream(name_hash, seeds[i], frame_indices[i]) as raw uint64, for every i
+    words = np.empty((4, len(seeds)), dtype=np.uint64)
+    for start in range(0, len(seeds), PHILOX_COLUMNS):
+        chunk = slice(start, start + PHILOX_COLUMNS)
+        size = len(seeds[chunk])
+        key = (np.full(size, (name_hash ^ (name_hash >> 64)) & MASK_64, dtype=np.uint64), seeds[chunk])
+        zeros = np.zeros(size, dtype=np.uint64)
+        # np.random.Philox increments the counter before generating a block
+        words[:, chunk] = philox_4x64((np.full(size, block + 1, dtype=np.uint64), frame_indices[chunk], zeros, zeros), key)
+    return words
+
+class UniformColumns:
+    # same draws as RandomStream for many streams at once, each draw is an array with one value per stream
+    def __init__(self, name_hash, seeds, frame_indices):
+        self.name_hash = name_hash
+        self.seeds, self.frame_indices = np.broadcast_arrays(to_uint64(seeds), to_uint64(frame_indices))
+        self.draw = 0
+        self.block = None
+
+    def random(self):
+        if self.draw % 4 == 0:
+            self.block = stream_block(self.name_hash, self.seeds, self.frame_indices, self.draw // 4)
+        raw = self.block[self.draw % 4]
+        self.draw += 1
+        return (raw >> np.uint64(11)) * (1.0 / 9007199254740992.0)
+
+    # indices of what choice(seq) draws for len(seq) == n
+    def index(self, n):
+        if n == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        return np.minimum((self.random() * n).astype(np.int64), n - 1)
+
+    def choice(self, seq):
+        return [seq[i] for i in self.index(len(seq)).tolist()]
+
+# MT19937 over arrays, random.Random seeded with many ints at once, for rng "legacy"
+# seeding is init_by_array of the 32 bit words of each seed, run on all the streams together, and only the first
+# MT_WORDS words of the first twist are drawn; a stream that needs more is marked exhausted, its draws are garbage
+
+MT_N, MT_M = 624, 397
+MT_WORDS = 32
+MT_STREAMS = 2**14 # streams seeded at once, the state of each is MT_N words
+
+def get_mt_initial_state():
+    # init_genrand(19650218), where init_by_array starts
+    mt = [19650218]
+    for i in range(1, MT_N):
+        mt.append((1812433253 * (mt[-1] ^ (mt[-1] >> 30)) + i) & 0xFFFFFFFF)
+    return np.array(mt, dtype=np.uint32)
+
+MT_INITIAL_STATE = get_mt_initial_state()
+
+def get_seed_words(seeds):
+    # (key words, key lengths), the 32 bit words of abs(seed) random.seed gives to init_by_array, little end first
+    seeds = [abs(seed) for seed in seeds]
+    size = max(1, (max(seeds, default=0).bit_length() + 31) // 32)
+    data = b''.join(seed.to_bytes(4 * size, 'little') for seed in seeds)
+    words = np.frombuffer(data, dtype='<u4').reshape(len(seeds), size).astype(np.uint32)
+    lengths = np.array([max(1, (seed.bit_length() + 31) // 32) for seed in seeds], dtype=np.int64)
+    return words, lengths
+
+def mt_init_by_array(keys):
+    # MT_N x streams states after init_by_array of keys, key length x streams
+    key_length, streams = keys.shape
+    keys = keys + np.arange(key_length, dtype=np.uint32)[:, None] # init_key[j] + j
+    mt = np.repeat(MT_INITIAL_STATE[:, None], streams, axis=1)
+    t = np.empty(streams, dtype=np.uint32)
+    i, j = 1, 0
+    for _ in range(max(MT_N, key_length)):
+        np.right_shift(mt[i - 1], np.uint32(30), out=t)
+        np.bitwise_xor(t, mt[i - 1], out=t)
+        np.multiply(t, np.uint32(1664525), out=t)
+        np.bitwise_xor(mt[i], t, out=mt[i])
+        np.add(mt[i], keys[j], out=mt[i])
+        i, j = i + 1, j + 1
+        if i >= MT_N:
+            mt[0] = mt[MT_N - 1]
+            i = 1
+        if j >= key_length:
+            j = 0
+    for _ in range(MT_N - 1):
+        np.right_shift(mt[i - 1], np.uint32(30), out=t)
+        np.bitwise_xor(t, mt[i - 1], out=t)
+        np.multiply(t, np.uint32(1566083941), out=t)
+        np.bitwise_xor(mt[i], t, out=mt[i])
+        np.subtract(mt[i], np.uint32(i), out=mt[i])
+        i += 1
+        if i >= MT_N:
+            mt[0] = mt[MT_N - 1]
+            i = 1
+    mt[0] = 0x80000000
+    return mt
+
+def mt_first_words(mt, count):
+    # the first count tempered outputs of each state, count <= MT_N - MT_M
+    y = (mt[:count] & np.uint32(0x80000000)) | (mt[1:count + 1] & np.uint32(0x7FFFFFFF))
+    words = mt[MT_M:MT_M + count] ^ (y >> np.uint32(1)) ^ ((y & np.uint32(1)) * np.uint32(0x9908B0DF))
+    words ^= words >> np.uint32(11)
+    words ^= (words << np.uint32(7)) & np.uint32(0x9D2C5680)
+    words ^= (words << np.uint32(15)) & np.uint32(0xEFC60000)
+    words ^= words >> np.uint32(18)
+    return words
+
+class MersenneColumns:
+    # same draws as random.Random(seeds[i]) for many int seeds at once, each draw is an array with one value per stream
+    def __init__(self, seeds):
+        keys, lengths = get_seed_words(seeds)
+        self.words = np.empty((MT_WORDS, len(lengths)), dtype=np.uint32)
+        for length in np.unique(lengths).tolist():
+            streams = np.flatnonzero(lengths == length)
+            for start in range(0, len(streams), MT_STREAMS):
+                chunk = streams[start:start + MT_STREAMS]
+                self.words[:, chunk] = mt_first_words(mt_init_by_array(np.ascontiguousarray(keys[chunk, :length].T)), MT_WORDS)
+        self.streams = np.arange(len(lengths))
+        self.position = np.zeros(len(lengths), dtype=np.int64)
+        self.exhausted = np.zeros(len(lengths), dtype=bool)
+
+    def next_word(self, streams=None):
+        # the next word of the given streams, all by default
+        streams = self.streams if streams is None else streams
+        position = self.position[streams]
+        self.exhausted[streams[position >= MT_WORDS]] = True
+        self.position[streams] += 1
+        return self.words[np.minimum(position, MT_WORDS - 1), streams]
+
+    def random(self):
+        # genrand_res53
+        a, b = self.next_word() >> np.uint32(5), self.next_word() >> np.uint32(6)
+        return (a * 67108864.0 + b) * (1.0 / 9007199254740992.0)
+
+    def index(self, n):
+        # _randbelow(n), the top bits of a word, drawn again while they are n or more
+        if n == 0:
+            raise IndexError('Cannot choose from an empty sequence')
+        shift = np.uint32(32 - n.bit_length())
+        indices = (self.next_word() >> shift).astype(np.int64)
+        rejected = np.flatnonzero(indices >= n)
+        while len(rejected) > 0 and not self.exhausted[rejected].all():
+            indices[rejected] = self.next_word(rejected) >> shift
+            rejected = rejected[indices[rejected] >= n]
+        return np.minimum(indices, n - 1)
+
+    def choice(self, seq):
+        return [seq[i] for i in self.index(len(seq)).tolist()]
+
@@ -1,4 +1,5 @@
-import logging, os, sys, contextlib, yaml, json, re, traceback, copy, regex
+import logging, os, sys, contextlib, yaml, json, re, traceback, copy, regex, collections.abc
+from ..utility.misc import copy_tree # a count instance becomes a plain dict
 
 # exception utilities
 
@@ -50,9 +51,11 @@ def tentative_retrieve(key, _dict, expected_type=None, default=None):
 
 # yaml
 
+YAML_LOADER = getattr(yaml, 'CSafeLoader', yaml.SafeLoader) # libyaml when pyyaml is built with it
+
 def read_yaml(yaml_path):
     with open(yaml_path) as yaml_file:
-        data = yaml.safe_load(yaml_file)
+        data = yaml.load(yaml_file, Loader=YAML_LOADER)
         return data
 
 def write_yaml(data, yaml_path):
@@ -85,3 +88,28 @@ def get_relative_paths_of_suffix(root_folder, suffix, is_full_path=False):
                 else:
                     relative_paths.append(os.path.relpath(full_path, root_folder))
     return relative_paths
+
+# count blocks
+
+class CountInstance(collections.abc.Mapping):
+    # item i of a count block, reads through to the block shared by all items, only its own values (index) are stored
+    def __init__(self, template, own_values):
+        self.template = template
+        self.own_values = own_values
+
+    def __getitem__(self, key):
+        if key in self.own_values:
+            return self.own_values[key]
+        return self.template[key]
+
+    def __iter__(self):
+        yield from self.template
+        for key in self.own_values:
+            if key not in self.template:
+                yield key
+
+    def __len__(self):
+        return len(self.template) + sum(1 for key in self.own_values if key not in self.template)
+
+    def __repr__(self):
+        return f'CountInstance({self.own_values})'
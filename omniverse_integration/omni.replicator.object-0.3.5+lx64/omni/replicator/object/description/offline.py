@@ -0,0 +1,91 @@
+from .parse import *
+import collections, concurrent.futures
+
+# resolve frame descriptions without Kit, e.g. to plan and validate a dataset on CPU nodes
+
+def read_aabb_sidecar(path):
+    # {usd_path: [[min_x, min_y, min_z], [max_x, max_y, max_z]]}, as yaml or json
+    aabbs = read_yaml(path)
+    if not isinstance(aabbs, dict):
+        error(f'AABB sidecar {path} is expected to map usd paths to [min, max]')
+    for usd_path, aabb in aabbs.items():
+        if not isinstance(aabb, list) or len(aabb) != 2 or any(not isinstance(corner, list) or len(corner) != 3 for corner in aabb):
+            error(f'invalid AABB for "{usd_path}" in {path}, expecting [[min_x, min_y, min_z], [max_x, max_y, max_z]]')
+    return aabbs
+
+class SidecarMutable:
+    # stands in for a stage mutable, local_aabb pitches are served from the AABB sidecar
+    def __init__(self, aabbs):
+        self.aabbs = aabbs
+
+    def update_usd(self, usd_path, get_prim_aabb=False):
+        if get_prim_aabb:
+            if usd_path not in self.aabbs:
+                error(f'"{usd_path}" not found in the AABB sidecar')
+            return self.aabbs[usd_path]
+
+class OfflineScene:
+    # null scene, what a Description needs from Scene_DEV
+    def __init__(self, aabbs=None):
+        self.num_frames = 1
+        mutable = SidecarMutable(aabbs if aabbs is not None else {})
+        self.mutables = collections.defaultdict(lambda: mutable)
+
+def create_offline_description(yaml_path, aabb_sidecar=None):
+    scene = OfflineScene(read_aabb_sidecar(aabb_sidecar) if aabb_sidecar is not None else None)
+    description = Description(read_yaml_recursive(yaml_path), scene)
+    description.initialize(-1)
+    resolve_scene(description, True) # folder attributes list their files in the init frame
+    scene.num_frames = ensured_retrieve('num_frames', description.context, int)
+    return description
+
+def get_description_folder(description, output_folder=None):
+    if output_folder is not None:
+        return output_folder
+    return f"{ensured_retrieve('output_path', description.context, str)}/descriptions"
+
+def write_frame_description(metadata, seed, output_folder):
+    # same file Scene_DEV.capture writes for a frame
+    output_name = tentative_retrieve("output_name", metadata, str, f'{seed}')
+    metadata_with_header = {
+        "omni.replicator.object":{
+            "version": VERSION,
+        }
+    }
+    metadata_with_header["omni.replicator.object"].update(metadata)
+    metadata_with_header["omni.replicator.object"]['output_path'] += '__NEXT' # convenience for restoration
+    output_path = f'{output_folder}/{output_name}.yaml'
+    write_yaml(metadata_with_header, output_path)
+    return output_path
+
+def resolve_frames(yaml_path, frames, output_folder=None, aabb_sidecar=None):
+    description = create_offline_description(yaml_path, aabb_sidecar)
+    output_folder = get_description_folder(description, output_folder)
+    output_paths = []
+    try:
+        for index in frames:
+            description.initialize(index)
+            metadata = resolve_scene(description)
+            output_paths.append(write_frame_description(metadata, description.seed, output_folder))
+    finally:
+        description.close()
+    return output_paths
+
+def resolve_frames_parallel(yaml_path, frames=None, workers=1, output_folder=None, aabb_sidecar=None, chunk_size=None):
+    # frames only depend on the seed and their index, so each worker resolves a chunk with its own Description
+    description = create_offline_description(yaml_path, aabb_sidecar) # validates the config before spawning workers
+    frames = list(range(description.scene.num_frames)) if frames is None else list(frames)
+    output_folder = get_description_folder(description, output_folder)
+    ensure_folder_recursive(output_folder)
+    if workers <= 1 or len(frames) <= 1:
+        return resolve_frames(yaml_path, frames, output_folder, aabb_sidecar)
+
+    if chunk_size is None:
+        chunk_size = max(1, math.ceil(len(frames) / (workers * 4)))
+    chunks = [frames[i:i + chunk_size] for i in range(0, len(frames), chunk_size)]
+    output_paths = []
+    with concurrent.futures.ProcessPoolExecutor(workers) as executor:
+        futures = [executor.submit(resolve_frames, yaml_path, chunk, output_folder, aabb_sidecar) for chunk in chunks]
+        for future in futures:
+            output_paths += future.result()
+    return output_paths
@@ -1,9 +1,56 @@
 from .symbol import *
-import carb
-from ..utility.metadata import save_2dlabels_coco
+import hashlib, pickle
 
 config_folder = f"{os.path.dirname(__file__)}/../configs"
 
+# parsed configs, parents like standard.yaml are shared by many descriptions and only parsed once
+# in memory by path, checked against mtime and size, and optionally pickled on disk by content hash
+parsed_configs = {} # path -> (stamp, digest, config)
+merged_configs = {} # (path, cwd) -> ([(path, stamp)], config)
+config_cache_folder = None
+
+def set_config_cache_folder(folder):
+    global config_cache_folder
+    if folder is not None:
+        ensure_folder_recursive(folder)
+    config_cache_folder = folder
+
+def get_file_stamp(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def parse_yaml_data(data, digest):
+    cache_path = f'{config_cache_folder}/{digest}.pickle' if config_cache_folder is not None else None
+    if cache_path is not None and os.path.isfile(cache_path):
+        try:
+            with open(cache_path, 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            pass # rewritten below
+    config = yaml.load(data, Loader=YAML_LOADER)
+    if cache_path is not None:
+        temp_path = f'{cache_path}.{os.getpid()}'
+        with open(temp_path, 'wb') as cache_file:
+            pickle.dump(config, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, cache_path) # workers may write the same entry
+    return config
+
+def read_yaml_cached(yaml_path):
+    # a copy of the containers, callers modify the config they get
+    path = os.path.abspath(yaml_path)
+    stamp = get_file_stamp(path)
+    entry = parsed_configs.get(path)
+    if entry is None or entry[0] != stamp:
+        with open(path, 'rb') as yaml_file:
+            data = yaml_file.read()
+        digest = hashlib.sha1(data).hexdigest()
+        config = entry[2] if entry is not None and entry[1] == digest else parse_yaml_data(data, digest) # touched but unchanged
+        entry = parsed_configs[path] = (stamp, digest, config)
+    return copy_tree(entry[2])
+
 def get_config_path_or_folder(path):
     if os.path.isfile(path):
         return path
@@ -29,7 +76,7 @@ def get_config_path(path):
     error(f"invalid description file path: {path}")
 
 def read_description(yaml_path):
-    _dict = read_yaml(yaml_path)
+    _dict = read_yaml_cached(yaml_path)
     description = ensured_retrieve("omni.replicator.object", _dict, dict)
     version = ensured_retrieve("version", description)
     if version != VERSION:
@@ -44,20 +91,27 @@ def flatten(config):
             if count < 0:
                 error('count should be non-negative int')
             for i in range(count):
-                flattened_config[f'{key}_{i}'] = copy.deepcopy(value)
-                flattened_config[f'{key}_{i}']['index'] = i
+                flattened_config[f'{key}_{i}'] = CountInstance(value, {'index': i}) # expanded by Description.resolve_placeholders
         else:
             flattened_config[key] = value
     return flattened_config
 
 def read_yaml_recursive(yaml_path):
-    config = read_description(get_config_path(yaml_path))
-    while 'parent_config' in config:
-        parent_path = get_config_path(config.pop('parent_config'))
-        parent_config = read_description(parent_path)
-        parent_config.update(config)
-        config = parent_config
-    return flatten(config)
+    # parent names resolve against the working directory as well
+    key = (os.path.abspath(yaml_path), os.getcwd())
+    entry = merged_configs.get(key)
+    if entry is None or any(get_file_stamp(path) != stamp for path, stamp in entry[0]):
+        path = get_config_path(yaml_path)
+        chain = [(path, get_file_stamp(path))]
+        config = read_description(path)
+        while 'parent_config' in config:
+            parent_path = get_config_path(config.pop('parent_config'))
+            chain.append((parent_path, get_file_stamp(parent_path)))
+            parent_config = read_description(parent_path)
+            parent_config.update(config)
+            config = parent_config
+        entry = merged_configs[key] = (chain, config)
+    return flatten(copy_tree(entry[1]))
 
 async def simulate(yaml_path, scene):
     config = read_yaml_recursive(yaml_path)
@@ -71,12 +125,15 @@ async def simulate(yaml_path, scene):
     await scene.initialize(metadata)
     LOG("------ init ------")
     scene.num_frames = ensured_retrieve('num_frames', description.context, int)
-    for index in range(scene.num_frames):
-        description.initialize(index)
-        metadata = resolve_scene(description)
-        await scene.step(metadata, index, description.seed)
-        LOG(f"------ frame {index} ------")
-    scene.clean_up(metadata)
+    try:
+        for index in range(scene.num_frames):
+            description.initialize(index)
+            metadata = resolve_scene(description)
+            await scene.step(metadata, index, description.seed)
+            LOG(f"------ frame {index} ------")
+        scene.clean_up(metadata)
+    finally:
+        description.close() # harmonizer workers
 
     # below comment: minimum example of description output
     # metadata_with_header = {
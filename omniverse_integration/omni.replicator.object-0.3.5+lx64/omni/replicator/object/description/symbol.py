@@ -1,22 +1,32 @@
 from .misc import *
 from .maths import *
-from .safe_eval import eval_expression
+from .safe_eval import eval_expression, compile_template, eval_compiled
+from .asset_index import get_asset_paths
+from .aabb_cache import get_aabb_cache
+from .bin_pack import get_packing_order, pack_sizes, get_layout, get_cache_key, BinPackCache, BIN_PACK_ALGORITHMS
 from enum import Enum
+import concurrent.futures
 from ..utility.misc import LOG
 
 AWAIT_HARMONIZATION = '@@@@@'
+# harmonizer_pool, for harmonizer_workers > 1; process is opt-in, for the offline tools, forking Kit is not safe
+HARMONIZER_POOLS = ('thread', 'process')
+MAPPED_KEYS = ('seed', 'num_frames') # keys of Description.mapping, they shadow the same keys in the context
 
 class HarmonizerState(Enum):
     UNUSED = 0
     ABSORBING = 1
     REFLECTING = 2
 
+MACRO_PATTERN = regex.compile("\$\[.*?\]")
+NESTED_MACRO_PATTERN = regex.compile("\$\[((?>[^\$\[\]]+|\[.*?\]|(?R))*)\]")
+
 def has_macro(value):
-    return len(regex.findall("\$\[.*?\]", value)) > 0
+    return '$[' in value and MACRO_PATTERN.search(value) is not None
 
 def get_macros(value):
     # will explain
-    return regex.findall("\$\[((?>[^\$\[\]]+|\[.*?\]|(?R))*)\]", value)
+    return NESTED_MACRO_PATTERN.findall(value)
 
 
 class Description:
@@ -27,16 +37,54 @@ class Description:
         for m in self.mutable_elements:
             m.context = self.context
         self.mapping = []
+        self.scoped_mappings = {}
         self.scene = scene
+        self.reference_index = ReferenceIndex(self.context)
+        self.rng = tentative_retrieve('rng', self.context, str, RNG_LEGACY)
+        if self.rng not in (RNG_LEGACY, RNG_PHILOX):
+            error(f'unrecognized rng "{self.rng}", expected "{RNG_LEGACY}" or "{RNG_PHILOX}"')
+        bin_pack_cache_size = tentative_retrieve('bin_pack_cache_size', self.context, int, 0)
+        self.bin_pack_cache = BinPackCache(bin_pack_cache_size, tentative_retrieve('bin_pack_cache_folder', self.context, str)) if bin_pack_cache_size > 0 else None
+        self.aabb_cache = get_aabb_cache(tentative_retrieve('aabb_cache_folder', self.context, str))
+        self.schedule = Schedule(self)
+
+    def close(self):
+        self.schedule.close()
+        if self.aabb_cache is not None:
+            self.aabb_cache.save()
+            LOG(self.aabb_cache.report())
+        if self.bin_pack_cache is not None:
+            self.bin_pack_cache.save()
+            LOG(self.bin_pack_cache.report())
 
     def initialize(self, index):
         for m in self.mutable_elements:
             m.initialize()
         for h in self.harmonizers:
             h.initialize()
-        self.seed = ensured_retrieve('seed', self.context, int) + index
+        self.base_seed = ensured_retrieve('seed', self.context, int)
+        self.frame_index = index
+        self.seed = self.base_seed + index
         random.seed(self.seed)
         self.mapping = {'seed': self.seed, 'num_frames': self.scene.num_frames}
+        self.scoped_mappings = {}
+
+    def scoped_mapping(self, index_mapping):
+        # mapping extended with the index/count of an element, merged once per frame instead of once per lookup
+        key = id(index_mapping)
+        if key not in self.scoped_mappings:
+            self.scoped_mappings[key] = (self.mapping | index_mapping, index_mapping) # keep index_mapping alive so the id stays unique
+        return self.scoped_mappings[key][0]
+
+    # random source of an attribute for the current frame
+    def get_random(self, name, name_hash, user_seed=None, reseed=True):
+        if self.rng == RNG_LEGACY:
+            if reseed:
+                attribute_seed(name, self.seed, user_seed, name_hash)
+            return random
+        if user_seed is None:
+            return RandomStream(name_hash, self.base_seed, self.frame_index)
+        return RandomStream(name_hash, user_seed)
 
     def get_distributed_attribute_mutable_element(self, name, attribute_desc):
         distribution_type = ensured_retrieve('distribution_type', attribute_desc, str)
@@ -60,7 +108,8 @@ class Description:
         if harmonizer_type == 'permutate':
             return HarmonizerPermutate(self, name)
         if harmonizer_type == 'bin_pack':
-            return HarmonizerBinPack(self, name, ensured_retrieve('bin_size', attribute_desc), tentative_retrieve('index', attribute_desc), tentative_retrieve('count', attribute_desc))
+            return HarmonizerBinPack(self, name, ensured_retrieve('bin_size', attribute_desc), tentative_retrieve('index', attribute_desc), tentative_retrieve('count', attribute_desc),
+                tentative_retrieve('algorithm', attribute_desc, str, 'py3dbp'), tentative_retrieve('time_budget', attribute_desc, (int, float)))
         else:
             error(f'unrecognized harmonizer type "{harmonizer_type}" in "{name}"')
 
@@ -73,29 +122,27 @@ class Description:
         return value
 
     def resolve_placeholders(self, name, description_item, index_mapping={}):
+        # builds new containers, the config is left untouched since count instances share it
         if isinstance(description_item, (float, int, bool)):
             return description_item
         elif isinstance(description_item, str):
             return self.resolve_string(name, description_item, index_mapping)
         elif isinstance(description_item, list):
-            for i in range(len(description_item)):
-                description_item[i] = self.resolve_placeholders(f'{name}~{i}', description_item[i], index_mapping)
-            return description_item
-        elif isinstance(description_item, dict):
+            return [self.resolve_placeholders(f'{name}~{i}', item, index_mapping) for i, item in enumerate(description_item)]
+        elif isinstance(description_item, collections.abc.Mapping):
             if 'distribution_type' in description_item:
                 return self.get_distributed_attribute_mutable_element(name, description_item)
             elif 'harmonizer_type' in description_item:
                 return self.get_harmonizer(name, description_item)
             else:
-                for key in description_item:
-                    description_item[key] = self.resolve_placeholders(f'{name}/{key}', description_item[key], index_mapping)
-                return description_item
+                return {key: self.resolve_placeholders(f'{name}/{key}', description_item[key], index_mapping) for key in description_item}
         else:
             error(f"unknown type {type(description_item)} in config") # should not reach here though
 
 class Harmonizer:
     def __init__(self, description, name):
         self.name = name
+        self.name_hash = get_name_hash(name)
         self.description = description
         description.harmonizers.append(self)
 
@@ -106,7 +153,21 @@ class Harmonizer:
         return self.output[mutable_name]
 
     def harmonize(self, is_init_frame):
-        pass
+        job = self.prepare(is_init_frame)
+        if job is not None:
+            self.finish(job[0](*job[1]))
+
+    # resolves what harmonizing needs from the description, returns (function, args) computing the output without it, or None
+    # so that the computation can run in a harmonizer worker
+    def prepare(self, is_init_frame):
+        return None
+
+    # takes what the function of prepare returned
+    def finish(self, result):
+        self.output = result
+
+    def operands(self):
+        return []
 
     def initialize(self):
         self.input = {}
@@ -123,20 +184,21 @@ class HarmonizerPermutate(Harmonizer):
         super().__init__(description, name)
         self.harmonizer_type = 'permutate'
 
-    def harmonize(self, is_init_frame):
+    def prepare(self, is_init_frame):
+        # shuffled here, the random source belongs to the description
         if is_init_frame:
-            return
+            return None
         values = list(self.input.values())
-        random.shuffle(values)
+        self.description.get_random(self.name, self.name_hash, reseed=False).shuffle(values)
         for i, key in enumerate(self.input):
             self.output[key] = values[i]
-
-from py3dbp import Packer, Bin, Item
+        return None
 
 def get_dimension(min, max):
     return [max[0] - min[0], max[1] - min[1], max[2] - min[2]]
 
 def serialize_packer(packer):
+    # layout of a py3dbp packer, what pack_bin gives
     serialized_packer = {}
     bin = packer.bins[0]
     for item in bin.items:
@@ -186,29 +248,46 @@ def calc_box_xform(name, aabb, packer, bin_size):
 
         return (translate_local_xform @ rotate_xform @ position_xform).tolist()
 
+def harmonize_bin_pack(bin_size, input, names, sizes, algorithm, time_budget, packing=None):
+    # output of a bin_pack harmonizer from the AABBs it absorbed, and the packing if it was computed in full here
+    computed = None
+    if packing is None:
+        packing, finished = pack_sizes(bin_size, sizes, algorithm, time_budget)
+        computed = packing if finished else None # a packing cut by the time budget is not what the items give
+    packer = get_layout(names, packing)
+    return {name: calc_box_xform(name, aabb, packer, bin_size) for name, aabb in input.items()}, computed
+
 class HarmonizerBinPack(Harmonizer):
-    def __init__(self, description, name, bin_size, ref_index=None, ref_count=None):
+    def __init__(self, description, name, bin_size, ref_index=None, ref_count=None, algorithm='py3dbp', time_budget=None):
         super().__init__(description, name)
         self.harmonizer_type = 'bin_pack'
+        if algorithm not in BIN_PACK_ALGORITHMS:
+            error(f'unrecognized bin pack algorithm "{algorithm}" in "{name}", expected one of {BIN_PACK_ALGORITHMS}')
+        self.algorithm = algorithm
+        self.time_budget = time_budget
         self.ref_index_mapping = {'index': ref_index, 'count': ref_count}
         self.bin_size = description.resolve_placeholders(f'{name}', bin_size, self.ref_index_mapping)
         self.resolved_bin_size = None
 
-    def harmonize(self, is_init_frame):
+    def operands(self):
+        return [self.bin_size]
+
+    def prepare(self, is_init_frame):
         if is_init_frame:
-            return
-        bin_size = resolve_value_generic(self.bin_size, self.description.mapping | self.ref_index_mapping, is_init_frame)
+            return None
+        bin_size = resolve_value_generic(self.bin_size, self.description.scoped_mapping(self.ref_index_mapping), is_init_frame)
         self.resolved_bin_size = bin_size
-
-        packer = Packer()
-        packer.add_bin(Bin(self.name, bin_size[0], bin_size[1], bin_size[2], 1))
-        for name, aabb in self.input.items():
-            x, y, z = get_dimension(aabb[0], aabb[1])
-            packer.add_item(Item(name, x, y, z, 0))
-        packer.pack()
-        packer = serialize_packer(packer)
-        for name, aabb in self.input.items():
-            self.output[name] = calc_box_xform(name, aabb, packer, bin_size)
+        names, sizes = get_packing_order({name: get_dimension(aabb[0], aabb[1]) for name, aabb in self.input.items()}, self.algorithm)
+        # the cache is only used here and in finish, harmonizer workers may be other processes
+        cache = self.description.bin_pack_cache
+        self.cache_key = get_cache_key(bin_size, sizes, self.algorithm) if cache is not None else None
+        packing = cache.get(self.cache_key) if cache is not None else None
+        return harmonize_bin_pack, (bin_size, self.input, names, sizes, self.algorithm, self.time_budget, packing)
+
+    def finish(self, result):
+        self.output, computed = result
+        if computed is not None and self.description.bin_pack_cache is not None:
+            self.description.bin_pack_cache.put(self.cache_key, computed)
 
     def repr(self):
         _ = super().repr()
@@ -220,6 +299,7 @@ class HarmonizerBinPack(Harmonizer):
 class MutableElement:
     def __init__(self, description, name, ref_index=None, ref_count=None):
         self.name = name
+        self.name_hash = get_name_hash(name)
         self.initiated_resolution = False # to detect cyclic reference
         self.description = description
         description.mutable_elements.append(self)
@@ -229,6 +309,18 @@ class MutableElement:
     def resolve(self, is_init_frame):
         pass
 
+    # values this element resolves on its own, used to build the dependency graph
+    def operands(self):
+        return []
+
+    # reference strings this element looks up from its own name
+    def references(self):
+        return []
+
+    # whether resolving draws from the random module, whose state all elements share with legacy rng
+    def uses_shared_random(self):
+        return False
+
     def get_value(self, is_init_frame):
         if self.initiated_resolution:
             error(f'cyclic reference is detected. "{self.name}" is depending on itself!')
@@ -248,7 +340,7 @@ class MutableElement:
 
     def set_seed(self, is_init_frame):
         seed = resolve_value_generic(self.seed, self.description.mapping, is_init_frame) if self.seed is not None else None
-        attribute_seed(self.name, self.description.seed, seed)
+        return self.description.get_random(self.name, self.name_hash, seed)
 
 def resolve_value_generic(value, mapping={}, is_init_frame=False):
     if isinstance(value, MutableElement):
@@ -286,14 +378,7 @@ def resolve_value_generic(value, mapping={}, is_init_frame=False):
         error(f"unknown type {type(value)} in symbols") # should not reach here though
 
 def resolve_scene(description, is_init_frame=False):
-    metadata = AWAIT_HARMONIZATION
-    while metadata == AWAIT_HARMONIZATION:
-        metadata = resolve_value_generic(description.context, description.mapping, is_init_frame)
-        for h in description.harmonizers:
-            if h.state == HarmonizerState.ABSORBING:
-                h.harmonize(is_init_frame)
-                h.state = HarmonizerState.REFLECTING
-    return metadata
+    return description.schedule.resolve(description, is_init_frame)
 
 def get_absolute_reference(path):
     names = path.split('/')
@@ -345,13 +430,67 @@ class AttributeReference(MutableElement):
         super().__init__(description, name)
         self.ref_key = ref_key
 
+    def references(self):
+        return [] if self.ref_key in MAPPED_KEYS else [self.ref_key]
+
     def resolve(self, is_init_frame):
-        _value = resolve_value_generic(resolve_reference(self.context, self.context, self.name, self.ref_key, self.description.mapping), self.description.mapping, is_init_frame)
+        _value = resolve_value_generic(self.description.reference_index.lookup(self.name, self.ref_key, self.description.mapping), self.description.mapping, is_init_frame)
         if isinstance(_value, (list, dict)):
             self.value = resolve_value_generic(_value, self.description.mapping, is_init_frame)
         else:
             self.value = _value
 
+class ExpressionTemplate:
+    def __init__(self, expression, macro_texts):
+        # literal text and slot indices, split in the order the macros used to be replaced in
+        self.parts = [expression]
+        for slot, text in enumerate(macro_texts):
+            parts = []
+            for part in self.parts:
+                if not isinstance(part, str):
+                    parts.append(part)
+                    continue
+                for i, piece in enumerate(part.split(text)):
+                    if i > 0:
+                        parts.append(slot)
+                    if piece:
+                        parts.append(piece)
+            self.parts = parts
+        literals = [part for part in self.parts if isinstance(part, str)]
+        # a "$" left in the literal text could combine with substituted values, keep replacing macros one by one
+        self.exact = not any(literal.find('$') != -1 for literal in literals)
+        self.expression = expression
+        self.macro_texts = macro_texts
+        self.code = None
+        if self.exact and not any(literal.find('__macro_') != -1 for literal in literals):
+            self.slot_names = [f'__macro_{slot}__' for slot in range(len(macro_texts))]
+            template = ''.join(part if isinstance(part, str) else self.slot_names[part] for part in self.parts)
+            compiled = compile_template(template, frozenset(self.slot_names))
+            if compiled is not None:
+                self.template = template # the expression with the slots as variables
+                self.code, sign_sensitive = compiled
+                self.sign_sensitive = [name in sign_sensitive for name in self.slot_names]
+
+    def can_bind(self, values):
+        # numbers bind as variables where their text would evaluate to the same value
+        for value, sign_sensitive in zip(values, self.sign_sensitive):
+            if type(value) not in (int, float, bool) or (type(value) == float and not math.isfinite(value)):
+                return False
+            if sign_sensitive and (value < 0 or math.copysign(1, value) < 0):
+                return False
+        return True
+
+    def evaluate(self, values):
+        if self.code is not None and self.can_bind(values):
+            return eval_compiled(self.code, dict(zip(self.slot_names, values)))
+        texts = [str(value) for value in values]
+        if not self.exact or any(text.find('$') != -1 for text in texts):
+            expression = self.expression
+            for macro_text, text in zip(self.macro_texts, texts):
+                expression = expression.replace(macro_text, text)
+            return eval_expression(expression)
+        return eval_expression(''.join(part if isinstance(part, str) else texts[part] for part in self.parts))
+
 class AttributeExpression(MutableElement):
     def __init__(self, description, name, expression, index_mapping={}):
         super().__init__(description, name)
@@ -362,26 +501,31 @@ class AttributeExpression(MutableElement):
             if has_macro(macro):
                #self.macros[i] = AttributeExpression(description, f'{name}/macro_{i}', macro)
                self.macros[i] = AttributeExpression(description, f'{name}', macro, index_mapping) # the inner macro should have the same name context
+        self.template = ExpressionTemplate(expression, [f'$[{macro}]' if isinstance(macro, str) else f'$[{macro.expression}]' for macro in self.macros])
+
+    def operands(self):
+        return [macro for macro in self.macros if isinstance(macro, AttributeExpression)]
+
+    def references(self):
+        return [macro for macro in self.macros if isinstance(macro, str) and macro not in MAPPED_KEYS and macro not in self.index_mapping]
 
     def resolve(self, is_init_frame):
-        expression = self.expression
+        mapping = self.description.scoped_mapping(self.index_mapping)
+        reference_index = self.description.reference_index
+        values = []
         for macro in self.macros:
             if isinstance(macro, str):
-                resolved_macro_value = resolve_value_generic(resolve_reference(self.context, self.context, self.name, macro, self.description.mapping | self.index_mapping), self.description.mapping | self.index_mapping, is_init_frame)
-                if resolved_macro_value is None or resolved_macro_value == AWAIT_HARMONIZATION:
-                    self.value = resolved_macro_value
-                    return
-                expression = expression.replace(f'$[{macro}]', str(resolved_macro_value))
+                resolved_macro_value = resolve_value_generic(reference_index.lookup(self.name, macro, mapping), mapping, is_init_frame)
             elif isinstance(macro, AttributeExpression):
                 resolved_macro = resolve_value_generic(macro, self.description.mapping, is_init_frame)
-                resolved_macro_value = resolve_value_generic(resolve_reference(self.context, self.context, self.name, resolved_macro, self.description.mapping | self.index_mapping), self.description.mapping | self.index_mapping, is_init_frame)
-                if resolved_macro_value is None or resolved_macro_value == AWAIT_HARMONIZATION:
-                    self.value = resolved_macro_value
-                    return
-                expression = expression.replace(f'$[{macro.expression}]', str(resolved_macro_value))
+                resolved_macro_value = resolve_value_generic(reference_index.lookup(self.name, resolved_macro, mapping), mapping, is_init_frame)
             else:
                 error(f"invalid type {type(macro)} in {self.name}")
-        self.value = eval_expression(expression)
+            if resolved_macro_value is None or resolved_macro_value == AWAIT_HARMONIZATION:
+                self.value = resolved_macro_value
+                return
+            values.append(resolved_macro_value)
+        self.value = self.template.evaluate(values)
 
 class AttributeHarmonized(MutableElement):
     def __init__(self, description, name, harmonizer_name, pitch, ref_index=None, ref_count=None):
@@ -389,11 +533,14 @@ class AttributeHarmonized(MutableElement):
         self.pitch = description.resolve_placeholders(f'{name}/pitch', pitch, self.ref_index_mapping)
         self.harmonizer_name = description.resolve_placeholders(f'{name}', harmonizer_name, self.ref_index_mapping)
 
+    def operands(self):
+        return [self.harmonizer_name, self.pitch]
+
     def resolve(self, is_init_frame=False):
         if is_init_frame:
             self.await_harmonization = False # can't harmonize during scene creation
             return
-        harmonizer_name = resolve_value_generic(self.harmonizer_name, self.description.mapping | self.ref_index_mapping, is_init_frame)
+        harmonizer_name = resolve_value_generic(self.harmonizer_name, self.description.scoped_mapping(self.ref_index_mapping), is_init_frame)
         harmonizer = ensured_retrieve(harmonizer_name, self.context, Harmonizer)
         if harmonizer.state == HarmonizerState.REFLECTING:
             self.value = harmonizer.reflect(self.name)
@@ -403,13 +550,15 @@ class AttributeHarmonized(MutableElement):
                 harmonizer.state = HarmonizerState.ABSORBING
             if self.pitch == 'local_aabb':
                 mutable_name = self.name[:self.name.rfind('/')]
-                usd_path = str(resolve_value_generic(resolve_reference(self.context, self.context, mutable_name, 'usd_path', self.description.mapping), self.description.mapping, is_init_frame))
-                mutable_name = mutable_name[1:mutable_name.rfind('/')]
-                mutable = self.description.scene.mutables[mutable_name]
-                aabb = mutable.update_usd(usd_path, True)
+                usd_path = str(resolve_value_generic(self.description.reference_index.lookup(mutable_name, 'usd_path', self.description.mapping), self.description.mapping, is_init_frame))
+                aabb = self.description.aabb_cache.get(usd_path) if self.description.aabb_cache is not None else None
+                if aabb is None: # from the stage, the mesh steps to this usd_path later anyway
+                    mutable_name = mutable_name[1:mutable_name.rfind('/')]
+                    mutable = self.description.scene.mutables[mutable_name]
+                    aabb = mutable.update_usd(usd_path, True)
                 pitch = aabb
             else:
-                pitch = resolve_value_generic(self.pitch, self.description.mapping | self.ref_index_mapping, is_init_frame)
+                pitch = resolve_value_generic(self.pitch, self.description.scoped_mapping(self.ref_index_mapping), is_init_frame)
             harmonizer.absorb(self.name, pitch)
 
     def initialize(self):
@@ -425,15 +574,24 @@ class AttributeRange(MutableElement):
         self.end = description.resolve_placeholders(f'{name}', end)
         self.seed = description.resolve_placeholders(f'{name}', seed) if seed is not None else None
 
+    def operands(self):
+        return [self.start, self.end, self.seed]
+
+    def uses_shared_random(self):
+        return self.description.rng == RNG_LEGACY
+
     def resolve(self, is_init_frame):
         start, end = resolve_value_generic(self.start, self.description.mapping, is_init_frame), resolve_value_generic(self.end, self.description.mapping, is_init_frame)
-        self.set_seed(is_init_frame)
+        rng = self.set_seed(is_init_frame)
+        self.value = self.sample(start, end, rng)
+
+    def sample(self, start, end, rng):
         if isinstance(start, (float, int)) and isinstance(end, (float, int)):
-            self.value = rand_range(start, end)
+            return rand_range(start, end, rng)
         elif isinstance(start, list) and isinstance(end, list):
             if len(self.start) != len(self.end):
                 error(f'mismatching start/end dimension in range, in {self.name}')
-            self.value = rand_range_list(self.start, self.end)
+            return rand_range_list(self.start, self.end, rng)
         else:
             error(f'invalid types for start {type(start)} and/or {type(end)} in {self.name}')
 
@@ -459,11 +617,17 @@ class AttributeFolder(MutableElement):
         self.values = None
         self.seed = description.resolve_placeholders(f'{name}', seed) if seed is not None else None
 
+    def operands(self):
+        return [self.folder, self.suffix, self.index, self.seed]
+
+    def uses_shared_random(self):
+        return self.index is None and self.description.rng == RNG_LEGACY
+
     def resolve(self, is_init_frame):
         folder = resolve_value_generic(self.folder, self.description.mapping, is_init_frame)
         suffix = resolve_value_generic(self.suffix, self.description.mapping, is_init_frame)
         if self.values is None:
-            self.values = get_relative_paths_of_suffix(folder, suffix, True)
+            self.values = get_asset_paths(folder, suffix, True)
             if self.values is None or len(self.values) == 0:
                 error(f"folder {folder} is empty")
             self.value = self.values # initial frame
@@ -472,8 +636,8 @@ class AttributeFolder(MutableElement):
                 index = resolve_value_generic(self.index, self.description.mapping, is_init_frame)
                 self.value = self.values[int(index) % len(self.values)]
             else:
-                self.set_seed(is_init_frame)
-                self.value = random.choice(self.values)
+                rng = self.set_seed(is_init_frame)
+                self.value = rng.choice(self.values)
 
 class AttributeSet(MutableElement):
     def __init__(self, description, name, values, index, seed=None):
@@ -482,6 +646,12 @@ class AttributeSet(MutableElement):
         self.index = description.resolve_placeholders(f'{name}', index) if index is not None else None
         self.seed = description.resolve_placeholders(f'{name}', seed) if seed is not None else None
 
+    def operands(self):
+        return [self.values, self.index, self.seed]
+
+    def uses_shared_random(self):
+        return self.index is None and self.description.rng == RNG_LEGACY
+
     def resolve(self, is_init_frame):
         values = resolve_value_generic(self.values, self.description.mapping, is_init_frame)
         if is_init_frame:
@@ -490,8 +660,8 @@ class AttributeSet(MutableElement):
             index = resolve_value_generic(self.index, self.description.mapping, is_init_frame)
             self.value = values[int(index) % len(values)]
         else:
-            self.set_seed(is_init_frame)
-            self.value = random.choice(values)
+            rng = self.set_seed(is_init_frame)
+            self.value = rng.choice(values)
 
 def camera_ov_to_standard(camera_parameters):
     standard_camera_parameters = {}
@@ -509,18 +679,329 @@ class AttributeCameraFrustum(MutableElement):
         self.distance_max = description.resolve_placeholders(f'{name}', distance_max)
         self.screen_space_range = description.resolve_placeholders(f'{name}', screen_space_range)
 
+    def operands(self):
+        return [self.camera_parameters, self.distance_min, self.distance_max, self.screen_space_range]
+
+    def uses_shared_random(self):
+        return self.description.rng == RNG_LEGACY
+
     def resolve(self, is_init_frame):
         camera_parameters = resolve_value_generic(self.camera_parameters, self.description.mapping, is_init_frame)
         distance_min = resolve_value_generic(self.distance_min, self.description.mapping, is_init_frame)
         distance_max = resolve_value_generic(self.distance_max, self.description.mapping, is_init_frame)
         screen_space_range = resolve_value_generic(self.screen_space_range, self.description.mapping, is_init_frame)
+        rng = self.description.get_random(self.name, self.name_hash, reseed=False)
+        self.value = self.sample(camera_parameters, distance_min, distance_max, screen_space_range, rng)
+
+    def sample(self, camera_parameters, distance_min, distance_max, screen_space_range, rng):
         standard_camera_parameters = camera_ov_to_standard(camera_parameters)
         pinhole_ratio = standard_camera_parameters['pinhole_ratio']
         aspect_ratio = standard_camera_parameters['screen_width'] / standard_camera_parameters['screen_height']
 
-        distance = random_reciprocal(distance_min, distance_max)
-        x_rand = screen_space_range * rand_range(-1, 1)
-        y_rand = screen_space_range * rand_range(-1, 1)
+        distance = random_reciprocal(distance_min, distance_max, rng)
+        x_rand = screen_space_range * rand_range(-1, 1, rng)
+        y_rand = screen_space_range * rand_range(-1, 1, rng)
         x_ndc, y_ndc = x_rand * distance, y_rand * distance
         res_x, res_y = x_ndc / pinhole_ratio * aspect_ratio, y_ndc / pinhole_ratio
-        self.value = [res_x, res_y, -distance]
+        return [res_x, res_y, -distance]
+
+# reference index
+
+REFERENCE_DYNAMIC, REFERENCE_TARGET, REFERENCE_ELEMENT_ITEM, REFERENCE_MISSING = range(4)
+
+def is_path_key(key):
+    # keys that resolve_reference can address, other keys are left to it
+    return isinstance(key, str) and key not in ('', '..') and key.find('/') == -1 and key.find('~') == -1
+
+class ReferenceIndex:
+    def __init__(self, context):
+        self.context = context
+        self.nodes = {} # absolute path -> node, list items as "/key~i"
+        self.compiled = {} # (calling context, reference) -> (kind, target, list index)
+        stack = [('', context)]
+        while stack:
+            path, node = stack.pop()
+            if not isinstance(node, dict):
+                continue
+            for key, value in node.items():
+                if not is_path_key(key):
+                    continue
+                self.nodes[f'{path}/{key}'] = value
+                stack.append((f'{path}/{key}', value))
+                if isinstance(value, list):
+                    for i, item in enumerate(value):
+                        self.nodes[f'{path}/{key}~{i}'] = item
+                        stack.append((f'{path}/{key}~{i}', item))
+
+    def compile(self, calling_context, reference):
+        # the same walk as resolve_reference, done once; anything unusual is left to resolve_reference
+        try:
+            path = reference.strip()
+            if not path.startswith('/'):
+                path = get_absolute_reference(calling_context[:calling_context.rfind('/') + 1] + path)
+            if path in self.nodes:
+                return (REFERENCE_TARGET, self.nodes[path], None)
+            parent_path, _, key = path.rpartition('/')
+            parent = self.context if parent_path == '' else self.nodes.get(parent_path)
+            base, _, list_index = key.partition('~')
+            if not isinstance(parent, dict) or not is_path_key(base):
+                return (REFERENCE_DYNAMIC, None, None)
+            if list_index:
+                if isinstance(parent.get(base), MutableElement):
+                    return (REFERENCE_ELEMENT_ITEM, parent[base], int(list_index))
+                return (REFERENCE_DYNAMIC, None, None)
+            # not found in its own context, falls back to the outer context
+            if f'/{key}' in self.nodes:
+                return (REFERENCE_TARGET, self.nodes[f'/{key}'], None)
+            return (REFERENCE_MISSING, f'/{key}', None)
+        except Exception:
+            return (REFERENCE_DYNAMIC, None, None)
+
+    def get_compiled(self, calling_context, reference):
+        key = (calling_context, reference)
+        compiled = self.compiled.get(key)
+        if compiled is None:
+            compiled = self.compiled[key] = self.compile(calling_context, reference)
+        return compiled
+
+    def lookup(self, calling_context, reference, mapping={}):
+        # same result as resolve_reference on the description context
+        if reference in mapping:
+            return mapping[reference]
+        kind, target, list_index = self.get_compiled(calling_context, reference)
+        if kind == REFERENCE_TARGET:
+            return target
+        elif kind == REFERENCE_ELEMENT_ITEM:
+            return resolve_value_generic(target, mapping)[list_index] # if it's a harmonized attr...
+        elif kind == REFERENCE_MISSING:
+            error(f'not found reference: {target}')
+        return resolve_reference(self.context, self.context, calling_context, reference, mapping)
+
+    def is_static(self, calling_context, reference):
+        # whether find_target gives what a lookup resolves to
+        return self.get_compiled(calling_context, reference)[0] in (REFERENCE_TARGET, REFERENCE_ELEMENT_ITEM)
+
+    def find_target(self, calling_context, reference):
+        # static target of a reference, None when it is only known at resolution time
+        kind, target, _ = self.get_compiled(calling_context, reference)
+        if kind in (REFERENCE_TARGET, REFERENCE_ELEMENT_ITEM):
+            return target
+        return None
+
+# dependency graph
+
+def collect_nodes(value):
+    # mutable elements and harmonizers directly held by a value, without looking into the nodes themselves
+    nodes = []
+    stack = [value]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, (MutableElement, Harmonizer)):
+            nodes.append(item)
+        elif isinstance(item, list):
+            stack.extend(reversed(item))
+        elif isinstance(item, dict):
+            stack.extend(reversed(list(item.values())))
+    return nodes
+
+class DependencyGraph:
+    def __init__(self, description):
+        context = description.context
+        self.edges = {} # node -> nodes it depends on
+        self.static = set() # elements whose references are all known before resolution
+        for h in description.harmonizers:
+            self.edges[h] = collect_nodes(h.operands())
+        for m in description.mutable_elements:
+            dependencies = collect_nodes(m.operands())
+            for reference in m.references():
+                dependencies += collect_nodes(description.reference_index.find_target(m.name, reference))
+            self.edges[m] = dependencies
+            # nested macros of an expression give the reference to look up at resolution time
+            if all(description.reference_index.is_static(m.name, reference) for reference in m.references()) and \
+                    not (isinstance(m, AttributeExpression) and m.operands()):
+                self.static.add(m)
+        for m in description.mutable_elements:
+            if isinstance(m, AttributeHarmonized) and isinstance(m.harmonizer_name, str):
+                harmonizer = context.get(m.harmonizer_name)
+                if isinstance(harmonizer, Harmonizer):
+                    # the harmonizer absorbs the pitch, the element reflects the harmonized result
+                    self.edges[harmonizer] += collect_nodes(m.pitch)
+                    self.edges[m] = [harmonizer]
+
+    def topological_order(self):
+        order = []
+        visiting, visited = set(), set()
+        for root in self.edges:
+            if root in visited:
+                continue
+            visiting.add(root)
+            stack = [(root, iter(self.edges[root]))]
+            while stack:
+                node, dependencies = stack[-1]
+                for dependency in dependencies:
+                    if dependency in visiting:
+                        error(f'cyclic reference is detected. "{dependency.name}" is depending on itself!')
+                    if dependency not in visited:
+                        visiting.add(dependency)
+                        stack.append((dependency, iter(self.edges.get(dependency, []))))
+                        break
+                else:
+                    stack.pop()
+                    visiting.remove(node)
+                    visited.add(node)
+                    order.append(node)
+        return order
+
+    def element_order(self):
+        # mutable elements resolved in topological order before the entries of a frame, each once, with what they depend on
+        # already resolved: no draws from the shared random source, whose order is the document order, no harmonization,
+        # every reference known before resolution, and the same for all the elements they depend on
+        order = []
+        ordered = set()
+        for node in self.topological_order():
+            if node in self.static and not isinstance(node, AttributeHarmonized) and not node.uses_shared_random() and \
+                    all(dependency in ordered for dependency in self.edges[node]):
+                order.append(node)
+                ordered.add(node)
+        return order
+
+    def harmonizer_waves(self, harmonizers):
+        # groups of harmonizers in order, none depends on a harmonizer of its own or of a later group
+        # a harmonizer name only known at resolution time can be any harmonizer, what depends on it is harmonized alone, last
+        upstream = {} # node -> harmonizers it depends on
+        dynamic = set()
+        levels = {}
+        for node in self.topological_order():
+            upstream[node] = set()
+            for dependency in self.edges.get(node, []):
+                upstream[node] |= upstream.get(dependency, set())
+                if isinstance(dependency, Harmonizer):
+                    upstream[node].add(dependency)
+                if dependency in dynamic:
+                    dynamic.add(node)
+            if isinstance(node, AttributeHarmonized) and not isinstance(node.harmonizer_name, str):
+                dynamic.add(node)
+            if isinstance(node, Harmonizer) and node not in dynamic:
+                levels[node] = max((levels[h] + 1 for h in upstream[node]), default=0)
+        waves = [[h for h in harmonizers if levels.get(h) == level] for level in range(max(levels.values(), default=-1) + 1)]
+        return waves + [[h] for h in harmonizers if h in dynamic]
+
+# per-frame evaluation
+
+PLAN_VALUE, PLAN_CONSTANT, PLAN_ELEMENT, PLAN_HARMONIZER, PLAN_MAPPED, PLAN_LIST, PLAN_DICT = range(7)
+
+def compile_plan(value):
+    # post-order instructions, so that the containers of an entry are walked with a flat loop instead of recursively
+    plan = []
+    stack = [(PLAN_VALUE, value)]
+    while stack:
+        op, item = stack.pop()
+        if op != PLAN_VALUE:
+            plan.append((op, item))
+        elif isinstance(item, MutableElement):
+            plan.append((PLAN_ELEMENT, item))
+        elif isinstance(item, Harmonizer):
+            plan.append((PLAN_HARMONIZER, item))
+        elif isinstance(item, (float, int, bool, str)):
+            plan.append((PLAN_CONSTANT, item))
+        elif isinstance(item, list):
+            stack.append((PLAN_LIST, len(item)))
+            stack.extend((PLAN_VALUE, v) for v in reversed(item))
+        elif isinstance(item, dict):
+            stack.append((PLAN_DICT, tuple(item)))
+            for key in reversed(item):
+                stack.append((PLAN_MAPPED, key) if key in MAPPED_KEYS else (PLAN_VALUE, item[key]))
+        else:
+            error(f"unknown type {type(item)} in symbols") # should not reach here though
+    return plan
+
+def evaluate_plan(plan, mapping, is_init_frame):
+    stack = []
+    for op, arg in plan:
+        if op == PLAN_CONSTANT:
+            stack.append(arg)
+        elif op == PLAN_ELEMENT:
+            stack.append(arg.get_value(is_init_frame))
+        elif op == PLAN_HARMONIZER:
+            stack.append(arg.repr())
+        elif op == PLAN_MAPPED:
+            stack.append(mapping[arg])
+        else:
+            size = arg if op == PLAN_LIST else len(arg)
+            items = stack[len(stack) - size:]
+            del stack[len(stack) - size:]
+            if any(item == AWAIT_HARMONIZATION for item in items):
+                stack.append(AWAIT_HARMONIZATION)
+            elif op == PLAN_LIST:
+                stack.append(items)
+            else:
+                stack.append(dict(zip(arg, items)))
+    return stack[0]
+
+class Schedule:
+    def __init__(self, description):
+        self.graph = DependencyGraph(description)
+        self.waves = self.graph.harmonizer_waves(description.harmonizers) # also rejects cyclic references before the first frame
+        self.order = self.graph.element_order()
+        self.workers = tentative_retrieve('harmonizer_workers', description.context, int, 0)
+        self.pool = tentative_retrieve('harmonizer_pool', description.context, str, 'thread')
+        if self.pool not in HARMONIZER_POOLS:
+            error(f'unrecognized harmonizer pool "{self.pool}", expected one of {HARMONIZER_POOLS}')
+        self.executor = None
+        self.entries = []
+        for key, value in description.context.items():
+            plan = [(PLAN_MAPPED, key)] if key in MAPPED_KEYS else compile_plan(value)
+            has_harmonizer = any(op == PLAN_HARMONIZER for op, _ in plan) # harmonizer repr changes after harmonization
+            self.entries.append((key, plan, has_harmonizer))
+
+    def resolve(self, description, is_init_frame):
+        # elements in graph order first, their operands are resolved when they are, then the entries in document order,
+        # which resolve the other elements on demand; the frame creating the scene resolves only what its entries reach
+        if not is_init_frame:
+            for m in self.order:
+                m.get_value(is_init_frame)
+        # resolved elements keep their value for the frame, so a pass after harmonization
+        # only needs to revisit the entries that were awaiting harmonization
+        values = {}
+        pending = self.entries
+        while pending:
+            revisit = []
+            awaiting = False
+            for entry in pending:
+                key, plan, has_harmonizer = entry
+                values[key] = evaluate_plan(plan, description.mapping, is_init_frame)
+                if values[key] == AWAIT_HARMONIZATION:
+                    awaiting = True
+                    revisit.append(entry)
+                elif has_harmonizer:
+                    revisit.append(entry)
+            self.harmonize(is_init_frame)
+            if not awaiting:
+                break
+            pending = revisit
+        return {key: values[key] for key, _, _ in self.entries}
+
+    def harmonize(self, is_init_frame):
+        # jobs are prepared and finished in harmonizer order, only the computation runs in the pool,
+        # so the results do not depend on scheduling
+        for wave in self.waves:
+            harmonizers = [h for h in wave if h.state == HarmonizerState.ABSORBING]
+            jobs = [h.prepare(is_init_frame) for h in harmonizers]
+            for h, job, result in zip(harmonizers, jobs, self.run(jobs)):
+                if job is not None:
+                    h.finish(result)
+                h.state = HarmonizerState.REFLECTING
+
+    def run(self, jobs):
+        if self.workers <= 1 or sum(job is not None for job in jobs) <= 1:
+            return [job[0](*job[1]) if job is not None else None for job in jobs]
+        if self.executor is None:
+            executor_type = concurrent.futures.ProcessPoolExecutor if self.pool == 'process' else concurrent.futures.ThreadPoolExecutor
+            self.executor = executor_type(self.workers)
+        futures = [self.executor.submit(job[0], *job[1]) if job is not None else None for job in jobs]
+        return [future.result() if future is not None else None for future in futures]
+
+    def close(self):
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
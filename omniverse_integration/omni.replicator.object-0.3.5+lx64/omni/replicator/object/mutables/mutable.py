@@ -1,6 +1,8 @@
 from ..utility.interface import *
 from ..utility.tex_attr_ops import tex_mut_attr_operation
 from ..utility.safe_eval import safe_eval
+from ..description.asset_index import get_asset_paths
+from ..description.bin_pack import pack_bin, BIN_PACK_ALGORITHMS
 
 class MutableAttribute:
 
@@ -79,7 +81,7 @@ class MutableAttributeFolder(MutableAttribute):
         if isinstance(folder, str):
             folder = MacroStringPair(folder, folder)
         self.macro_string_pair = folder
-        self.values = get_relative_paths_of_suffix(self.macro_string_pair.actual_string, suffix)
+        self.values = get_asset_paths(self.macro_string_pair.actual_string, suffix)
         if not self.values:
             error(f"folder {self.macro_string_pair.actual_string} is empty")
         self.curr_relative_path = None
@@ -257,8 +259,6 @@ class HarmonizerPermutate(Harmonizer):
     def reflect(self, mutable_name):
         return self.output[mutable_name]
 
-from py3dbp import Packer, Bin, Item
-
 def get_dimension(min, max):
     return [max[0] - min[0], max[1] - min[1], max[2] - min[2]]
 
@@ -323,19 +323,17 @@ class HarmonizerBinPack(Harmonizer):
             self.bin_size = bin_size
         else:
             error(f"invalid type for {name}(harmonizer): bin_size")
+        self.algorithm = tentative_retrieve('algorithm', config_item, str, 'py3dbp')
+        if self.algorithm not in BIN_PACK_ALGORITHMS:
+            error(f'unrecognized bin pack algorithm "{self.algorithm}" for {name}(harmonizer), expected one of {BIN_PACK_ALGORITHMS}')
+        self.time_budget = tentative_retrieve('time_budget', config_item, (int, float))
 
     def post_resonate(self):
         if self.bin_size_mutable_attribute is not None:
             self.bin_size_mutable_attribute.resolve()
             self.bin_size = self.bin_size_mutable_attribute.curr_value
 
-        packer = Packer()
-        packer.add_bin(Bin(self.name, self.bin_size[0], self.bin_size[1], self.bin_size[2], 1))
-        for name, aabb in self.input.items():
-            x, y, z = get_dimension(aabb[0], aabb[1])
-            packer.add_item(Item(name, x, y, z, 0))
-        packer.pack()
-        packer = serialize_packer(packer)
+        packer = pack_bin(self.bin_size, {name: get_dimension(aabb[0], aabb[1]) for name, aabb in self.input.items()}, self.algorithm, self.time_budget)
         for name, aabb in self.input.items():
             self.output[name] = calc_box_xform(name, aabb, packer, self.bin_size)
 
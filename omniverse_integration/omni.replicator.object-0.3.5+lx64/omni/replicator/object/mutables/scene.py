@@ -10,7 +10,7 @@ def flatten(config):
             if count < 0:
                 error('count should be non-negative int')
             for i in range(count):
-                flattened_config[f'{key}_{i}'] = copy.deepcopy(value)
+                flattened_config[f'{key}_{i}'] = copy_tree(value)
                 flattened_config[f'{key}_{i}']['index'] = i
         else:
             flattened_config[key] = value
@@ -113,6 +113,9 @@ class Scene:
                 if value:
                     ensure_folder(f'{self.output_path}/{key}')
 
+        self.writer = create_output_writer(self.config)
+        self.output_formats = get_output_formats(self.config)
+
     async def randomize(self, index):
         with CHECK("scene randomize"):
             self.seed = ensured_retrieve('seed', self.config, int) + index
@@ -164,7 +167,8 @@ class Scene:
                         self.metadata[mutable.name]['bounding_boxes_2d'] = bboxes_2d
                         visible_labeled_set = set()
                         if self.output_switches['labels']:
-                            visible_labeled_set = save_bbox_2d_to_kitti(bboxes_2d, f'{self.output_path}/labels/{output_name}.txt', occlusion_threshold)
+                            lbl_txt, visible_labeled_set = get_kitti_labels(bboxes_2d, occlusion_threshold)
+                            self.writer.submit(save_text, lbl_txt, f'{self.output_path}/labels/{output_name}.txt')
                             filtered_bboxes_2d = {name: bboxes_2d[name] for name in visible_labeled_set}
                             if coco_2dlabels is not None:
                                 coco_2dlabels[output_name] = filtered_bboxes_2d
@@ -179,30 +183,25 @@ class Scene:
                         #visible_mutables = [name for name in bboxes_2d.keys()]
                         #bboxes_3d_filtered = {key: bboxes_3d[key] for key in visible_mutables}
                         if self.output_switches['3d_labels']:
-                            save_to_3d_labels(self.metadata[mutable.name], bboxes_3d, f'{self.output_path}/3d_labels/{output_name}.json', visible_labeled_set)
+                            self.writer.submit(save_to_3d_labels, copy_tree(self.metadata[mutable.name]), bboxes_3d, f'{self.output_path}/3d_labels/{output_name}.json', visible_labeled_set)
 
+                        # encoded and written by the output writer, the captured images and arrays are not reused by the annotators
                         if self.output_switches['segmentation']:
-                            segmentation[0].save(f'{self.output_path}/segmentation/{output_name}.png')
-                            write_yaml(segmentation[1], f'{self.output_path}/segmentation/{output_name}.yaml')
+                            self.writer.submit(save_segmentation, segmentation, f'{self.output_path}/segmentation/{output_name}')
 
                         if self.output_switches['instance_id_segmentation']:
-                            instance_id_segmentation[0].save(f'{self.output_path}/instance_id_segmentation/{output_name}.png')
-                            write_yaml(instance_id_segmentation[1], f'{self.output_path}/instance_id_segmentation/{output_name}.yaml')
+                            self.writer.submit(save_segmentation, instance_id_segmentation, f'{self.output_path}/instance_id_segmentation/{output_name}')
 
                         if self.output_switches['depth']:
-                            with open(f'{self.output_path}/depth/{output_name}.npy', 'wb') as f:
-                                np.save(f, depth)
+                            self.writer.submit(save_depth, depth, f'{self.output_path}/depth/{output_name}', self.output_formats['depth'], self.output_formats['depth_scale'])
 
                         if self.output_switches['normal']:
-                            with open(f'{self.output_path}/normal/{output_name}.npy', 'wb') as f:
-                                np.save(f, normal)
+                            self.writer.submit(save_normal, normal, f'{self.output_path}/normal/{output_name}', self.output_formats['normal'])
 
                         if self.output_switches['images']:
                             output_path = f'{self.output_path}/images/{output_name}.jpg'
-                        image.save(output_path)
                         message = f"[METROPERF]: image saved at {output_path}, [{index + 1}/{self.config['num_frames']}]"
-                        logging.info(message)
-                        print(message)
+                        self.writer.submit(save_image, image, output_path, message)
                         if progress_bar is not None:
                             progress_bar.model.set_value((index + 1)/self.config['num_frames'])
 
@@ -222,4 +221,4 @@ class Scene:
             }
             metadata_with_header["omni.replicator.object"].update(self.metadata)
             if self.output_switches['descriptions']:
-                write_yaml(metadata_with_header, f'{self.output_path}/descriptions/{output_name}.yaml')
\ No newline at end of file
+                self.writer.submit(write_yaml, copy_tree(metadata_with_header), f'{self.output_path}/descriptions/{output_name}.yaml')
\ No newline at end of file
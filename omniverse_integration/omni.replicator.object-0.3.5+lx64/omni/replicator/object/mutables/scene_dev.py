@@ -6,10 +6,12 @@ from .geometry import *
 class Scene_DEV:
 
     def __init__(self, binary_obj_det=None, progress_bar=None):
-        self.coco_2dlabels = {}
+        self.coco_writer = None
         self.binary_obj_det = binary_obj_det
         self.progress_bar = progress_bar
         self.num_frames = 1
+        self.writer = None
+        self.sink = None
 
     async def initialize(self, metadata):
         await self.initialize_scene(metadata)
@@ -128,10 +130,18 @@ class Scene_DEV:
 
         with CHECK("create folders"):
             ensure_folder_recursive(self.output_path)
+            self.sink = create_output_sink(metadata, self.output_path)
             for key, value in self.output_switches.items():
-                if value:
+                # with output_mode shards, only usd stages are written as files
+                if value and (isinstance(self.sink, FolderSink) or key == 'usd'):
                     ensure_folder(f'{self.output_path}/{key}')
 
+        self.writer = create_output_writer(metadata)
+        self.output_formats = get_output_formats(metadata)
+        if self.output_switches['labels']:
+            checkpoint_images = tentative_retrieve('coco_checkpoint_images', metadata, int, 0)
+            self.coco_writer = CocoWriter(self.output_path, ensured_retrieve('screen_height', metadata, int), ensured_retrieve('screen_width', metadata, int), self.binary_obj_det, checkpoint_images)
+
     def create_mutables(self, metadata):
         self.physics_global = {
             "friction": tentative_retrieve("friction", metadata, (int, float), 1),
@@ -178,11 +188,13 @@ class Scene_DEV:
 
                         metadata[mutable.name]['bounding_boxes_2d'] = bboxes_2d
                         visible_labeled_set = set()
+                        outputs = []
                         if self.output_switches['labels']:
-                            visible_labeled_set = save_bbox_2d_to_kitti(bboxes_2d, f'{self.output_path}/labels/{output_name}.txt', occlusion_threshold)
+                            lbl_txt, visible_labeled_set = get_kitti_labels(bboxes_2d, occlusion_threshold)
+                            outputs.append(Output('labels', '.txt', encode_text, lbl_txt))
                             filtered_bboxes_2d = {name: bboxes_2d[name] for name in visible_labeled_set}
-                            if self.coco_2dlabels is not None:
-                                self.coco_2dlabels[output_name] = filtered_bboxes_2d
+                            if self.coco_writer is not None:
+                                self.coco_writer.add(output_name, filtered_bboxes_2d)
 
                         # TODO
                         if self.output_switches['3d_labels']:
@@ -194,30 +206,29 @@ class Scene_DEV:
                         #visible_mutables = [name for name in bboxes_2d.keys()]
                         #bboxes_3d_filtered = {key: bboxes_3d[key] for key in visible_mutables}
                         if self.output_switches['3d_labels']:
-                            save_to_3d_labels(metadata[mutable.name], bboxes_3d, f'{self.output_path}/3d_labels/{output_name}.json', visible_labeled_set)
+                            outputs.append(Output('3d_labels', '.json', encode_3d_labels, copy_tree(metadata[mutable.name]), bboxes_3d, visible_labeled_set))
 
+                        # encoded and written by the output writer, the captured images and arrays are not reused by the annotators
                         if self.output_switches['segmentation']:
-                            segmentation[0].save(f'{self.output_path}/segmentation/{output_name}.png')
-                            write_yaml(segmentation[1], f'{self.output_path}/segmentation/{output_name}.yaml')
+                            outputs.append(Output('segmentation', '.png', encode_image, segmentation[0], 'PNG'))
+                            outputs.append(Output('segmentation', '.yaml', encode_yaml, segmentation[1]))
 
                         if self.output_switches['instance_id_segmentation']:
-                            instance_id_segmentation[0].save(f'{self.output_path}/instance_id_segmentation/{output_name}.png')
-                            write_yaml(instance_id_segmentation[1], f'{self.output_path}/instance_id_segmentation/{output_name}.yaml')
+                            outputs.append(Output('instance_id_segmentation', '.png', encode_image, instance_id_segmentation[0], 'PNG'))
+                            outputs.append(Output('instance_id_segmentation', '.yaml', encode_yaml, instance_id_segmentation[1]))
 
                         if self.output_switches['depth']:
-                            with open(f'{self.output_path}/depth/{output_name}.npy', 'wb') as f:
-                                np.save(f, depth)
+                            depth_format = self.output_formats['depth']
+                            outputs.append(Output('depth', get_encoded_suffix(depth_format, DEPTH_ENCODINGS), encode_depth, depth, depth_format, self.output_formats['depth_scale']))
 
                         if self.output_switches['normal']:
-                            with open(f'{self.output_path}/normal/{output_name}.npy', 'wb') as f:
-                                np.save(f, normal)
+                            normal_format = self.output_formats['normal']
+                            outputs.append(Output('normal', get_encoded_suffix(normal_format, NORMAL_ENCODINGS), encode_normal, normal, normal_format))
 
                         if self.output_switches['images']:
-                            output_path = f'{self.output_path}/images/{output_name}.jpg'
-                        image.save(output_path)
-                        message = f"[METROPERF]: image saved at {output_path}, [{index + 1}/{self.num_frames}]"
-                        logging.info(message)
-                        print(message)
+                            message = f"[METROPERF]: image saved at {{location}}, [{index + 1}/{self.num_frames}]"
+                            outputs.append(Output('images', '.jpg', encode_image, image, 'JPEG', message=message))
+                        self.sink.submit(self.writer, output_name, outputs)
                         if self.progress_bar is not None:
                             self.progress_bar.model.set_value((index + 1)/self.num_frames)
 
@@ -236,10 +247,15 @@ class Scene_DEV:
             metadata_with_header["omni.replicator.object"].update(metadata)
             if self.output_switches['descriptions']:
                 metadata_with_header["omni.replicator.object"]['output_path'] += '__NEXT' # convenience for restoration
-                write_yaml(metadata_with_header, f'{self.output_path}/descriptions/{output_name}.yaml')
+                self.sink.submit(self.writer, output_name, [Output('descriptions', '.yaml', encode_yaml, copy_tree(metadata_with_header))])
 
             if self.output_switches['usd']:
                 omni.usd.get_context().save_as_stage(f'{self.output_path}/usd/{output_name}.usd')
 
     def clean_up(self, metadata):
-        save_2dlabels_coco(self.coco_2dlabels, metadata['output_path'], metadata['screen_height'], metadata['screen_width'], self.binary_obj_det)
+        try:
+            self.writer.close()
+        finally:
+            self.sink.close()
+            if self.coco_writer is not None:
+                self.coco_writer.close()
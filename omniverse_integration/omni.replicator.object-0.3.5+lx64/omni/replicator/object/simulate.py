@@ -9,6 +9,8 @@ from .mutables.scene_dev import *
 
 def resolve_placeholders_inner(description_item, global_description):
     for key, value in description_item.items():
+        if isinstance(value, CountInstance):
+            description_item[key] = value = copy_tree(value) # scene mutables expect a dict of their own
         if type(value) == dict:
             resolve_placeholders_inner(description_item[key], global_description)
         elif type(value) == list:
@@ -137,6 +139,7 @@ async def on_simulate(extension, config_path, progress_bar=None, windowless=Fals
 
                     timeline_stop()
                     LOG(f'============== frame {index} ==============')
+            scene.writer.close()
             save_2dlabels_coco(coco_2dlabels, config['output_path'], config['screen_height'], config['screen_width'], binary_obj_det)
 
     except Exception as e:
@@ -0,0 +1,125 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import json
+    import random
+    import types
+
+    import sys
+    sys.path.append('../../../../')
+    sys._UNIT_TEST = True
+
+    import numpy as np
+    from omni.replicator.object.description.symbol import Description, resolve_scene
+    from omni.replicator.object.description.batch import resolve_batch, get_column_expression, to_array
+    from omni.replicator.object.description.maths import MersenneColumns, MT_WORDS
+
+    FRAMES = [0, 1, 2, 5, 17, 64, 999, 12345]
+
+    def get_config(rng):
+        # distributions, references into lists, nested macros and expressions of numbers and of text
+        return {
+            'seed': 7, 'num_frames': 100000, 'rng': rng,
+            'r': {'distribution_type': 'range', 'start': [0, -1.5, 2], 'end': [10, 1.5, 4]},
+            'ri': {'distribution_type': 'range', 'start': -20, 'end': 20},
+            'rs': {'distribution_type': 'range', 'start': 0, 'end': 1, 'seed': 3},
+            'rsd': {'distribution_type': 'range', 'start': 0, 'end': 1, 'seed': '$[seed] * 2'},
+            'rc': {'distribution_type': 'range', 'start': '$[/ri]', 'end': '$[/ri] + 5'},
+            'k': {'distribution_type': 'set', 'values': [1, 2, 3, 4, 5, 6, 7]},
+            'n': '$[seed] % 7 + 1',
+            's': {'distribution_type': 'set', 'values': ['a', 'b', 'c', 'd', 'e']},
+            'si': {'distribution_type': 'set', 'values': [[1, 2], [3, 4], [5, 6]], 'index': '$[seed] * 3 - 20'},
+            'lv': ['$[/n]', '$[/n] * 2', 3],
+            'l': '$[/lv]',
+            'box_a': 0.5, 'box_b': -2, 'box_c': 'c', 'box_d': [1, 2], 'box_e': 1.5,
+            'path': '/root/box_$[/si~1]_$[/s].usd',
+            'pick': '"abcde"[$[seed] % 5]',
+            'nested': '$[/box_$[/pick]]',
+            'sum': '$[/r~0] * 2 - $[/r~1] / 3 + $[/n] // 2 - $[/n] % 3',
+            'square': '$[/r~1] ** 2 + math.sin($[/rs]) - abs($[/ri])',
+            'integer': '$[/n] * 1000003 - $[/l~1] // 3',
+            'division': '$[/n] / ($[/n] - 4) if $[/n] != 4 else 0',
+            'floor': 'math.floor($[/rc] * 10) % 7',
+            'text': '"$[/s]" + "_" + str($[/n])',
+        }
+
+    def make_description(rng):
+        scene = types.SimpleNamespace(num_frames=1, mutables={})
+        description = Description(get_config(rng), scene)
+        description.initialize(-1)
+        resolve_scene(description, True)
+        scene.num_frames = 100000
+        return description
+
+    NAMES = ['/r', '/ri', '/rs', '/rsd', '/rc', '/k', '/n', '/s', '/si', '/l', '/path', '/pick', '/nested', '/sum', '/square', '/integer', '/division', '/floor', '/text']
+
+    class TestBatch(ut.TestCase):
+        def assert_frames(self, rng):
+            # row i of the batch is what resolving frame FRAMES[i] gives
+            batch = resolve_batch(make_description(rng), FRAMES, NAMES)
+            description = make_description(rng)
+            for i, frame in enumerate(FRAMES):
+                description.initialize(frame)
+                values = resolve_scene(description)
+                for name in NAMES:
+                    value = batch[name][i]
+                    value = value.tolist() if isinstance(value, (np.ndarray, np.generic)) else value
+                    self.assertEqual(json.dumps(value), json.dumps(values[name[1:]]), (rng, name, frame))
+            return batch
+
+        def test_philox(self):
+            batch = self.assert_frames('philox')
+            self.assertEqual(batch['/r'].shape, (len(FRAMES), 3))
+            self.assertEqual(batch['/l'].shape, (len(FRAMES), 3))
+            self.assertEqual(batch['/sum'].dtype, np.float64)
+            self.assertEqual(batch['/integer'].dtype, np.int64)
+
+        def test_legacy(self):
+            batch = self.assert_frames('legacy')
+            self.assertEqual(batch['/r'].shape, (len(FRAMES), 3))
+
+        def test_column_expression(self):
+            # the same values as eval frame by frame, or None where they could differ
+            values = np.array([3, -7, 0, 2**40], dtype=np.int64)
+            expression = get_column_expression('__macro_0__ * 3 + __macro_1__', ('__macro_0__', '__macro_1__'))
+            self.assertEqual(expression.evaluate([values, 0.5]).tolist(), [v * 3 + 0.5 for v in values.tolist()])
+            divide = get_column_expression('__macro_0__ // __macro_1__ + __macro_0__ % __macro_1__', ('__macro_0__', '__macro_1__'))
+            self.assertEqual(divide.evaluate([values, -3]).tolist(), [v // -3 + v % -3 for v in values.tolist()])
+            self.assertIsNone(divide.evaluate([values, values])) # divides by zero
+            self.assertIsNone(expression.evaluate([np.array([2**62], dtype=np.int64), 1])) # leaves int64
+            power = get_column_expression('__macro_0__ ** 0.5', ('__macro_0__',))
+            self.assertIsNone(power.evaluate([np.array([-4.0, 4.0])])) # complex
+            self.assertIsNone(get_column_expression('[__macro_0__]', ('__macro_0__',)).body)
+
+        def test_ragged(self):
+            # lists of different lengths stay lists in an object array, for np.savez
+            config = get_config('philox')
+            config['ragged'] = {'distribution_type': 'set', 'values': [[1, 2], [1, 2, 3], [4]]}
+            scene = types.SimpleNamespace(num_frames=1, mutables={})
+            description = Description(config, scene)
+            description.initialize(-1)
+            resolve_scene(description, True)
+            values = resolve_batch(description, range(50), ['/ragged'])['/ragged']
+            array = to_array(values)
+            self.assertEqual((array.dtype, array.shape), (np.dtype(object), (50,)))
+            self.assertEqual(array.tolist(), values)
+            self.assertEqual(to_array(['a', 'b']).dtype.kind, 'U')
+
+        def test_mersenne_columns(self):
+            # random.Random of each seed, including seeds of other lengths and streams drawn past MT_WORDS
+            seeds = [0, 1, -5, 2**32, 2**600 + 1] + [random.Random(0).getrandbits(128) + i for i in range(300)]
+            columns = MersenneColumns(seeds)
+            uniforms = columns.random()
+            indices = columns.index(5)
+            choices = columns.choice('abc')
+            for i, seed in enumerate(seeds):
+                rng = random.Random(seed)
+                self.assertEqual(uniforms[i], rng.random())
+                self.assertEqual(indices[i], rng._randbelow(5))
+                self.assertEqual(choices[i], rng.choice('abc'))
+            self.assertFalse(columns.exhausted.any())
+            for _ in range(MT_WORDS):
+                columns.next_word()
+            self.assertTrue(columns.exhausted.all())
+
+    ut.main()
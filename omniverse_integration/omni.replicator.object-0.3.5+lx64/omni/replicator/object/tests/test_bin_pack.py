@@ -0,0 +1,117 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import random
+    import tempfile
+
+    import sys
+    sys.path.append('../../../../')
+    sys._UNIT_TEST = True
+
+    import numpy as np
+    from omni.replicator.object.description.bin_pack import pack_bin, get_packing_order, get_cache_key, BinPackCache, ROTATIONS
+    from omni.replicator.object.description.benchmark import pack_py3dbp, Packer
+
+    def random_items(rng, count, sizes=(10, 60), digits=3, repeats=False):
+        # name -> size, with sizes of other items again when repeats
+        items = {}
+        for i in range(count):
+            if repeats and items and rng.random() < 0.5:
+                items[f'item_{i}'] = list(rng.choice(list(items.values())))
+            else:
+                items[f'item_{i}'] = [round(rng.uniform(*sizes), digits) for _ in range(3)]
+        return items
+
+    def get_boxes(layout, items):
+        # (min corners, max corners) of the fitted items
+        low, high = [], []
+        for name, item in layout.items():
+            if item['fitted']:
+                dimension = np.array(items[name])[ROTATIONS[item['rotation_type']]]
+                low.append(item['position'])
+                high.append(np.array(item['position']) + dimension)
+        return np.array(low).reshape(-1, 3), np.array(high).reshape(-1, 3)
+
+    class TestPackBin(ut.TestCase):
+        @ut.skipIf(Packer is None, 'py3dbp is not installed')
+        def test_py3dbp_layouts(self):
+            # same items fitted at the same positions and rotations, in the same order
+            rng = random.Random(0)
+            for count, digits, repeats in [(1, 0, False), (8, 0, False), (20, 1, True), (30, 3, False), (30, 0, True)]:
+                for _ in range(3):
+                    bin_size = [rng.randint(60, 160) for _ in range(3)]
+                    items = random_items(rng, count, digits=digits, repeats=repeats)
+                    reference = pack_py3dbp(bin_size, items)
+                    layout = pack_bin(bin_size, items)
+                    self.assertEqual(layout, reference)
+                    self.assertEqual(list(layout), list(reference))
+
+        @ut.skipIf(Packer is None, 'py3dbp is not installed')
+        def test_py3dbp_unfitted(self):
+            items = {'big': [200, 10, 10], 'small': [10, 10, 10], 'flat': [100, 1, 100]}
+            self.assertEqual(pack_bin([100, 100, 100], items), pack_py3dbp([100, 100, 100], items))
+
+        def test_extreme_point(self):
+            # fitted items stay in the bin and do not overlap
+            rng = random.Random(1)
+            for _ in range(5):
+                bin_size = [rng.randint(60, 160) for _ in range(3)]
+                items = random_items(rng, 40, repeats=True)
+                layout = pack_bin(bin_size, items, 'extreme_point')
+                self.assertEqual(sorted(layout), sorted(items))
+                low, high = get_boxes(layout, items)
+                self.assertTrue(len(low) > 0)
+                self.assertTrue((low >= 0).all() and (high <= np.array(bin_size) + 1e-9).all())
+                overlap = ((low[:, None] < high[None] - 1e-9) & (low[None] < high[:, None] - 1e-9)).all(axis=-1)
+                np.fill_diagonal(overlap, False)
+                self.assertFalse(overlap.any())
+
+        def test_packing_order(self):
+            items = {'a': [1, 1, 1], 'b': [2, 2, 2], 'c': [1, 1, 1]}
+            self.assertEqual(get_packing_order(items, 'py3dbp')[0], ['a', 'c', 'b'])
+            self.assertEqual(get_packing_order(items, 'extreme_point')[0], ['b', 'a', 'c'])
+
+        def test_invalid_algorithm(self):
+            with self.assertRaises(Exception):
+                pack_bin([10, 10, 10], {'a': [1, 1, 1]}, 'first_fit')
+
+    class TestBinPackCache(ut.TestCase):
+        def test_hits(self):
+            # a packing depends on the sizes only, items of other names reuse it
+            rng = random.Random(2)
+            bin_size = [100, 80, 120]
+            items = random_items(rng, 12)
+            cache = BinPackCache(4)
+            layout = pack_bin(bin_size, items, cache=cache)
+            renamed = {f'other_{name}': size for name, size in items.items()}
+            cached = pack_bin(bin_size, renamed, cache=cache)
+            self.assertEqual((cache.hits, cache.misses), (1, 1))
+            self.assertEqual(cached, {f'other_{name}': item for name, item in layout.items()})
+            self.assertEqual(pack_bin(bin_size, items, 'extreme_point', cache=cache), pack_bin(bin_size, items, 'extreme_point'))
+            self.assertEqual((cache.hits, cache.misses), (1, 2))
+
+        def test_least_recently_used(self):
+            cache = BinPackCache(2)
+            cache.put('a', 1)
+            cache.put('b', 2)
+            self.assertEqual(cache.get('a'), 1)
+            cache.put('c', 3)
+            self.assertEqual(list(cache.packings), ['a', 'c'])
+            self.assertIsNone(cache.get('b'))
+            with self.assertRaises(Exception):
+                BinPackCache(0)
+
+        def test_persistence(self):
+            rng = random.Random(3)
+            bin_size = [90, 90, 90]
+            items = random_items(rng, 10)
+            names, sizes = get_packing_order(items, 'py3dbp')
+            with tempfile.TemporaryDirectory() as folder:
+                cache = BinPackCache(8, folder)
+                layout = pack_bin(bin_size, items, cache=cache)
+                cache.save()
+                loaded = BinPackCache(8, folder)
+                self.assertIsNotNone(loaded.get(get_cache_key(bin_size, sizes, 'py3dbp')))
+                self.assertEqual(pack_bin(bin_size, items, cache=loaded), layout)
+
+    ut.main()
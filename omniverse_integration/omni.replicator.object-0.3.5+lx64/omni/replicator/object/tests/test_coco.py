@@ -0,0 +1,144 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import json
+    import os
+    import random
+    import tempfile
+
+    import sys
+    sys.path.append('../../../../')
+    sys._UNIT_TEST = True
+
+    from omni.replicator.object.utility.metadata import CocoWriter, save_2dlabels_coco
+    from omni.replicator.object.utility.misc import write_json
+
+    def save_2dlabels_coco_in_memory(coco_labels, output_path, height, width, binary_obj_det=None):
+        # save_2dlabels_coco before annotations were streamed, every label of the run held in memory
+        from datetime import datetime
+        images = []
+        annotations = []
+        categories_dict = {}
+        images_count = 1
+        annotations_count = 1
+        for k, v in coco_labels.items():
+            annotation_for_this_image = 0
+            for cn, details in v.items():
+                class_name = cn
+                if "~~~" in cn:
+                    sp = cn.split("~~~")
+                    if len(sp) == 2:
+                        class_name = sp[1]
+                if class_name not in categories_dict:
+                    categories_dict[class_name] = len(categories_dict) + 1
+                cid = categories_dict[class_name]
+                bbox_x = details['x_min']
+                bbox_y = details['y_min']
+                if bbox_x < 0:
+                    bbox_x = 0
+                if bbox_x > width:
+                    bbox_x = width - 1
+                if bbox_y < 0:
+                    bbox_y = 0
+                if bbox_y > height:
+                    bbox_y = height - 1
+                bbox_w = details['x_max'] - bbox_x
+                bbox_h = details['y_max'] - bbox_y
+                if bbox_w > 0 and bbox_w < width and bbox_h > 0 and bbox_h < height:
+                    category_id = 1 if binary_obj_det is not None and binary_obj_det else cid
+                    annotations.append({'id':annotations_count, 'category_id':category_id, 'image_id':images_count, 'iscrowd':0, 'area':(bbox_w * bbox_h), 'bbox':[bbox_x, bbox_y, bbox_w, bbox_h]})
+                    annotations_count += 1
+                    annotation_for_this_image += 1
+            if annotation_for_this_image > 0:
+                images.append({'id':images_count, 'date_captured':str(datetime.utcnow()), 'width':width, 'height':height, 'file_name':f'{k}.jpg'})
+                images_count += 1
+            if binary_obj_det is not None and binary_obj_det:
+                categories = [{'id':1, 'name':'retail_object'}]
+            else:
+                categories = [{'id':v, 'name':k} for k, v in categories_dict.items()]
+            data = {'categories':categories, 'annotations':annotations, 'images':images}
+            write_json(data, os.path.join(output_path, 'annotations.json'), no_sort=True)
+
+    def random_labels(rng, frames, height=480, width=640):
+        # output name -> prim path -> bounding box, some off screen or empty
+        def get_bbox():
+            return {'x_min': rng.uniform(-20, width + 20), 'y_min': rng.uniform(-20, height + 20), 'x_max': rng.uniform(0, width + 20), 'y_max': rng.uniform(0, height + 20)}
+        labels = {}
+        for i in range(frames):
+            names = [f'/World/obj_{rng.randint(0, 9)}_{j}~~~{rng.choice("abcde")}' if rng.random() < 0.8 else f'/World/plain_{rng.randint(0, 3)}' for j in range(rng.randint(0, 6))]
+            labels[f'{i}_camera'] = {name: get_bbox() for name in names}
+        return labels
+
+    def read_annotations(folder):
+        with open(f'{folder}/annotations.json') as f:
+            data = json.load(f)
+        for image in data['images']:
+            image['date_captured'] = None
+        return data
+
+    class TestCoco(ut.TestCase):
+        def setUp(self):
+            self.folder = tempfile.TemporaryDirectory()
+
+        def tearDown(self):
+            self.folder.cleanup()
+
+        def get_folder(self, name):
+            folder = f'{self.folder.name}/{name}'
+            os.makedirs(folder)
+            return folder
+
+        def test_in_memory(self):
+            # same categories, annotations and images as the in-memory writer, no part files left
+            rng = random.Random(0)
+            labels = random_labels(rng, 300)
+            for binary_obj_det in (None, False, True):
+                reference, streamed = self.get_folder(f'reference_{binary_obj_det}'), self.get_folder(f'streamed_{binary_obj_det}')
+                save_2dlabels_coco_in_memory(labels, reference, 480, 640, binary_obj_det)
+                save_2dlabels_coco(labels, streamed, 480, 640, binary_obj_det)
+                self.assertEqual(read_annotations(streamed), read_annotations(reference))
+                self.assertEqual(os.listdir(streamed), ['annotations.json'])
+
+        def test_frames(self):
+            # added one frame at a time, as Scene_DEV does
+            rng = random.Random(1)
+            labels = random_labels(rng, 100)
+            reference, streamed = self.get_folder('reference'), self.get_folder('streamed')
+            save_2dlabels_coco_in_memory(labels, reference, 480, 640)
+            writer = CocoWriter(streamed, 480, 640)
+            for name, bboxes_2d in labels.items():
+                writer.add(name, bboxes_2d)
+            writer.close()
+            writer.close()
+            self.assertEqual(read_annotations(streamed), read_annotations(reference))
+
+        def test_checkpoint(self):
+            # a complete annotations.json every checkpoint_images images with annotations
+            rng = random.Random(2)
+            labels = random_labels(rng, 200)
+            streamed = self.get_folder('streamed')
+            writer = CocoWriter(streamed, 480, 640, None, 25)
+            for i, (name, bboxes_2d) in enumerate(labels.items()):
+                writer.add(name, bboxes_2d)
+                if i == 99:
+                    break
+            images_count = writer.images_count - 1
+            self.assertEqual(len(read_annotations(streamed)['images']), images_count - images_count % 25)
+            writer.close()
+            reference = self.get_folder('reference')
+            save_2dlabels_coco_in_memory(dict(list(labels.items())[:100]), reference, 480, 640)
+            self.assertEqual(read_annotations(streamed), read_annotations(reference))
+
+        def test_empty(self):
+            # no frames, no annotations.json, as before
+            streamed = self.get_folder('streamed')
+            save_2dlabels_coco({}, streamed, 480, 640)
+            self.assertEqual(os.listdir(streamed), [])
+            # frames without annotations still write the categories
+            reference = self.get_folder('reference')
+            labels = {'0_camera': {'/World/obj~~~a': {'x_min': 10, 'y_min': 10, 'x_max': 5, 'y_max': 20}}}
+            save_2dlabels_coco(labels, streamed, 480, 640)
+            save_2dlabels_coco_in_memory(labels, reference, 480, 640)
+            self.assertEqual(read_annotations(streamed), read_annotations(reference))
+
+    ut.main()
@@ -0,0 +1,91 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import random
+
+    import sys
+    sys.path.append('../../../../../') # omniverse_integration, the blender side of the pipeline
+
+    import numpy as np
+    import obstacle_bvh
+    from obstacle_bvh import ObstacleBVH, make_synthetic_scene, sample_synthetic_segments, box_polygons
+    from camera_utils import ObstaclePolygons, sample_valid_camera_poses
+
+    def axis_segments(rng, count, low, high):
+        # segments along the axes and between box corners, the slab test divides by zero directions
+        origins = rng.uniform(low, high, (count, 3))
+        targets = origins.copy()
+        axes = rng.integers(3, size=count)
+        targets[np.arange(count), axes] = rng.uniform(low[axes], high[axes])
+        corners = rng.integers(2, size=(count, 3))
+        targets[::3] = np.where(corners[::3], high, low)
+        return origins, targets
+
+    class TestObstacleBVH(ut.TestCase):
+        def assert_same(self, polygons, origins, targets, leaf_sizes=(1, 2, obstacle_bvh.BVH_LEAF_SIZE, 64)):
+            reference = ObstaclePolygons(polygons).blocks(origins, targets)
+            for leaf_size in leaf_sizes:
+                self.assertTrue(np.array_equal(ObstacleBVH(polygons, leaf_size).blocks(origins, targets), reference), leaf_size)
+            return reference
+
+        def test_synthetic_scenes(self):
+            for polygon_count, seed in [(50, 0), (600, 1), (3000, 2)]:
+                rng = np.random.default_rng(seed)
+                polygons, rooms = make_synthetic_scene(polygon_count, rng)
+                origins, targets = sample_synthetic_segments(4000, rooms, rng)
+                blocked = self.assert_same(polygons, origins, targets)
+                self.assertTrue(0 < blocked.sum() < len(blocked))
+
+        def test_axis_aligned(self):
+            rng = np.random.default_rng(3)
+            polygons, rooms = make_synthetic_scene(400, rng)
+            low, high = np.array(rooms[0][0]), np.array(rooms[-1][1])
+            origins, targets = axis_segments(rng, 3000, low, high)
+            self.assert_same(polygons, origins, targets)
+            # segments lying in the planes of walls and floors
+            origins[:, 2] = 0
+            targets[:, 2] = 0
+            moving = (origins != targets).any(axis=1)
+            self.assert_same(polygons, origins[moving], targets[moving])
+
+        def test_polygons(self):
+            # triangles, pentagons and degenerate polygons, which never block
+            rng = np.random.default_rng(4)
+            polygons = box_polygons((0, 0, 0), (1, 1, 1)) + box_polygons((2, 0.5, 0.2), (2.5, 1.5, 0.9))
+            polygons.append([(0, 2, 0), (1, 2, 0), (0.5, 3, 1)])
+            polygons.append([(3 + np.cos(a), 2 + np.sin(a), 0.5) for a in np.linspace(0, 2 * np.pi, 5, endpoint=False)])
+            polygons.append([(0, 0, 2), (1, 1, 2), (2, 2, 2)])
+            polygons.append([(0, 0, 3), (0, 0, 3), (0, 0, 3)])
+            origins, targets = rng.uniform(-1, 4, (5000, 3)), rng.uniform(-1, 4, (5000, 3))
+            self.assert_same(polygons, origins, targets)
+            self.assert_same(polygons[-2:], origins, targets)
+            self.assertEqual(ObstacleBVH(polygons[-2:]).node_count, 0)
+
+        def test_empty(self):
+            origins = np.zeros((3, 3))
+            targets = np.ones((3, 3))
+            self.assertFalse(ObstacleBVH([]).blocks(origins, targets).any())
+            self.assertEqual(len(ObstacleBVH(box_polygons((0, 0, 0), (1, 1, 1))).blocks(origins[:0], targets[:0])), 0)
+
+        def test_chunks(self):
+            # segments walking the tree in several chunks
+            rng = np.random.default_rng(5)
+            polygons, rooms = make_synthetic_scene(300, rng)
+            origins, targets = sample_synthetic_segments(1000, rooms, rng)
+            segments = obstacle_bvh.BVH_SEGMENTS
+            obstacle_bvh.BVH_SEGMENTS = 97
+            try:
+                self.assert_same(polygons, origins, targets, (obstacle_bvh.BVH_LEAF_SIZE,))
+            finally:
+                obstacle_bvh.BVH_SEGMENTS = segments
+
+        def test_camera_poses(self):
+            # the sampler draws the same candidates and keeps the same ones with either obstacles
+            polygons, rooms = make_synthetic_scene(200, np.random.default_rng(6))
+            target = np.mean(rooms[0], axis=0)
+            reference = sample_valid_camera_poses(50, 2.5, target, polygons, rng=random.Random(7))
+            poses = sample_valid_camera_poses(50, 2.5, target, ObstacleBVH(polygons), rng=random.Random(7))
+            for a, b in zip(reference, poses):
+                self.assertTrue(np.array_equal(a, b))
+
+    ut.main()
@@ -0,0 +1,117 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import os
+    import tempfile
+
+    import sys
+    sys.path.append('../../../../')
+    sys._UNIT_TEST = True
+
+    import numpy as np
+    from omni.replicator.object.utility.output_formats import save_depth, save_normal, encode_depth, encode_normal, read_depth, read_normal, \
+        get_encoded_suffix, get_output_formats, DEPTH_ENCODINGS, NORMAL_ENCODINGS, FLOAT16_MAX, zstandard
+
+    COMPRESSED = ['zlib', 'npy+zlib'] + (['zstd', 'float16+zstd'] if zstandard is not None else [])
+
+    def random_depth(rng, shape=(150, 200)):
+        # depths over a few magnitudes, with a background at 0
+        depth = np.exp(rng.uniform(np.log(0.05), np.log(5000), shape)).astype(np.float32)
+        depth[:10, :10] = 0
+        return depth
+
+    def random_normals(rng, shape=(150, 200), channels=3):
+        normals = rng.normal(size=shape + (3,)).astype(np.float32)
+        normals /= np.linalg.norm(normals, axis=-1, keepdims=True)
+        normals[0, :20] = [[0, 0, 1], [0, 0, -1], [1, 0, 0], [-1, 0, 0], [0, 1, 0], [0, -1, 0], [0.6, 0.8, 0], [0, 0.6, -0.8]] + [[0, 0, 0]] * 12
+        if channels == 4:
+            normals = np.concatenate([normals, np.ones(shape + (1,), dtype=np.float32)], axis=-1)
+        return normals
+
+    def get_angles(a, b):
+        # degrees between vectors, arccos of float32 dot products is too coarse near 0
+        a, b = a.astype(np.float64), b.astype(np.float64)
+        return np.degrees(np.arctan2(np.linalg.norm(np.cross(a, b), axis=-1), (a * b).sum(axis=-1)))
+
+    class TestOutputFormats(ut.TestCase):
+        def setUp(self):
+            self.rng = np.random.default_rng(0)
+            self.folder = tempfile.TemporaryDirectory()
+
+        def tearDown(self):
+            self.folder.cleanup()
+
+        def round_trip_depth(self, depth, output_format, depth_scale=None):
+            # through a file and through bytes, e.g. a shard member, which must agree
+            path = save_depth(depth, f'{self.folder.name}/depth', output_format, depth_scale)
+            self.assertTrue(path.endswith(get_encoded_suffix(output_format, DEPTH_ENCODINGS)))
+            values = read_depth(path)
+            self.assertEqual(values.dtype, np.float32)
+            self.assertTrue(np.array_equal(values, read_depth(os.path.basename(path), encode_depth(depth, output_format, depth_scale))))
+            os.remove(path)
+            return values
+
+        def round_trip_normal(self, normal, output_format):
+            path = save_normal(normal, f'{self.folder.name}/normal', output_format)
+            self.assertTrue(path.endswith(get_encoded_suffix(output_format, NORMAL_ENCODINGS)))
+            values = read_normal(path)
+            self.assertEqual(values.dtype, np.float32)
+            self.assertTrue(np.array_equal(values, read_normal(os.path.basename(path), encode_normal(normal, output_format))))
+            os.remove(path)
+            return values
+
+        def test_lossless(self):
+            depth = random_depth(self.rng)
+            normal = random_normals(self.rng, channels=4)
+            for output_format in ['npy'] + COMPRESSED:
+                if output_format.startswith('float16'):
+                    continue
+                self.assertTrue(np.array_equal(self.round_trip_depth(depth, output_format), depth), output_format)
+                self.assertTrue(np.array_equal(self.round_trip_normal(normal, output_format), normal), output_format)
+
+        def test_float16(self):
+            depth = random_depth(self.rng)
+            depth[-1, -1] = 1e6
+            for output_format in ['float16'] + [f for f in COMPRESSED if f.startswith('float16')]:
+                values = self.round_trip_depth(depth, output_format)
+                inside = depth <= FLOAT16_MAX
+                self.assertTrue((np.abs(values[inside] - depth[inside]) <= depth[inside] * 2**-11).all())
+                self.assertEqual(values[-1, -1], FLOAT16_MAX)
+            normal = random_normals(self.rng)
+            self.assertTrue((np.abs(self.round_trip_normal(normal, 'float16') - normal) <= 2**-11).all())
+
+        def test_png16(self):
+            depth = random_depth(self.rng)
+            values = self.round_trip_depth(depth, 'png16')
+            scale = float(depth.max()) / 65535
+            self.assertTrue((np.abs(values - depth) <= scale / 2 + np.abs(depth) * 2**-22).all())
+            self.assertTrue((values[:10, :10] == 0).all())
+            # a fixed scale, depths above 65535 * scale clipped
+            values = self.round_trip_depth(depth, 'png16', 0.01)
+            inside = depth <= 655.35
+            self.assertTrue((np.abs(values[inside] - depth[inside]) <= 0.005 + np.abs(depth[inside]) * 2**-22).all())
+            self.assertTrue(np.allclose(values[~inside], 655.35))
+            self.assertTrue((self.round_trip_depth(np.zeros((4, 4), dtype=np.float32), 'png16') == 0).all())
+
+        def test_octahedral(self):
+            for channels in (3, 4):
+                normal = random_normals(self.rng, channels=channels)
+                for output_format in ['octahedral', 'octahedral+zlib'] + (['octahedral+zstd'] if zstandard is not None else []):
+                    values = self.round_trip_normal(normal, output_format)
+                    self.assertEqual(values.shape, normal.shape[:-1] + (3,))
+                    zero = (normal[..., :3] == 0).all(axis=-1)
+                    self.assertTrue((values[zero] == 0).all())
+                    self.assertTrue(np.allclose(np.linalg.norm(values[~zero], axis=-1), 1, atol=1e-6))
+                    self.assertTrue((get_angles(values[~zero], normal[..., :3][~zero]) <= 0.004).all())
+
+        def test_formats(self):
+            self.assertEqual(get_encoded_suffix('npy', DEPTH_ENCODINGS), '.npy')
+            self.assertEqual(get_encoded_suffix('zlib', DEPTH_ENCODINGS), '.npc')
+            self.assertEqual(get_encoded_suffix('png16', DEPTH_ENCODINGS), '.png')
+            self.assertEqual(get_encoded_suffix('octahedral', NORMAL_ENCODINGS), '.octahedral.npy')
+            self.assertEqual(get_output_formats({}), {'depth': 'npy', 'normal': 'npy', 'depth_scale': None})
+            for metadata in [{'depth_format': 'octahedral'}, {'normal_format': 'png16'}, {'depth_format': 'png16+zlib'}, {'depth_format': 'npy+lz4'}, {'depth_format': 'jpeg'}]:
+                with self.assertRaises(Exception):
+                    get_output_formats(metadata)
+
+    ut.main()
@@ -7,7 +7,7 @@ if __name__ == "__main__":
     sys.path.append('../utility/')
     sys._UNIT_TEST = True
 
-    from safe_eval import safe_eval, _flatten
+    from safe_eval import safe_eval, _flatten, compile_expression
 
     class TestFlatten(ut.TestCase):
         def test_valid_iterables(self):
@@ -117,4 +117,17 @@ if __name__ == "__main__":
             with self.assertRaises(Exception):
                 safe_eval("import os; math.cos = lambda x:os.system('sudo rm -rf /')")
 
+        def test_cache(self):
+            compile_expression.cache_clear()
+            for i in range(10):
+                self.assertEqual(safe_eval("a * 2 + b", {"a" : i, "b" : 1}), i * 2 + 1)
+            info = compile_expression.cache_info()
+            self.assertEqual((info.hits, info.misses), (9, 1))
+            # names are checked on every call, a cached expression is not allowed more than it was
+            with self.assertRaises(Exception):
+                safe_eval("a * 2 + b", {"a" : 1})
+            for i in range(2):
+                with self.assertRaises(Exception):
+                    safe_eval("x=7")
+
     ut.main()
\ No newline at end of file
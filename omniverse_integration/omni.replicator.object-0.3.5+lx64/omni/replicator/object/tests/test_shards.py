@@ -0,0 +1,108 @@
+# unit test
+if __name__ == "__main__":
+    import unittest as ut
+    import os
+    import tarfile
+    import tempfile
+
+    import sys
+    sys.path.append('../../../../')
+    sys._UNIT_TEST = True
+
+    from omni.replicator.object.utility.shards import ShardSink, ShardReader, SHARD_FOLDER, SHARD_INDEX, create_output_sink
+    from omni.replicator.object.utility.writer import OutputWriter, Output, FolderSink, encode_text
+
+    def text_output(folder, suffix, text):
+        return Output(folder, suffix, encode_text, text)
+
+    class TestShards(ut.TestCase):
+        def setUp(self):
+            self.folder = tempfile.TemporaryDirectory()
+            self.output_path = self.folder.name
+
+        def tearDown(self):
+            self.folder.cleanup()
+
+        def write(self, samples, threads=4, shard_size_mb=1024):
+            writer = OutputWriter(threads)
+            sink = ShardSink(self.output_path, shard_size_mb)
+            try:
+                for key, outputs in samples:
+                    sink.submit(writer, key, outputs)
+                writer.close()
+            finally:
+                sink.close()
+
+        def test_round_trip(self):
+            samples = [(f'{i}_camera', [text_output('images', '.jpg', f'image {i}' * (i + 1)), text_output('depth', '.npy', f'depth {i}')]) for i in range(20)]
+            self.write(samples)
+            reader = ShardReader(self.output_path)
+            self.assertEqual(sorted(reader.keys()), sorted(key for key, _ in samples))
+            for key, outputs in samples:
+                self.assertEqual(reader.members(key), [f'{key}.{output.folder}{output.suffix}' for output in outputs])
+                for output in outputs:
+                    self.assertEqual(reader.read(key, f'{key}.{output.folder}{output.suffix}'), output.get_bytes())
+            with self.assertRaises(Exception):
+                reader.read('0_camera', '0_camera.normal.npy')
+
+        def test_tar_members(self):
+            # the shards are plain tar files, the members of a sample consecutive
+            samples = [(str(i), [text_output('images', '.jpg', 'a'), text_output('descriptions', '.yaml', 'b')]) for i in range(3)]
+            self.write(samples, threads=0)
+            with tarfile.open(f'{self.output_path}/{SHARD_FOLDER}/shard-000000.tar') as shard:
+                names = shard.getnames()
+                self.assertEqual(names, [f'{i}.{name}' for i in range(3) for name in ('images.jpg', 'descriptions.yaml')])
+                self.assertEqual(shard.extractfile('1.descriptions.yaml').read(), b'b')
+
+        def test_shared_key(self):
+            # output_name gives a camera and the description of its frame the same key, both are read back
+            self.write([
+                ('demo_table_0', [text_output('images', '.jpg', 'image'), text_output('depth', '.npy', 'depth')]),
+                ('demo_table_0', [text_output('descriptions', '.yaml', 'description')]),
+            ], threads=0)
+            reader = ShardReader(self.output_path)
+            self.assertEqual(reader.keys(), ['demo_table_0'])
+            self.assertEqual(reader.members('demo_table_0'), ['demo_table_0.images.jpg', 'demo_table_0.depth.npy', 'demo_table_0.descriptions.yaml'])
+            self.assertEqual(reader.read('demo_table_0', 'demo_table_0.images.jpg'), b'image')
+            self.assertEqual(reader.read('demo_table_0', 'demo_table_0.depth.npy'), b'depth')
+            self.assertEqual(reader.read('demo_table_0', 'demo_table_0.descriptions.yaml'), b'description')
+
+        def test_rewritten_member(self):
+            # a frame written again, e.g. by a later run, the last line of a member wins
+            self.write([('0', [text_output('images', '.jpg', 'old'), text_output('depth', '.npy', 'depth')])], threads=0)
+            self.write([('0', [text_output('images', '.jpg', 'new')])], threads=0)
+            reader = ShardReader(self.output_path)
+            self.assertEqual(reader.read('0', '0.images.jpg'), b'new')
+            self.assertEqual(reader.read('0', '0.depth.npy'), b'depth')
+            self.assertEqual(sorted(os.listdir(f'{self.output_path}/{SHARD_FOLDER}')), [SHARD_INDEX, 'shard-000000.tar', 'shard-000001.tar'])
+
+        def test_shard_size(self):
+            # a shard is closed once it holds shard_size_mb, samples are never split
+            samples = [(str(i), [text_output('images', '.jpg', 'x' * 600000), text_output('depth', '.npy', 'y' * 1000)]) for i in range(5)]
+            self.write(samples, threads=0, shard_size_mb=1)
+            reader = ShardReader(self.output_path)
+            shards = {key: {reader.samples[key][name][0] for name in reader.members(key)} for key in reader.keys()}
+            self.assertTrue(all(len(names) == 1 for names in shards.values()))
+            self.assertEqual(len(set.union(*shards.values())), 3)
+            for key, outputs in samples:
+                self.assertEqual(reader.read(key, f'{key}.images.jpg'), outputs[0].get_bytes())
+
+        def test_interrupted_index(self):
+            self.write([('0', [text_output('images', '.jpg', 'image')])], threads=0)
+            with open(f'{self.output_path}/{SHARD_FOLDER}/{SHARD_INDEX}', 'a') as index:
+                index.write('{"key": "1", "shard"')
+            reader = ShardReader(self.output_path)
+            self.assertEqual(reader.keys(), ['0'])
+            self.assertEqual(reader.read('0', '0.images.jpg'), b'image')
+
+        def test_output_mode(self):
+            self.assertIsInstance(create_output_sink({}, self.output_path), FolderSink)
+            sink = create_output_sink({'output_mode': 'shards', 'shard_size_mb': 1}, self.output_path)
+            self.assertIsInstance(sink, ShardSink)
+            sink.close()
+            with self.assertRaises(Exception):
+                create_output_sink({'output_mode': 'zip'}, self.output_path)
+            with self.assertRaises(Exception):
+                ShardSink(self.output_path, 0)
+
+    ut.main()
@@ -2,4 +2,7 @@ from .maths import *
 from .misc import *
 from .scene import *
 from .xform import *
-from .metadata import *
\ No newline at end of file
+from .metadata import *
+from .writer import *
+from .output_formats import *
+from .shards import *
\ No newline at end of file
@@ -1,4 +1,7 @@
-from pxr import Semantics
+try:
+    from pxr import Semantics # Kit only, the label writers do not need it
+except ImportError:
+    Semantics = None
 from .maths import *
 from .misc import *
 import numpy as np
@@ -15,7 +18,7 @@ def enable_semantics(prim, semantic_label):
 
 from scipy.spatial.transform import Rotation
 
-def save_bbox_2d_to_kitti(bboxes_2d, path, occlusion_threshold):
+def get_kitti_labels(bboxes_2d, occlusion_threshold):
     lbl_txt = ''
     visible_labeled_set = set()
     for name, data in bboxes_2d.items():
@@ -23,6 +26,10 @@ def save_bbox_2d_to_kitti(bboxes_2d, path, occlusion_threshold):
         if data['occlusion'] <= occlusion_threshold:
             lbl_txt += f"{name} 0 {data['occlusion']} 0 {data['x_min']} {data['y_min']} {data['x_max']} {data['y_max']} 0 0 0 0 0 0 0\n"
             visible_labeled_set.add(name)
+    return lbl_txt, visible_labeled_set
+
+def save_bbox_2d_to_kitti(bboxes_2d, path, occlusion_threshold):
+    lbl_txt, visible_labeled_set = get_kitti_labels(bboxes_2d, occlusion_threshold)
     with open(path, 'w') as f:
         f.write(lbl_txt)
     return visible_labeled_set
@@ -57,6 +64,33 @@ def model_to_2d(pt, obj_xform, camera_xform, camera_intrinsics):
     y = (1 - ndc_space[1]) / 2 * screen_height
     return {'2d': (int(x), int(y)), '3d': (camera_space[:3] @ rot_z(90))}
 
+# keypoints of a 3d box, its center then the corners, x_min or x_max, ... for each corner
+KEYPOINT_CORNERS = [(x, y, z) for x in (0, 3) for y in (1, 4) for z in (2, 5)]
+
+def project_keypoints(bboxes_3d, camera_xform, camera_intrinsics):
+    # model_to_2d for the keypoints of all boxes at once, (screen x, y before int(), camera space 3d) of shapes (boxes, 9, 2) and (boxes, 9, 3)
+    # every keypoint stays a row vector of its own, so the products are computed exactly as model_to_2d computes them
+    bounds = np.array([[bbox_3d[key] for key in ("x_min", "y_min", "z_min", "x_max", "y_max", "z_max")] for bbox_3d in bboxes_3d], dtype=np.float64)
+    centers = (bounds[:, :3] + bounds[:, 3:]) / 2
+    model_pts = np.stack([centers] + [bounds[:, list(corner)] for corner in KEYPOINT_CORNERS], axis=1)
+    model_space = np.concatenate([model_pts, np.ones(model_pts.shape[:2] + (1,))], axis=2)[:, :, None, :]
+    obj_xforms = np.array([bbox_3d["transform"] for bbox_3d in bboxes_3d])[:, None]
+    camera_space = model_space @ obj_xforms @ np.linalg.inv(camera_xform)
+
+    ndc_space = camera_space @ get_projection_matrix(camera_intrinsics)
+    ndc_space /= ndc_space[..., 3:]
+
+    screen_width, screen_height = camera_intrinsics["screen_width"], camera_intrinsics["screen_height"]
+    x = (1 + ndc_space[..., 0, 0]) / 2 * screen_width
+    y = (1 - ndc_space[..., 0, 1]) / 2 * screen_height
+    camera_pts = np.ascontiguousarray(camera_space[..., :3]) @ rot_z_np(90)
+    return np.stack([x, y], axis=-1), camera_pts[..., 0, :]
+
+def get_camera_quaternions(obj_xforms, camera_xform):
+    # rotations of the objects relative to the camera, (boxes, 4) xyzw
+    rotations = np.array(obj_xforms)[:, :3, :3] @ np.linalg.inv(camera_xform[:3, :3]) @ rot_z_np(90)
+    return Rotation.from_matrix(np.transpose(rotations, (0, 2, 1))).as_quat()
+
 def get_intrinsics(camera_intrinsics):
     screen_width, screen_height = camera_intrinsics["screen_width"], camera_intrinsics["screen_height"]
     pinhole_ratio = camera_intrinsics["pinhole_ratio"]
@@ -67,7 +101,7 @@ def get_intrinsics(camera_intrinsics):
     cy = screen_height / 2
     return fx, fy, cx, cy
 
-def save_to_3d_labels(camera_info, bboxes_3d, path, visible_labeled_set):
+def get_3d_labels(camera_info, bboxes_3d, visible_labeled_set):
     camera_xform = np.array(camera_info["global_transform"])
     camera_parameters = camera_info["camera_parameters"]
     camera_intrinsics = camera_ov_to_standard(camera_parameters)
@@ -77,27 +111,20 @@ def save_to_3d_labels(camera_info, bboxes_3d, path, visible_labeled_set):
     fx, fy, cx, cy = get_intrinsics(camera_intrinsics)
 
     objects_metadata = []
-    for name, bbox_3d in bboxes_3d.items():
-        if name in visible_labeled_set:
-            model_pts = [
-                ((bbox_3d["x_min"] + bbox_3d["x_max"]) / 2, (bbox_3d["y_min"] + bbox_3d["y_max"]) / 2, (bbox_3d["z_min"] + bbox_3d["z_max"]) / 2),
-                (bbox_3d["x_min"], bbox_3d["y_min"], bbox_3d["z_min"]),
-                (bbox_3d["x_min"], bbox_3d["y_min"], bbox_3d["z_max"]),
-                (bbox_3d["x_min"], bbox_3d["y_max"], bbox_3d["z_min"]),
-                (bbox_3d["x_min"], bbox_3d["y_max"], bbox_3d["z_max"]),
-                (bbox_3d["x_max"], bbox_3d["y_min"], bbox_3d["z_min"]),
-                (bbox_3d["x_max"], bbox_3d["y_min"], bbox_3d["z_max"]),
-                (bbox_3d["x_max"], bbox_3d["y_max"], bbox_3d["z_min"]),
-                (bbox_3d["x_max"], bbox_3d["y_max"], bbox_3d["z_max"]),
-            ]
-            screen_camera_pts = [model_to_2d(pt, np.array(bbox_3d["transform"]), camera_xform, camera_intrinsics) for pt in model_pts]
+    names = [name for name in bboxes_3d if name in visible_labeled_set]
+    if names:
+        screen_pts, camera_pts = project_keypoints([bboxes_3d[name] for name in names], camera_xform, camera_intrinsics)
+        quaternions = get_camera_quaternions([bboxes_3d[name]["transform"] for name in names], camera_xform)
+        screen_pts, camera_pts, quaternions = screen_pts.tolist(), camera_pts.tolist(), quaternions.tolist() # same json as the numpy floats
+        for i, name in enumerate(names):
+            bbox_3d = bboxes_3d[name]
             scale = [float(bbox_3d["x_max"] - bbox_3d["x_min"]), float(bbox_3d["y_max"] - bbox_3d["y_min"]), float(bbox_3d["z_max"] - bbox_3d["z_min"])]
             object_metadata = {
                 "name": name, # used to be resolve_mutable_name(name, True) as above
-                "keypoints_3d": [list(pt['3d']) for pt in screen_camera_pts],
-                'quaternion_xyzw': list(Rotation.from_matrix(np.transpose(np.array(bbox_3d["transform"])[:3, :3] @ np.linalg.inv(camera_xform[:3, :3]) @ rot_z(90))).as_quat()),
-                'location': list(screen_camera_pts[0]['3d']),
-                'projected_cuboid': [list(pt['2d']) for pt in screen_camera_pts],
+                "keypoints_3d": camera_pts[i],
+                'quaternion_xyzw': quaternions[i],
+                'location': list(camera_pts[i][0]),
+                'projected_cuboid': [[int(x), int(y)] for x, y in screen_pts[i]],
                 "scale": scale
             }
             objects_metadata.append(object_metadata)
@@ -114,40 +141,50 @@ def save_to_3d_labels(camera_info, bboxes_3d, path, visible_labeled_set):
         },
         "objects": objects_metadata
     }
+    return metadata
 
-    write_json(metadata, path)
-    
-    
-def save_2dlabels_coco( coco_labels, output_path, height, width, binary_obj_det=None):
+def save_to_3d_labels(camera_info, bboxes_3d, path, visible_labeled_set):
+    write_json(get_3d_labels(camera_info, bboxes_3d, visible_labeled_set), path)
+
+def encode_3d_labels(camera_info, bboxes_3d, visible_labeled_set):
+    # bytes of the file save_to_3d_labels writes
+    return json.dumps(get_3d_labels(camera_info, bboxes_3d, visible_labeled_set), sort_keys=True, indent=4).encode()
     
-    from datetime import datetime
-    images = []
-    annotations = []
-    categories_dict = {}
-    images_count = 1
-    annotations_count = 1
-    categories_count = 1
     
-    for k, v in coco_labels.items():
-        
-        annotation_for_this_image = 0    
-        for cn, details in v.items():
-            if "~~~" in cn:
-                sp = cn.split("~~~")
-                if len(sp) == 2:
-                    class_name = sp[1]
-                else:
-                    class_name = cn
-            else:
-                class_name = cn
-                
-            if class_name in categories_dict:
-                cid = categories_dict[class_name]
+# coco labels of a run, images and annotations are spilled to part files as they come and put together once at close
+# memory is the categories only, annotations.json is written like write_json(..., no_sort=True) would
+class CocoWriter:
+    def __init__(self, output_path, height, width, binary_obj_det=None, checkpoint_images=0):
+        self.path = os.path.join(output_path, 'annotations.json')
+        self.height = height
+        self.width = width
+        self.binary_obj_det = binary_obj_det is not None and binary_obj_det
+        self.checkpoint_images = checkpoint_images # write a valid annotations.json every that many images, 0 only at close
+        self.categories_dict = {}
+        self.images_count = 1
+        self.annotations_count = 1
+        self.frames_count = 0
+        self.parts = {'annotations': open(f'{self.path}.annotations.part', 'w'), 'images': open(f'{self.path}.images.part', 'w')}
+
+    def get_class_name(self, cn):
+        if "~~~" in cn:
+            sp = cn.split("~~~")
+            if len(sp) == 2:
+                return sp[1]
+        return cn
+
+    def add(self, name, bboxes_2d):
+        # name of the image without .jpg, name -> bounding box of the visible labeled mutables
+        from datetime import datetime
+        width, height = self.width, self.height
+        annotation_for_this_image = 0
+        for cn, details in bboxes_2d.items():
+            class_name = self.get_class_name(cn)
+            if class_name in self.categories_dict:
+                cid = self.categories_dict[class_name]
             else:
-                categories_dict[class_name] = categories_count
-                cid = categories_count
-                categories_count+=1
-             
+                cid = self.categories_dict[class_name] = len(self.categories_dict) + 1
+
             bbox_x = details['x_min']
             bbox_y = details['y_min']
             if bbox_x < 0:
@@ -161,25 +198,57 @@ def save_2dlabels_coco( coco_labels, output_path, height, width, binary_obj_det=
             bbox_w = details['x_max'] - bbox_x
             bbox_h = details['y_max'] - bbox_y
             if bbox_w > 0 and bbox_w < width and bbox_h > 0 and bbox_h < height:
-                if binary_obj_det is not None and binary_obj_det:
-                    annotations.append({'id':annotations_count, 'category_id':1, 'image_id':images_count, 'iscrowd':0, 'area':(bbox_w * bbox_h), 'bbox':[bbox_x, bbox_y, bbox_w, bbox_h]})
-                else:
-                    annotations.append({'id':annotations_count, 'category_id':cid, 'image_id':images_count, 'iscrowd':0, 'area':(bbox_w * bbox_h), 'bbox':[bbox_x, bbox_y, bbox_w, bbox_h]})
-                annotations_count+=1
-                annotation_for_this_image+=1
-                
+                annotation = {'id':self.annotations_count, 'category_id':1 if self.binary_obj_det else cid, 'image_id':self.images_count, 'iscrowd':0, 'area':(bbox_w * bbox_h), 'bbox':[bbox_x, bbox_y, bbox_w, bbox_h]}
+                self.parts['annotations'].write(json.dumps(annotation) + '\n')
+                self.annotations_count += 1
+                annotation_for_this_image += 1
+
+        self.frames_count += 1
         if annotation_for_this_image > 0:
-            images.append({'id':images_count, 'date_captured':str(datetime.utcnow()), 'width':width, 'height':height, 'file_name':f'{k}.jpg'})
-            images_count+=1
-        
-        categories=[]
-        if binary_obj_det is not None and binary_obj_det:
-            categories.append({'id':1, 'name':'retail_object'})
-        else:
-            for k, v in categories_dict.items():
-                categories.append({'id':v, 'name':k})
-            
-        data = {'categories':categories, 'annotations':annotations, 'images':images}
-        
-        write_json(data, os.path.join(output_path, 'annotations.json'), no_sort=True)
+            image = {'id':self.images_count, 'date_captured':str(datetime.utcnow()), 'width':width, 'height':height, 'file_name':f'{name}.jpg'}
+            self.parts['images'].write(json.dumps(image) + '\n')
+            self.images_count += 1
+            if self.checkpoint_images > 0 and (self.images_count - 1) % self.checkpoint_images == 0:
+                self.write()
+
+    def get_categories(self):
+        if self.binary_obj_det:
+            return [{'id':1, 'name':'retail_object'}]
+        return [{'id':v, 'name':k} for k, v in self.categories_dict.items()]
+
+    def write(self):
+        # streams the part files into annotations.json, replaced at once so that it is always complete
+        temp_path = f'{self.path}.{os.getpid()}'
+        with open(temp_path, 'w') as outfile:
+            outfile.write(f'{{"categories": {json.dumps(self.get_categories())}')
+            for key in ('annotations', 'images'):
+                self.parts[key].flush()
+                outfile.write(f', "{key}": [')
+                with open(self.parts[key].name) as part:
+                    for i, line in enumerate(part):
+                        if i > 0:
+                            outfile.write(', ')
+                        outfile.write(line[:-1])
+                outfile.write(']')
+            outfile.write('}')
+        os.replace(temp_path, self.path)
+
+    def close(self):
+        # annotations.json is only written when frames were added
+        if self.parts is None:
+            return
+        try:
+            if self.frames_count > 0:
+                self.write()
+        finally:
+            for part in self.parts.values():
+                part.close()
+                os.remove(part.name)
+            self.parts = None
+
+def save_2dlabels_coco(coco_labels, output_path, height, width, binary_obj_det=None):
+    coco_writer = CocoWriter(output_path, height, width, binary_obj_det)
+    for name, bboxes_2d in coco_labels.items():
+        coco_writer.add(name, bboxes_2d)
+    coco_writer.close()
     
\ No newline at end of file
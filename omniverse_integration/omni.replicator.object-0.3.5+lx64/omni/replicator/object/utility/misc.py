@@ -1,4 +1,8 @@
-import logging, os, sys, contextlib, yaml, json, re, traceback, copy, carb
+import logging, os, sys, contextlib, yaml, json, re, traceback, copy, collections.abc
+try:
+    import carb
+except ImportError: # offline description resolution runs without Kit
+    carb = None
 
 # exception utilities
 
@@ -199,9 +203,17 @@ def write_json(data, path, no_sort=None):
 
 # util
 
+# copy the containers of a config and share its leaves, which are never modified in place, mappings become plain dicts
+def copy_tree(value):
+    if isinstance(value, collections.abc.Mapping):
+        return {key: copy_tree(value[key]) for key in value}
+    elif isinstance(value, list):
+        return [copy_tree(item) for item in value]
+    return value
+
 def disentangle(d):
     for key, value in d.items():
-        d[key] = copy.deepcopy(value)
+        d[key] = copy_tree(value)
 
 def to_array(mat):
     return [[i for i in row] for row in mat]
@@ -215,7 +227,8 @@ def get_path_with_token(path):
 def get_tmp_dir():
     return get_path_with_token("${temp}")
 
-default_log = f'{get_path_with_token("${cache}")}/omni.replicator.object_debug_log.txt'
+if carb is not None:
+    default_log = f'{get_path_with_token("${cache}")}/omni.replicator.object_debug_log.txt'
 default_log = '/tmp/omni.replicator.object_debug_log.txt'
 
 def CLEAR(path=default_log):
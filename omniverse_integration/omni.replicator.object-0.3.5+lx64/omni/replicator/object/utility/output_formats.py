@@ -0,0 +1,218 @@
+from .misc import *
+import io, zlib, struct
+import numpy as np
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# compact encodings of the depth and normal outputs, "<encoding>", "<encoding>+<compression>" or "<compression>"
+# e.g. depth_format: png16, normal_format: octahedral+zstd, read back with read_depth / read_normal
+#
+# encoding    output           file        bound of the error per value
+# npy         depth, normal    .npy        lossless float32, default
+# float16     depth, normal    .npy        relative 2^-11 (4.9e-4), magnitudes above 65504 clipped to 65504
+# png16       depth            .png        scale / 2 + float32 rounding, scale = max depth / 65535 per image unless depth_scale is set,
+#                                          stored in the png, depths above 65535 * scale clipped
+# octahedral  normal           .npy        direction within 0.004 degrees, two uint16 per pixel, zero normals kept,
+#                                          normals come back unit length with 3 channels
+#
+# compression zlib / zstd stores the encoded array losslessly in row chunks (.npc), bytes of each value shuffled
+# so that exponents and high bytes compress together, zstd needs the zstandard package
+
+DEPTH_ENCODINGS = ('npy', 'float16', 'png16')
+NORMAL_ENCODINGS = ('npy', 'float16', 'octahedral')
+COMPRESSIONS = ('zlib', 'zstd')
+CHUNK_MAGIC = b'ORONPC1\0'
+CHUNK_ROWS = 64
+FLOAT16_MAX = 65504
+OCTAHEDRAL_LEVELS = 65534 # codes 1..65535, 0 marks a zero normal
+
+def parse_output_format(output_format, encodings):
+    if output_format in COMPRESSIONS:
+        output_format = f'npy+{output_format}'
+    encoding, _, compression = output_format.partition('+')
+    if encoding not in encodings:
+        error(f'unrecognized encoding "{encoding}" in "{output_format}", expected one of {encodings}')
+    if compression:
+        if compression not in COMPRESSIONS:
+            error(f'unrecognized compression "{compression}" in "{output_format}", expected one of {COMPRESSIONS}')
+        if encoding == 'png16':
+            error('png16 is compressed by png already')
+        if compression == 'zstd' and zstandard is None:
+            error('zstd compression needs the zstandard package')
+    return encoding, compression or None
+
+def get_output_formats(metadata):
+    # validated once when the output folders are created
+    depth_format = tentative_retrieve('depth_format', metadata, str, 'npy')
+    normal_format = tentative_retrieve('normal_format', metadata, str, 'npy')
+    parse_output_format(depth_format, DEPTH_ENCODINGS)
+    parse_output_format(normal_format, NORMAL_ENCODINGS)
+    return {
+        'depth': depth_format,
+        'normal': normal_format,
+        'depth_scale': tentative_retrieve('depth_scale', metadata, (int, float)),
+    }
+
+# encodings
+
+def encode_float16(values):
+    return np.clip(values, -FLOAT16_MAX, FLOAT16_MAX).astype(np.float16)
+
+def encode_octahedral(normals):
+    # (..., 3 or 4) -> (..., 2) uint16
+    n = np.asarray(normals, dtype=np.float32)[..., :3]
+    l1 = np.abs(n).sum(axis=-1, keepdims=True)
+    zero = ~(l1[..., 0] > 0)
+    p = n[..., :2] / np.where(l1 > 0, l1, 1)
+    folded = (1 - np.abs(p[..., ::-1])) * np.where(p >= 0, np.float32(1), np.float32(-1)) # lower hemisphere
+    p = np.clip(np.where(n[..., 2:3] < 0, folded, p), -1, 1)
+    codes = (np.rint((p + 1) * np.float32(OCTAHEDRAL_LEVELS / 2)) + 1).astype(np.uint16)
+    codes[zero] = 0
+    return codes
+
+def decode_octahedral(codes):
+    codes = np.asarray(codes)
+    zero = (codes == 0).all(axis=-1)
+    p = codes.astype(np.float32) * np.float32(2 / OCTAHEDRAL_LEVELS) - np.float32(1 + 2 / OCTAHEDRAL_LEVELS)
+    z = 1 - np.abs(p).sum(axis=-1, keepdims=True)
+    t = np.maximum(-z, 0)
+    n = np.concatenate([p - np.copysign(t, p), z], axis=-1)
+    n /= np.linalg.norm(n, axis=-1, keepdims=True)
+    n[zero] = 0
+    return n
+
+def save_png16(depth, file, depth_scale=None):
+    from PIL import Image, PngImagePlugin
+    depth = np.asarray(depth, dtype=np.float64)
+    if depth_scale is None:
+        max_depth = float(depth.max()) if depth.size > 0 else 0.0
+        depth_scale = max_depth / 65535 if max_depth > 0 else 1.0
+    codes = np.rint(np.clip(depth / depth_scale, 0, 65535)).astype(np.uint16)
+    info = PngImagePlugin.PngInfo()
+    info.add_text('depth_scale', repr(float(depth_scale)))
+    Image.fromarray(codes).save(file, format='PNG', pnginfo=info, compress_level=1) # 3x faster than the default, a few % larger
+
+def read_png16(file):
+    from PIL import Image
+    with Image.open(file) as image:
+        depth_scale = float(image.text['depth_scale'])
+        codes = np.array(image)
+    return (codes.astype(np.float64) * depth_scale).astype(np.float32)
+
+# chunked compression
+
+def shuffle_bytes(rows):
+    # values of a chunk with their bytes regrouped by significance
+    return np.ascontiguousarray(rows).view(np.uint8).reshape(-1, rows.dtype.itemsize).T.tobytes()
+
+def unshuffle_bytes(data, dtype, shape):
+    dtype = np.dtype(dtype)
+    return np.frombuffer(data, dtype=np.uint8).reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+
+def compress(data, compression):
+    if compression == 'zlib':
+        return zlib.compress(data, 6)
+    return zstandard.ZstdCompressor(level=3).compress(data)
+
+def decompress(data, compression):
+    if compression == 'zlib':
+        return zlib.decompress(data)
+    if zstandard is None:
+        error('reading zstd compressed outputs needs the zstandard package')
+    return zstandard.ZstdDecompressor().decompress(data)
+
+def save_chunked(array, file, compression, encoding):
+    array = np.ascontiguousarray(array)
+    chunks = [compress(shuffle_bytes(array[start:start + CHUNK_ROWS]), compression) for start in range(0, len(array), CHUNK_ROWS)]
+    header = json.dumps({
+        'encoding': encoding,
+        'compression': compression,
+        'dtype': array.dtype.str,
+        'shape': list(array.shape),
+        'chunk_rows': CHUNK_ROWS,
+        'chunk_sizes': [len(chunk) for chunk in chunks],
+    }).encode()
+    file.write(CHUNK_MAGIC)
+    file.write(struct.pack('<I', len(header)))
+    file.write(header)
+    for chunk in chunks:
+        file.write(chunk)
+
+def read_chunked(file, name):
+    # (encoding, array)
+    if file.read(len(CHUNK_MAGIC)) != CHUNK_MAGIC:
+        error(f'{name} is not a chunked output')
+    header = json.loads(file.read(struct.unpack('<I', file.read(4))[0]))
+    shape, chunk_rows = header['shape'], header['chunk_rows']
+    array = np.empty(shape, dtype=header['dtype'])
+    for start, size in zip(range(0, shape[0], chunk_rows), header['chunk_sizes']):
+        rows = array[start:start + chunk_rows]
+        rows[...] = unshuffle_bytes(decompress(file.read(size), header['compression']), header['dtype'], rows.shape)
+    return header['encoding'], array
+
+# outputs
+
+def get_encoded_suffix(output_format, encodings):
+    # the suffix tells how to read an output back
+    encoding, compression = parse_output_format(output_format, encodings)
+    if encoding == 'png16':
+        return '.png'
+    if compression is not None:
+        return '.npc'
+    return '.npy' if encoding in ('npy', 'float16') else f'.{encoding}.npy'
+
+def write_encoded(values, file, output_format, encodings, depth_scale=None):
+    encoding, compression = parse_output_format(output_format, encodings)
+    if encoding == 'png16':
+        save_png16(values, file, depth_scale)
+        return
+    if encoding == 'float16':
+        values = encode_float16(values)
+    elif encoding == 'octahedral':
+        values = encode_octahedral(values)
+    if compression is not None:
+        save_chunked(values, file, compression, encoding)
+    else:
+        np.save(file, values)
+
+def save_encoded(values, path_without_suffix, output_format, encodings, depth_scale=None):
+    # returns the path written
+    path = f'{path_without_suffix}{get_encoded_suffix(output_format, encodings)}'
+    with open(path, 'wb') as f:
+        write_encoded(values, f, output_format, encodings, depth_scale)
+    return path
+
+def save_depth(depth, path_without_suffix, output_format='npy', depth_scale=None):
+    return save_encoded(depth, path_without_suffix, output_format, DEPTH_ENCODINGS, depth_scale)
+
+def save_normal(normal, path_without_suffix, output_format='npy'):
+    return save_encoded(normal, path_without_suffix, output_format, NORMAL_ENCODINGS)
+
+def encode_depth(depth, output_format='npy', depth_scale=None):
+    # bytes of the file save_depth writes
+    f = io.BytesIO()
+    write_encoded(depth, f, output_format, DEPTH_ENCODINGS, depth_scale)
+    return f.getvalue()
+
+def encode_normal(normal, output_format='npy'):
+    f = io.BytesIO()
+    write_encoded(normal, f, output_format, NORMAL_ENCODINGS)
+    return f.getvalue()
+
+def read_encoded(path, data=None):
+    # float32 values of any depth or normal output, data is the content of path when it is not a file, e.g. a shard member
+    with (open(path, 'rb') if data is None else io.BytesIO(data)) as f:
+        if path.endswith('.png'):
+            return read_png16(f)
+        if path.endswith('.npc'):
+            encoding, values = read_chunked(f, path)
+        else:
+            encoding, values = 'octahedral' if path.endswith('.octahedral.npy') else 'npy', np.load(f)
+    if encoding == 'octahedral':
+        return decode_octahedral(values)
+    return values.astype(np.float32)
+
+read_depth = read_encoded
+read_normal = read_encoded
@@ -1,4 +1,5 @@
 import ast
+import functools
 import math
 import sys
 if not hasattr(sys, '_UNIT_TEST'):
@@ -47,6 +48,8 @@ allowed_math_attrs = get_math_attrs()
 allowed_builtin_names = get_builtin_names()
 disallowed_consts = {}
 
+EXPRESSION_CACHE_SIZE = 4096
+
 def _is_mapping_item(obj):
     return isinstance(obj, tuple) and len(obj) == 2 and isinstance(obj[0], str)
 
@@ -71,6 +74,58 @@ def _flatten(nested_iterable):
             yield from _flatten(elem)
     # discard item
 
+class CompiledExpression:
+    def __init__(self, code, names, error, string_value):
+        self.code = code
+        self.names = names # non-builtin names, checked against the allowed names on every call
+        self.error = error # first disallowed construct, or the parse error
+        self.string_value = string_value # what eval_expression falls back to when it is not an expression
+
+def walk(node, names):
+    if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.BoolOp)):
+        if type(node.op) in disallowed_arith_ops:
+            error(f"Disallowed operation : {type(node.op).__name__}")
+    elif isinstance(node, ast.Attribute):
+        # only allow math.*
+        is_math_module = isinstance(node.value, ast.Name) and node.value.id == 'math'
+        if not is_math_module or node.attr not in allowed_math_attrs:
+            error(f"Disallowed attribute : {node.value.id}.{node.attr}")
+        return
+    elif isinstance(node, ast.Name):
+        if node.id not in allowed_builtin_names:
+            names.append(node.id)
+    elif isinstance(node, (ast.Constant)):
+        if node.value in disallowed_consts:
+            error(f"Disallowed constant: {node.value}")
+        return
+    elif isinstance(node, other_allowed_ops):
+        pass
+    else:
+        error(f"Disallowed expression: {type(node).__name__}")
+
+    for subnode in ast.iter_child_nodes(node):
+        walk(subnode, names)
+
+@functools.lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expr : str):
+    """
+    Parse, validate and compile an expression once, see compile_expression.cache_info() for hits and misses
+    """
+    names = []
+    try:
+        node = ast.parse(expr, mode = 'eval')
+        walk(node, names)
+        code = compile(source=node, filename="<string>", mode="eval")
+    except Exception as err:
+        err_text = str(err)
+        string_value = None
+        if names:
+            string_value = names[0]
+        elif err_text.find('invalid syntax') != -1:
+            string_value = expr
+        return CompiledExpression(None, tuple(names), err_text, string_value)
+    return CompiledExpression(code, tuple(names), None, names[0] if names else None)
+
 def safe_eval(expr : str, _allowed_names : Iterable = []):
     """
     Eval a python expression with restrictions
@@ -85,32 +140,12 @@ def safe_eval(expr : str, _allowed_names : Iterable = []):
         if callable(val):
             error(f"Disallowed variable: {name} of type {type(val).__name__}")
 
-    node = ast.parse(expr, mode = 'eval')
-    def walk(node):
-        if isinstance(node, (ast.BinOp, ast.UnaryOp, ast.BoolOp)):
-            if type(node.op) in disallowed_arith_ops:
-                error(f"Disallowed operation : {type(node.op).__name__}")
-        elif isinstance(node, ast.Attribute):
-            # only allow math.*
-            is_math_module = isinstance(node.value, ast.Name) and node.value.id == 'math'
-            if not is_math_module or node.attr not in allowed_math_attrs:
-                error(f"Disallowed attribute : {node.value.id}.{node.attr}")
-            return
-        elif isinstance(node, ast.Name):
-            if node.id not in allowed_names and node.id not in allowed_builtin_names:
-                error(f"Disallowed name : {node.id}")
-        elif isinstance(node, (ast.Constant)):
-            if node.value in disallowed_consts:
-                error(f"Disallowed constant: {node.value}")
-            return
-        elif isinstance(node, other_allowed_ops):
-            pass
-        else:
-            error(f"Disallowed expression: {type(node).__name__}")
-
-        for subnode in ast.iter_child_nodes(node):
-            walk(subnode)
-    walk(node)
-    return eval(compile(source=node, filename="<string>", mode="eval"),
+    compiled = compile_expression(expr)
+    for name in compiled.names:
+        if name not in allowed_names:
+            error(f"Disallowed name : {name}")
+    if compiled.error is not None:
+        error(compiled.error)
+    return eval(compiled.code,
                 None,
                 allowed_names)
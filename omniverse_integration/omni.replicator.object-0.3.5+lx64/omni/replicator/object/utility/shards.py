@@ -0,0 +1,115 @@
+from .writer import *
+import tarfile, time
+
+# output_mode shards packs the outputs of a frame into append-only tar shards instead of a file per output,
+# <output_path>/shards/shard-000000.tar, ... with <output_path>/shards/index.jsonl for random access
+#
+# the outputs of a key (the output name of a camera, or of the frame for its description) are one sample,
+# consecutive members <key>.<folder><suffix>, e.g. 0_camera.images.jpg, 0_camera.depth.npy, 0.descriptions.yaml,
+# so that the shards can be streamed like WebDataset shards
+# a shard is closed once it holds shard_size_mb, samples are never split, later runs start a new shard
+# each line of the index is {"key": ..., "shard": ..., "members": {name: [offset of the data, size]}}, written once the
+# sample is in the shard; a key can have several lines, e.g. a camera and the description when output_name gives them
+# the same name, the reader merges their members, the last line of a member wins
+
+OUTPUT_MODES = ('folders', 'shards')
+SHARD_SIZE_MB = 1024
+SHARD_FOLDER = 'shards'
+SHARD_INDEX = 'index.jsonl'
+
+def get_shard_name(shard_index):
+    return f'shard-{shard_index:06d}.tar'
+
+def get_member_name(key, output):
+    return f'{key}.{output.folder}{output.suffix}'
+
+class ShardSink:
+    def __init__(self, output_path, shard_size_mb=SHARD_SIZE_MB):
+        if shard_size_mb <= 0:
+            error(f'invalid shard size: {shard_size_mb} MB')
+        self.folder = f'{output_path}/{SHARD_FOLDER}'
+        ensure_folder_recursive(self.folder)
+        self.shard_size = int(shard_size_mb * 2**20)
+        existing = [int(name[len('shard-'):-len('.tar')]) for name in os.listdir(self.folder) if re.fullmatch(r'shard-\d+\.tar', name)]
+        self.shard_index = max(existing, default=-1) + 1
+        self.shard = None
+        self.index = open(f'{self.folder}/{SHARD_INDEX}', 'a')
+        self.lock = threading.Lock()
+
+    def submit(self, writer, key, outputs):
+        # one writer job per sample, its members are appended together
+        if outputs:
+            writer.submit(self.write, key, outputs)
+
+    def write(self, key, outputs):
+        data = [output.get_bytes() for output in outputs] # encoded in parallel, appended one sample at a time
+        with self.lock:
+            if self.shard is not None and self.shard.offset >= self.shard_size:
+                self.close_shard()
+            if self.shard is None:
+                self.shard = tarfile.open(f'{self.folder}/{get_shard_name(self.shard_index)}', 'w', format=tarfile.GNU_FORMAT)
+            shard_name = get_shard_name(self.shard_index)
+            members = {}
+            for output, content in zip(outputs, data):
+                info = tarfile.TarInfo(get_member_name(key, output))
+                info.size = len(content)
+                info.mtime = int(time.time())
+                info.mode = 0o644
+                self.shard.addfile(info, io.BytesIO(content))
+                padded_size = (len(content) + tarfile.BLOCKSIZE - 1) // tarfile.BLOCKSIZE * tarfile.BLOCKSIZE
+                members[info.name] = [self.shard.offset - padded_size, len(content)] # the data ends the member
+            self.shard.fileobj.flush() # the index never points past what is written
+            self.index.write(json.dumps({'key': key, 'shard': shard_name, 'members': members}) + '\n')
+            self.index.flush()
+        for output in outputs:
+            output.log(f'{self.folder}/{shard_name}:{get_member_name(key, output)}')
+
+    def close_shard(self):
+        self.shard.close()
+        self.shard = None
+        self.shard_index += 1
+
+    def close(self):
+        with self.lock:
+            if self.shard is not None:
+                self.close_shard()
+            self.index.close()
+
+class ShardReader:
+    # random access to the members of the shards in <output_path>/shards
+    def __init__(self, output_path):
+        self.folder = f'{output_path}/{SHARD_FOLDER}'
+        self.samples = {} # key -> {name: (shard, offset, size)}
+        with open(f'{self.folder}/{SHARD_INDEX}') as index:
+            for line in index:
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    continue # cut off by an interrupted run
+                members = self.samples.setdefault(sample['key'], {})
+                for name, (offset, size) in sample['members'].items():
+                    members[name] = (sample['shard'], offset, size)
+
+    def keys(self):
+        return list(self.samples)
+
+    def members(self, key):
+        return list(self.samples[key])
+
+    def read(self, key, name):
+        # bytes of a member, name as given by members(key), e.g. read_depth(name, reader.read(key, name))
+        members = self.samples[key]
+        if name not in members:
+            error(f'no member "{name}" in sample "{key}"')
+        shard, offset, size = members[name]
+        with open(f'{self.folder}/{shard}', 'rb') as f:
+            f.seek(offset)
+            return f.read(size)
+
+def create_output_sink(metadata, output_path):
+    output_mode = tentative_retrieve('output_mode', metadata, str, 'folders')
+    if output_mode not in OUTPUT_MODES:
+        error(f'unrecognized output mode: {output_mode}, expected one of {OUTPUT_MODES}')
+    if output_mode == 'shards':
+        return ShardSink(output_path, tentative_retrieve('shard_size_mb', metadata, (int, float), SHARD_SIZE_MB))
+    return FolderSink(output_path)
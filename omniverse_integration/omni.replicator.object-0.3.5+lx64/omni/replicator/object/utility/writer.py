@@ -0,0 +1,129 @@
+from .misc import *
+import concurrent.futures, threading, collections, io
+
+# frame outputs are encoded and written on worker threads, so that serialization overlaps with rendering the next frames
+# PIL encoding, numpy and file I/O release the GIL, worker processes would have to pickle every captured image
+
+OUTPUT_WRITER_THREADS = 4
+OUTPUT_WRITER_MAX_PENDING = 32 # writes queued before capture waits, bounds the memory held by captured images
+
+class OutputWriter:
+    # threads = 0 writes synchronously
+    def __init__(self, threads=OUTPUT_WRITER_THREADS, max_pending=OUTPUT_WRITER_MAX_PENDING):
+        if threads < 0 or max_pending < 1:
+            error(f'invalid output writer settings, threads: {threads}, max pending writes: {max_pending}')
+        self.executor = concurrent.futures.ThreadPoolExecutor(threads, thread_name_prefix='omni.replicator.object.writer') if threads > 0 else None
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.pending = collections.deque()
+
+    def submit(self, function, *args):
+        # blocks while max_pending writes are queued, and raises the error of a failed write to the frame loop
+        self.raise_errors()
+        if self.executor is None:
+            function(*args)
+            return
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(function, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        self.pending.append(future)
+
+    def raise_errors(self):
+        done = [future for future in self.pending if future.done()]
+        if not done:
+            return
+        self.pending = collections.deque(future for future in self.pending if not future.done())
+        for future in done:
+            future.result()
+
+    def flush(self):
+        # barrier, every write submitted so far is on disk once this returns
+        pending, self.pending = self.pending, collections.deque()
+        exceptions = [future.exception() for future in pending]
+        for exception in exceptions:
+            if exception is not None:
+                raise exception
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+
+def create_output_writer(metadata):
+    threads = tentative_retrieve('output_writer_threads', metadata, int, OUTPUT_WRITER_THREADS)
+    max_pending = tentative_retrieve('output_writer_max_pending', metadata, int, OUTPUT_WRITER_MAX_PENDING)
+    return OutputWriter(threads, max_pending)
+
+# writes
+
+def save_image(image, path, message=None):
+    image.save(path)
+    if message is not None:
+        logging.info(message)
+        print(message)
+
+def save_text(text, path):
+    with open(path, 'w') as f:
+        f.write(text)
+
+def save_segmentation(segmentation, path):
+    # (image, labels) of a segmentation, to path.png and path.yaml
+    segmentation[0].save(f'{path}.png')
+    write_yaml(segmentation[1], f'{path}.yaml')
+
+# encodings of the frame outputs to the bytes of their files
+
+def encode_image(image, format):
+    f = io.BytesIO()
+    image.save(f, format=format)
+    return f.getvalue()
+
+def encode_text(text):
+    return text.encode()
+
+def encode_yaml(data):
+    return yaml.dump(data).encode()
+
+class Output:
+    # a file of a frame, <folder>/<key><suffix>, with its bytes encoded on a writer thread
+    # message is logged once it is written, "{location}" in it is replaced by where it went
+    def __init__(self, folder, suffix, encode, *args, message=None):
+        self.folder = folder
+        self.suffix = suffix
+        self.encode = encode
+        self.args = args
+        self.message = message
+
+    def get_bytes(self):
+        return self.encode(*self.args)
+
+    def log(self, location):
+        if self.message is not None:
+            message = self.message.replace('{location}', location)
+            logging.info(message)
+            print(message)
+
+class FolderSink:
+    # output_mode folders, one file per output in a folder per output switch, each written by its own writer job
+    def __init__(self, output_path):
+        self.output_path = output_path
+
+    def submit(self, writer, key, outputs):
+        for output in outputs:
+            writer.submit(self.write, key, output)
+
+    def write(self, key, output):
+        path = f'{self.output_path}/{output.folder}/{key}{output.suffix}'
+        data = output.get_bytes()
+        with open(path, 'wb') as f:
+            f.write(data)
+        output.log(path)
+
+    def close(self):
+        pass
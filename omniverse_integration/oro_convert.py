@@ -1,3 +1,4 @@
+import argparse
 import yaml
 import numpy as np
 import os
@@ -11,7 +12,10 @@ from mathutils import Vector
 import sys
 CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(CURRENT_DIR)
-from camera_utils import get_valid_camera_poses
+from camera_utils import sample_valid_camera_locations, look_at_poses
+from obstacle_bvh import ObstacleBVH
+from room_placement import RoomPlacement, PLACEMENT_CELL_SIZE
+from pose_selection import select_camera_poses, SELECTIONS
 
 # sys.path.append(os.path.join(CURRENT_DIR, '..', 'asset_indexing'))
 # from asset_to_usd import need_to_bake
@@ -41,9 +45,20 @@ def write_yaml(data, yaml_path):
 
 
 if __name__ == "__main__":
-    import sys
-    INPUT_DIR = sys.argv[1]
-    OUTPUT_DIR = sys.argv[2]
+    parser = argparse.ArgumentParser()
+    parser.add_argument('input_dir')
+    parser.add_argument('output_dir')
+    # hemisphere: around (0, 0, 1), rooms: inside the floors, away from the walls, looking at the middle of each room
+    parser.add_argument('--placement', choices=('hemisphere', 'rooms'), default='hemisphere')
+    parser.add_argument('--clearance', type=float, default=0.5, help='meters between rooms cameras and walls')
+    parser.add_argument('--cell-size', type=float, default=PLACEMENT_CELL_SIZE, help='meters, of the rooms occupancy grid')
+    # first: the first valid poses, farthest/coverage: N of oversample times as many valid poses, see pose_selection.py
+    parser.add_argument('--selection', choices=SELECTIONS, default='first')
+    parser.add_argument('--oversample', type=int, default=8)
+    # under blender, e.g. blender -b scene_topdown.blend --python oro_convert.py -- INPUT_DIR OUTPUT_DIR
+    args = parser.parse_args(sys.argv[sys.argv.index('--') + 1:] if '--' in sys.argv else None)
+    INPUT_DIR = args.input_dir
+    OUTPUT_DIR = args.output_dir
 
     print(INPUT_DIR, OUTPUT_DIR)
     data = read_json(os.path.join(INPUT_DIR, 'scene.json'))
@@ -59,9 +74,14 @@ if __name__ == "__main__":
 
     has_light = False
     obstacles = []
+    floors, walls = [], []
     for name, object in data['objects'].items():
         if object["category"] == "walls" or object["category"] == "floors" or object["category"] == "ceilings":
-            obstacles.append([mathutils.Vector(point) for point in object["metadata"]["polygon"]])
+            obstacles.append(object["metadata"]["polygon"])
+        if object["category"] == "floors":
+            floors.append(object["metadata"]["polygon"])
+        if object["category"] == "walls":
+            walls.append(object["metadata"]["polygon"])
         if object["category"] == "objects":
             if "is_ceiling_light" in object["metadata"].keys():
                 for placement in object["placements"]:
@@ -153,7 +173,16 @@ if __name__ == "__main__":
     radius = 2.5 # Radius of the hemisphere
     target_location = mathutils.Vector((0, 0, 1))  # Center of the sphere
     # Get valid camera poses
-    valid_poses = get_valid_camera_poses(N, radius, target_location, obstacles)
+    obstacles = ObstacleBVH(obstacles)
+    candidate_count = N if args.selection == 'first' else N * args.oversample
+    if args.placement == 'rooms':
+        placement = RoomPlacement(floors, walls, args.clearance, args.cell_size)
+        locations, targets = placement.sample_valid_camera_locations(candidate_count, obstacles=obstacles)
+    else:
+        locations = sample_valid_camera_locations(candidate_count, radius, target_location, obstacles)
+        targets = np.broadcast_to(np.array(tuple(target_location)), locations.shape)
+    picked = select_camera_poses(locations, targets, N, args.selection, floors, obstacles)
+    valid_locations, valid_rotations = look_at_poses(locations[picked], targets[picked])
     #
     output['default_camera'] = {
         'camera_parameters': '$[/camera_parameters]',
@@ -181,16 +210,16 @@ if __name__ == "__main__":
     for i in range(N):
         output["default_camera"]["transform_operators"][1]["translate"]["values"].append(
                 [
-                    valid_poses[i][0].x,
-                    valid_poses[i][0].y,
-                    valid_poses[i][0].z
+                    float(valid_locations[i][0]),
+                    float(valid_locations[i][1]),
+                    float(valid_locations[i][2])
                 ]
         )
         output["default_camera"]["transform_operators"][2]["rotateXYZ"]["values"].append(
             [
-                float(valid_poses[i][1].x),
-                float(valid_poses[i][1].y),
-                float(valid_poses[i][1].z)
+                float(valid_rotations[i][0]),
+                float(valid_rotations[i][1]),
+                float(valid_rotations[i][2])
             ]
         )
         
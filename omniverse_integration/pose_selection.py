@@ -0,0 +1,129 @@
+import argparse
+import json
+import math
+import random
+import numpy as np
+
+import os
+import sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+from camera_utils import normalize_rows, sample_valid_camera_locations
+from obstacle_bvh import ObstacleBVH
+from room_placement import rasterize_polygon
+
+# picking count of many valid camera poses so that frames differ, instead of the first count passing the wall test
+# farthest: farthest point sampling in pose space, the location and the view direction scaled by direction_weight
+#           meters, each pick is the candidate farthest from the picked ones
+# coverage: greedy maximum coverage of points on the floors, seen by a candidate when in its field of view and not
+#           blocked by the obstacles, each pick is the candidate seeing most points not seen yet, then farthest point
+#           sampling once every point is seen
+# candidates are z-up locations and the targets they look at, a selection is indices in pick order; the first candidate
+# is picked first, so that a selection keeps the first pose the sampler would have given
+#
+# python pose_selection.py sample_scenes/a_minimal_living_room/scene.json --poses 10 --oversample 8
+
+SELECTIONS = ('first', 'farthest', 'coverage')
+FLOOR_POINT_SPACING = 0.25 # meters between the points of the coverage selection
+FLOOR_POINT_LIFT = 0.01 # so that the floor a point lies on does not block it
+# of the camera_parameters oro_convert writes
+CAMERA_HORIZONTAL_FOV = 2 * math.atan(20.955 / 2 / 14.228393962367306)
+CAMERA_ASPECT_RATIO = 3840 / 2160
+
+def get_pose_features(locations, targets, direction_weight=1.0):
+    return np.concatenate([locations, direction_weight * normalize_rows(targets - locations)], axis=1)
+
+def select_farthest(features, count, picked=()):
+    # indices of count rows, picked ones first
+    picked = list(picked) or [0]
+    distances = np.full(len(features), np.inf)
+    for index in picked:
+        distances = np.minimum(distances, np.linalg.norm(features - features[index], axis=1))
+    while len(picked) < min(count, len(features)):
+        index = int(np.argmax(distances))
+        picked.append(index)
+        distances = np.minimum(distances, np.linalg.norm(features - features[index], axis=1))
+    return picked
+
+def sample_floor_points(floors, spacing=FLOOR_POINT_SPACING, lift=FLOOR_POINT_LIFT):
+    # points on a grid over the floors polygons, lifted above them
+    points = [np.zeros((0, 3))]
+    for polygon in floors:
+        polygon = np.asarray(polygon, dtype=np.float64)
+        low, high = polygon[:, :2].min(axis=0), polygon[:, :2].max(axis=0)
+        xs = np.arange(low[0] + spacing / 2, high[0], spacing)
+        ys = np.arange(low[1] + spacing / 2, high[1], spacing)
+        rows, columns = np.nonzero(rasterize_polygon(polygon[:, :2], xs, ys))
+        points.append(np.stack([xs[columns], ys[rows], np.full(len(rows), polygon[:, 2].mean() + lift)], axis=1))
+    return np.concatenate(points)
+
+def get_visibility(locations, targets, points, obstacles=None, horizontal_fov=CAMERA_HORIZONTAL_FOV, aspect_ratio=CAMERA_ASPECT_RATIO):
+    # (candidates, points) whether each point is in the field of view of each candidate and not blocked
+    forward = normalize_rows(targets - locations)
+    right = normalize_rows(np.cross(forward, np.array([0.0, 0.0, 1.0])))
+    up = np.cross(right, forward)
+    offsets = points[None] - locations[:, None]
+    depths = (offsets * forward[:, None]).sum(axis=-1)
+    tangent = math.tan(horizontal_fov / 2)
+    visibility = (depths > 0) & (np.abs((offsets * right[:, None]).sum(axis=-1)) <= depths * tangent) \
+        & (np.abs((offsets * up[:, None]).sum(axis=-1)) <= depths * tangent / aspect_ratio)
+    if obstacles is not None:
+        candidates, indices = np.nonzero(visibility)
+        visibility[candidates, indices] = ~obstacles.blocks(locations[candidates], points[indices])
+    return visibility
+
+def select_coverage(visibility, features, count):
+    picked = [0]
+    covered = visibility[0].copy()
+    while len(picked) < min(count, len(visibility)):
+        gains = visibility[:, ~covered].sum(axis=1)
+        gains[picked] = -1
+        if gains.max() <= 0:
+            return select_farthest(features, count, picked)
+        index = int(np.argmax(gains))
+        picked.append(index)
+        covered |= visibility[index]
+    return picked
+
+def select_camera_poses(locations, targets, count, selection='farthest', floors=None, obstacles=None, direction_weight=1.0, spacing=FLOOR_POINT_SPACING):
+    # indices of count of the candidates, floors polygons are needed by the coverage selection
+    if selection == 'first':
+        return list(range(min(count, len(locations))))
+    features = get_pose_features(locations, targets, direction_weight)
+    if selection == 'farthest':
+        return select_farthest(features, count)
+    if selection == 'coverage':
+        if floors is None:
+            raise ValueError('the coverage selection needs floors polygons')
+        visibility = get_visibility(locations, targets, sample_floor_points(floors, spacing), obstacles)
+        return select_coverage(visibility, features, count)
+    raise ValueError(f'unknown camera pose selection {selection}, expecting one of {SELECTIONS}')
+
+if __name__ == "__main__":
+    # floor points seen by the poses of each selection of the same candidates of a scene.json
+    parser = argparse.ArgumentParser(description='compare camera pose selections on the hemisphere of oro_convert')
+    parser.add_argument('scene_json')
+    parser.add_argument('--poses', type=int, default=10)
+    parser.add_argument('--oversample', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    with open(args.scene_json) as infile:
+        data = json.load(infile)
+    obstacles, floors = [], []
+    for object in data['objects'].values():
+        if object['category'] in ('walls', 'floors', 'ceilings'):
+            obstacles.append(object['metadata']['polygon'])
+        if object['category'] == 'floors':
+            floors.append(object['metadata']['polygon'])
+    obstacles = ObstacleBVH(obstacles)
+    target = np.array([0.0, 0.0, 1.0])
+    locations = sample_valid_camera_locations(args.poses * args.oversample, 2.5, target, obstacles, rng=random.Random(args.seed))
+    targets = np.broadcast_to(target, locations.shape)
+    points = sample_floor_points(floors)
+    visibility = get_visibility(locations, targets, points, obstacles)
+    print(f'{"selection":<10}{"floor points seen":>19}{"mean pose distance":>20}')
+    for selection in SELECTIONS:
+        picked = select_camera_poses(locations, targets, args.poses, selection, floors, obstacles)
+        features = get_pose_features(locations[picked], targets[picked])
+        distances = np.linalg.norm(features[:, None] - features[None], axis=-1)
+        print(f'{selection:<10}{visibility[picked].any(axis=0).mean():>19.1%}{distances.sum() / max(len(picked) * (len(picked) - 1), 1):>20.3f}')
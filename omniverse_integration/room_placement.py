@@ -0,0 +1,158 @@
+import random
+import numpy as np
+try:
+    from scipy import ndimage
+except ImportError:
+    ndimage = None
+
+import os
+import sys
+CURRENT_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(CURRENT_DIR)
+from camera_utils import look_at_poses
+
+# camera placement inside the rooms of a scene.json instead of on a hemisphere around one target
+# the floors polygons and the footprints of the walls polygons are rasterized into a top down occupancy grid, free
+# cells are on a floor and off the walls, and the distance transform gives the clearance of each free cell, its
+# distance to the nearest cell not free in its room; cameras are placed on free cells with at least the clearance, at a
+# random height, looking at the target of their room, the point of its floor polygon farthest from any wall, at
+# target_height
+# a room is a floors polygon, poses go round robin over the rooms which have room for a camera
+# picking a cell is constant time, so is a pose, whatever the number of walls; obstacles, e.g. an ObstacleBVH, can
+# still reject the poses from which something blocks the view, e.g. in L shaped rooms
+
+PLACEMENT_CELL_SIZE = 0.05 # meters
+PLACEMENT_CHUNK = 2**22 # free x occupied cell pairs of the NumPy distance transform at once
+
+def rasterize_polygon(polygon, xs, ys):
+    # cells whose center is inside a polygon of the xy plane, even-odd rule, polygons need not be convex
+    inside = np.zeros((len(ys), len(xs)), dtype=bool)
+    x, y = xs[None], ys[:, None]
+    for (x0, y0), (x1, y1) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y0 == y1:
+            continue
+        straddles = (y0 > y) != (y1 > y)
+        inside ^= straddles & (x < x0 + (x1 - x0) * (y - y0) / (y1 - y0))
+    return inside
+
+def rasterize_segment(start, end, xs, ys, width):
+    # cells whose center is closer to a segment of the xy plane than width
+    x, y = xs[None], ys[:, None]
+    offset = end - start
+    squared_length = offset @ offset
+    t = 0 if squared_length == 0 else np.clip(((x - start[0]) * offset[0] + (y - start[1]) * offset[1]) / squared_length, 0, 1)
+    return np.hypot(x - start[0] - t * offset[0], y - start[1] - t * offset[1]) <= width
+
+def get_footprint(polygon):
+    # the two farthest apart vertices of a wall seen from above
+    points = np.asarray(polygon, dtype=np.float64)[:, :2]
+    distances = np.linalg.norm(points[:, None] - points[None], axis=-1)
+    i, j = np.unravel_index(np.argmax(distances), distances.shape)
+    return points[i], points[j]
+
+def distance_transform(free, cell_size):
+    # distance from the center of each free cell to the center of the nearest occupied cell, 0 on occupied ones
+    if ndimage is not None:
+        return ndimage.distance_transform_edt(free) * cell_size
+    distances = np.zeros(free.shape)
+    # the nearest occupied cell of a free cell always has a free neighbour
+    padded = np.pad(free, 1, constant_values=False)
+    border = ~free & (padded[:-2, 1:-1] | padded[2:, 1:-1] | padded[1:-1, :-2] | padded[1:-1, 2:])
+    occupied = np.argwhere(border if border.any() else ~free)
+    cells = np.argwhere(free)
+    if not len(occupied):
+        distances[free] = np.inf
+        return distances
+    chunk_size = max(1, PLACEMENT_CHUNK // len(occupied))
+    for start in range(0, len(cells), chunk_size):
+        chunk = cells[start:start + chunk_size]
+        squared = ((chunk[:, None] - occupied[None]) ** 2).sum(axis=-1).min(axis=1)
+        distances[chunk[:, 0], chunk[:, 1]] = np.sqrt(squared) * cell_size
+    return distances
+
+class RoomPlacement:
+    def __init__(self, floors, walls, clearance=0.5, cell_size=PLACEMENT_CELL_SIZE, target_height=1.0, heights=(1.2, 1.8), min_target_distance=1.0):
+        self.clearance = clearance
+        self.cell_size = cell_size
+        self.heights = heights
+        floors = [np.asarray(polygon, dtype=np.float64)[:, :2] for polygon in floors]
+        if not floors:
+            raise ValueError('room placement needs floors polygons')
+        low = np.min([polygon.min(axis=0) for polygon in floors], axis=0) - cell_size
+        high = np.max([polygon.max(axis=0) for polygon in floors], axis=0) + cell_size
+        self.xs = np.arange(low[0], high[0] + cell_size, cell_size)
+        self.ys = np.arange(low[1], high[1] + cell_size, cell_size)
+        # room of each cell, -1 off the floors, polygons are rasterized in the cells around their bounds only
+        self.rooms = np.full((len(self.ys), len(self.xs)), -1, dtype=np.int64)
+        windows = [self.get_window(polygon.min(axis=0), polygon.max(axis=0)) for polygon in floors]
+        for i, (polygon, window) in enumerate(zip(floors, windows)):
+            rooms = self.rooms[window]
+            rooms[rasterize_polygon(polygon, self.xs[window[1]], self.ys[window[0]]) & (rooms < 0)] = i
+        self.walls = np.zeros(self.rooms.shape, dtype=bool)
+        for polygon in walls:
+            start, end = get_footprint(polygon)
+            window = self.get_window(np.minimum(start, end), np.maximum(start, end))
+            self.walls[window] |= rasterize_segment(start, end, self.xs[window[1]], self.ys[window[0]], 0.75 * cell_size)
+        self.free = (self.rooms >= 0) & ~self.walls
+        # clearance of the free cells, distance to what is not their room, room by room in its window
+        self.distances = np.zeros(self.rooms.shape)
+        # targets and camera cells, (x, y) centers, of the rooms with a cell at the clearance
+        self.targets = []
+        self.cells = []
+        for i, window in enumerate(windows):
+            room = self.free[window] & (self.rooms[window] == i)
+            if not room.any():
+                continue
+            distances = distance_transform(room, cell_size)
+            self.distances[window][room] = distances[room]
+            xs, ys = self.xs[window[1]], self.ys[window[0]]
+            row, column = np.unravel_index(np.argmax(np.where(room, distances, -1)), room.shape)
+            target = np.array([xs[column], ys[row], target_height])
+            rows, columns = np.nonzero(room & (distances >= clearance))
+            cells = np.stack([xs[columns], ys[rows]], axis=1)
+            far = np.linalg.norm(cells - target[:2], axis=1) >= min_target_distance
+            cells = cells[far] if far.any() else cells
+            if len(cells):
+                self.targets.append(target)
+                self.cells.append(cells)
+
+    def get_window(self, low, high):
+        # (rows, columns) slices of the cells from low to high in x and y, with a cell of margin
+        columns = np.searchsorted(self.xs, [low[0] - self.cell_size, high[0] + self.cell_size])
+        rows = np.searchsorted(self.ys, [low[1] - self.cell_size, high[1] + self.cell_size])
+        return slice(rows[0], rows[1] + 1), slice(columns[0], columns[1] + 1)
+
+    def sample_camera_locations(self, count, rng=random):
+        # (locations, targets) of count cameras, z-up
+        locations, targets = np.zeros((count, 3)), np.zeros((count, 3))
+        for i in range(count):
+            room = i % len(self.cells)
+            x, y = self.cells[room][rng.randrange(len(self.cells[room]))]
+            locations[i] = (x + (rng.random() - 0.5) * self.cell_size, y + (rng.random() - 0.5) * self.cell_size, rng.uniform(*self.heights))
+            targets[i] = self.targets[room]
+        return locations, targets
+
+    def sample_camera_poses(self, N, rng=random, obstacles=None, batch_size=256, max_candidates=None):
+        # (locations, rotations) as (N, 3) arrays like sample_valid_camera_poses, without the candidates obstacles block
+        return look_at_poses(*self.sample_valid_camera_locations(N, rng, obstacles, batch_size, max_candidates))
+
+    def sample_valid_camera_locations(self, N, rng=random, obstacles=None, batch_size=256, max_candidates=None):
+        # z-up (locations, targets) of sample_camera_poses
+        if not self.cells:
+            raise RuntimeError(f'no room has a free cell {self.clearance} m away from the walls')
+        locations, targets = [], []
+        found = 0
+        sampled = 0
+        while found < N:
+            if max_candidates is not None and sampled >= max_candidates:
+                raise RuntimeError(f'only {found} of {N} camera poses see the target of their room among {sampled} candidates')
+            count = N - found if obstacles is None else batch_size
+            sampled += count
+            candidates, candidate_targets = self.sample_camera_locations(count, rng)
+            if obstacles is not None:
+                valid = ~obstacles.blocks(candidates, candidate_targets)
+                candidates, candidate_targets = candidates[valid][:N - found], candidate_targets[valid][:N - found]
+            locations.append(candidates)
+            targets.append(candidate_targets)
+            found += len(candidates)
+        return np.concatenate(locations), np.concatenate(targets)